@@ -0,0 +1,263 @@
+"""核心路径基准测试：密钥派生、整块加解密、条目序列化、存储读写、修改主密码、JSON / NDJSON 导入去重与导出、加密备份、保管箱合并
+
+用法：
+    python -m benchmarks.bench_core                          # 默认规模 10 / 1k / 10k / 100k
+    python -m benchmarks.bench_core --sizes 10 1000 -o out.json
+    python -m benchmarks.bench_core --baseline baseline.json # 与基线比较，有退化时退出码为 1
+
+结果为 JSON：每项记录最佳耗时（秒）和吞吐量（写文件的项目还记录文件大小），比较模式按耗时比值判断退化。
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import core.storage
+from core.backup import read_backup, verify_backup, write_backup
+from core.crypto import LEGACY_KDF, decrypt_data, derive_key, encrypt_data
+from core.entries import to_json
+from core.exchange import export_json, export_ndjson, import_entries, import_ndjson
+from core.merge import merge
+from core.serialize import pack, unpack
+from core.storage import change_password, load_entries, save_entries, unlock
+
+from .synthetic import make_vault
+
+DEFAULT_SIZES = (10, 1_000, 10_000, 100_000)
+PASSWORD = "benchmark-password"
+# 耗时超过基线的 (1 + THRESHOLD) 倍视为退化
+DEFAULT_THRESHOLD = 0.25
+# 相差不到该秒数的项目不算退化，避免亚毫秒级项目的测量抖动
+MIN_REGRESSION = 0.001
+# 单次耗时较短的项目重复测量取最小值，总时间不超过该秒数
+REPEAT_BUDGET = 1.0
+MAX_REPEAT = 5
+# 逐条 JSON 序列化（键排序），作为二进制格式的对照
+_JSON = json.JSONEncoder(ensure_ascii=False, sort_keys=True, default=to_json)
+
+
+def measure(func, setup=None):
+    """返回 func 的最佳耗时（秒）；setup 在每次测量前执行，不计时，其返回值作为 func 的参数"""
+    best = None
+    spent = 0.0
+    for _ in range(MAX_REPEAT):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        func(arg) if setup is not None else func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        spent += elapsed
+        if spent + elapsed > REPEAT_BUDGET:
+            break
+    return best
+
+
+def _record(results, name, seconds, items=None, nbytes=None):
+    result = {"seconds": seconds}
+    if items:
+        result["items_per_s"] = items / seconds if seconds else None
+    if nbytes:
+        result["mb_per_s"] = nbytes / 1e6 / seconds if seconds else None
+    results[name] = result
+    return result
+
+
+class _DataFile:
+    """在临时目录中替换 core.storage.DATA_FILE，结束后恢复"""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, "secrets.dat")
+
+    def __enter__(self):
+        self._original = core.storage.DATA_FILE
+        core.storage.DATA_FILE = self.path
+        return self.path
+
+    def __exit__(self, *exc):
+        core.storage._close_stores(self.path)
+        core.storage.DATA_FILE = self._original
+
+
+def bench_size(size: int, results: dict, directory: str):
+    entries = make_vault(size)
+    text = json.dumps(entries, ensure_ascii=False)
+    nbytes = len(text.encode())
+
+    # 整块加解密（旧格式与导出加密使用的路径），每次调用都包含一次密钥派生
+    blob = encrypt_data(text, PASSWORD)
+    _record(results, f"encrypt_data[{size}]", measure(lambda: encrypt_data(text, PASSWORD)), size, nbytes)
+    _record(results, f"decrypt_data[{size}]", measure(lambda: decrypt_data(blob, PASSWORD)), size, nbytes)
+
+    # 逐条序列化：规范化 JSON（对照）与保管箱载荷使用的二进制格式
+    payloads = [_JSON.encode(e).encode() for e in entries]
+    _record(results, f"serialize_json[{size}]", measure(lambda: [_JSON.encode(e).encode() for e in entries]), size,
+            sum(map(len, payloads)))
+    _record(results, f"deserialize_json[{size}]", measure(lambda: [json.loads(p) for p in payloads]), size)
+    payloads = [pack(e) for e in entries]
+    _record(results, f"serialize_binary[{size}]", measure(lambda: [pack(e) for e in entries]), size,
+            sum(map(len, payloads)))
+    _record(results, f"deserialize_binary[{size}]", measure(lambda: [unpack(p) for p in payloads]), size)
+
+    with _DataFile(directory) as path:
+        def fresh():
+            if os.path.exists(path):
+                core.storage._close_stores(path)
+                os.remove(path)
+            return [dict(e) for e in entries]
+
+        # 整体写入：新会话（首次保存、旧格式转换）；同时记录文件大小
+        result = _record(results, f"save_entries[{size}]",
+                         measure(lambda snapshot: save_entries(snapshot, PASSWORD), setup=fresh), size)
+        result["file_bytes"] = os.path.getsize(path)
+
+        # 增量保存：已解锁会话中修改一个条目
+        session, current = unlock(PASSWORD)
+        current = list(current)
+
+        def change_one():
+            current[size // 2] = dict(current[size // 2], password=str(time.perf_counter()))
+            return current
+        _record(results, f"save_entries_one_change[{size}]",
+                measure(lambda snapshot: save_entries(snapshot, session), setup=change_one))
+        # 修改主密码只重新包装数据密钥，耗时与条目数量无关（主要是校验和包装的两次密钥派生）
+        _record(results, f"change_password[{size}]",
+                measure(lambda: change_password(session, current, PASSWORD, PASSWORD)))
+        core.storage._close_stores(path)
+
+        # 解锁只解密列表字段；load_entries 解密全部字段
+        _record(results, f"unlock[{size}]", measure(lambda: core.storage._close_stores(path) or unlock(PASSWORD)), size)
+        _record(results, f"load_entries[{size}]",
+                measure(lambda: core.storage._close_stores(path) or load_entries(PASSWORD)), size)
+
+    # 导入去重：与界面导入 JSON 相同，逐条校验后按名称和内容散列去重；一半条目与现有名称重复
+    existing = entries[: size // 2]
+    imported = make_vault(size, seed=1)[size // 4:] + entries[size // 4: size // 2]
+    _record(results, f"import_dedup[{size}]", measure(lambda: import_entries(imported, existing)), len(imported))
+
+    export_path = os.path.join(directory, "export.json")
+    seconds = measure(lambda: export_json(entries, export_path))
+    _record(results, f"export_json[{size}]", seconds, size, os.path.getsize(export_path))
+
+    # NDJSON 流式导出与导入（逐行校验去重）
+    ndjson_path = os.path.join(directory, "export.ndjson")
+    seconds = measure(lambda: export_ndjson(entries, ndjson_path))
+    _record(results, f"export_ndjson[{size}]", seconds, size, os.path.getsize(ndjson_path))
+    export_ndjson(imported, ndjson_path)
+    seconds = measure(lambda: import_ndjson(ndjson_path, existing))
+    _record(results, f"import_ndjson[{size}]", seconds, len(imported), os.path.getsize(ndjson_path))
+
+    # 加密备份：分段加密写出、逐段认证、解密读回（派生参数固定，与本机校准无关）
+    backup_path = os.path.join(directory, "backup.dskbackup")
+    seconds = measure(lambda: write_backup(entries, backup_path, PASSWORD, LEGACY_KDF))
+    backup_bytes = os.path.getsize(backup_path)
+    _record(results, f"write_backup[{size}]", seconds, size, backup_bytes)["file_bytes"] = backup_bytes
+    _record(results, f"verify_backup[{size}]", measure(lambda: verify_backup(backup_path, PASSWORD)),
+            size, backup_bytes)
+    _record(results, f"read_backup[{size}]",
+            measure(lambda: sum(1 for _ in read_backup(backup_path, PASSWORD))), size, backup_bytes)
+
+    # 保管箱合并：完全相同（只比较根摘要）与 1% 条目被对方修改
+    theirs = [dict(e) for e in entries]
+    _record(results, f"merge_identical[{size}]", measure(lambda: merge(entries, theirs)), size)
+    for i in range(0, size, 100):
+        theirs[i]["password"] = "changed"
+    _record(results, f"merge_one_percent[{size}]", measure(lambda: merge(entries, theirs, entries)), size)
+
+
+def run(sizes=DEFAULT_SIZES, log=print):
+    results = {}
+    _record(results, "derive_key", measure(lambda: derive_key(PASSWORD, b"\0" * 16)))
+    log(f"derive_key: {results['derive_key']['seconds'] * 1000:.1f} ms")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            start = time.perf_counter()
+            bench_size(size, results, directory)
+            log(f"{size} 条：{time.perf_counter() - start:.1f} s")
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": list(sizes),
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD, metric: str = "seconds"):
+    """逐项比较耗时，返回 [(名称, 基线秒数, 当前秒数, 比值, 是否退化)]；只比较两边都有的项目
+
+    metric 为参与比较的字段，界面基准可用 p50 或 p95。
+    """
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name, {}).get(metric)
+        now = result.get(metric)
+        if not base or now is None:
+            continue
+        ratio = now / base
+        regressed = ratio > 1 + threshold and now - base > MIN_REGRESSION
+        rows.append((name, base, now, ratio, regressed))
+    return rows
+
+
+def format_results(report: dict) -> str:
+    lines = []
+    for name, result in report["results"].items():
+        extra = ""
+        if result.get("items_per_s"):
+            extra += f"  {result['items_per_s']:>12,.0f} 条/s"
+        if result.get("mb_per_s"):
+            extra += f"  {result['mb_per_s']:>8.1f} MB/s"
+        if result.get("file_bytes"):
+            extra += f"  文件 {result['file_bytes'] / 1e6:.2f} MB"
+        lines.append(f"{name:<36}{result['seconds'] * 1000:>12.2f} ms{extra}")
+    return "\n".join(lines)
+
+
+def format_comparison(rows) -> str:
+    lines = []
+    for name, base, now, ratio, regressed in rows:
+        flag = "  <-- 退化" if regressed else ""
+        lines.append(f"{name:<36}{base * 1000:>12.2f} -> {now * 1000:>10.2f} ms  x{ratio:.2f}{flag}")
+    return "\n".join(lines)
+
+
+def check_baseline(report: dict, baseline_path: str, threshold: float, metric: str = "seconds") -> int:
+    """与基线文件比较并打印结果，有退化时返回 1；没有指定基线时返回 0"""
+    if not baseline_path:
+        return 0
+    with open(baseline_path, encoding="utf-8") as f:
+        rows = compare(report, json.load(f), threshold, metric)
+    print()
+    print(format_comparison(rows))
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"\n{len(regressions)} 项退化：{', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DevSecretKeeper 核心路径基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="合成保管箱的条目数")
+    parser.add_argument("-o", "--output", help="把结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与该 JSON 结果比较，有退化时退出码为 1")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="耗时超过基线多少比例视为退化（默认 0.25）")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, log=lambda msg: print(msg, file=sys.stderr))
+    print(format_results(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return check_baseline(report, args.baseline, args.threshold)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
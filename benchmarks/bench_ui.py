@@ -0,0 +1,237 @@
+"""界面延迟基准：在无显示环境（QT_QPA_PLATFORM=offscreen）中测量主窗口和对话框的操作耗时
+
+用法：
+    python -m benchmarks.bench_ui                               # 默认规模 100 / 1k / 10k，每项 20 次
+    python -m benchmarks.bench_ui --sizes 1000 --repeat 50 -o ui.json
+    python -m benchmarks.bench_ui --baseline ui.json --metric p95
+
+每项操作记录 p50 / p95 延迟（秒），计时包含处理完随之产生的界面事件（布局、绘制）。
+导入流程中的文件选择框和消息框自动应答，不需要人工操作。
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication, QMessageBox  # noqa: E402
+
+import core.storage  # noqa: E402
+import ui.main_window  # noqa: E402
+from core.crypto import VaultSession  # noqa: E402
+from core.exchange import export_json  # noqa: E402
+from core.merge import KEEP_MINE  # noqa: E402
+from ui.add_entry_dialog import AddEntryDialog  # noqa: E402
+from ui.main_window import MainWindow  # noqa: E402
+
+from .bench_core import DEFAULT_THRESHOLD, check_baseline  # noqa: E402
+from .synthetic import make_vault  # noqa: E402
+
+DEFAULT_SIZES = (100, 1_000, 10_000)
+DEFAULT_REPEAT = 20
+PASSWORD = "benchmark-password"
+# 合成条目的主机并不存在，测量期间推迟后台健康检查
+HEALTH_DELAY = 24 * 3600 * 1000
+
+
+def percentile(samples, q: float) -> float:
+    """最近秩法求百分位数，q 取 0~100"""
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * q // 100))  # 向上取整
+    return ordered[int(rank) - 1]
+
+
+def sample(func, repeat: int, setup=None):
+    """执行 repeat 次，每次计时到处理完排队的界面事件为止；setup 不计时"""
+    app = QApplication.instance()
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+            app.processEvents()
+        start = time.perf_counter()
+        func()
+        app.processEvents()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _record(results, name, times):
+    results[name] = {"p50": percentile(times, 50), "p95": percentile(times, 95), "samples": len(times)}
+    return results[name]
+
+
+class _AutoMessageBox(QMessageBox):
+    """替换 ui.main_window 中的 QMessageBox：提问一律回答 Yes，提示框直接返回"""
+
+    @staticmethod
+    def question(*args, **kwargs):
+        return QMessageBox.Yes
+
+    @staticmethod
+    def information(*args, **kwargs):
+        return QMessageBox.Ok
+
+    warning = critical = information
+
+
+class _AutoFileDialog:
+    """替换 ui.main_window 中的 QFileDialog：总是选择 path"""
+
+    path = ""
+
+    @classmethod
+    def getOpenFileName(cls, *args, **kwargs):
+        return cls.path, ""
+
+    getSaveFileName = getOpenFileName
+
+
+def _auto_merge_policy(window, count):
+    # 同名条目一律保留我方的值，重复测量之间现有条目保持不变
+    return KEEP_MINE
+
+
+class _Harness:
+    """临时替换数据文件、消息框、文件选择框和合并策略询问，并推迟后台健康检查，结束时恢复"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __enter__(self):
+        mw = ui.main_window
+        self._saved = (core.storage.DATA_FILE, mw.QMessageBox, mw.QFileDialog, MainWindow._ask_merge_policy,
+                       mw.HEALTH_CHECK_INTERVAL, mw.HEALTH_FIRST_CHECK_DELAY)
+        core.storage.DATA_FILE = os.path.join(self.directory, "secrets.dat")
+        mw.QMessageBox = _AutoMessageBox
+        mw.QFileDialog = _AutoFileDialog
+        MainWindow._ask_merge_policy = _auto_merge_policy
+        mw.HEALTH_CHECK_INTERVAL = mw.HEALTH_FIRST_CHECK_DELAY = HEALTH_DELAY
+        return self
+
+    def __exit__(self, *exc):
+        mw = ui.main_window
+        core.storage._close_stores(core.storage.DATA_FILE)
+        (core.storage.DATA_FILE, mw.QMessageBox, mw.QFileDialog, MainWindow._ask_merge_policy,
+         mw.HEALTH_CHECK_INTERVAL, mw.HEALTH_FIRST_CHECK_DELAY) = self._saved
+
+
+def _dispose(window):
+    """关闭主窗口：停止定时器和后台保存，不弹出任何确认"""
+    window.health_timer.stop()
+    window.saver.close()
+    window.tray_icon.hide()
+    window.hide()
+    window.deleteLater()
+    QApplication.instance().processEvents()
+
+
+def bench_dialogs(results, repeat):
+    # 每种类型各打开一次编辑对话框（含布局和首次绘制），再关闭
+    samples = {entry["type"]: entry for entry in make_vault(3)}
+    sqlite = dict(samples["Database"], db_type="SQLite", sqlite_path="/tmp/a.db")
+    for name, entry in (("new", None), ("Website", samples["Website"]), ("Server", samples["Server"]),
+                        ("Database", samples["Database"]), ("SQLite", sqlite)):
+        def open_dialog():
+            dialog = AddEntryDialog(entry=entry)
+            dialog.show()
+            QApplication.instance().processEvents()
+            dialog.close()
+            dialog.deleteLater()
+        _record(results, f"open_add_entry_dialog[{name}]", sample(open_dialog, repeat))
+
+
+def bench_size(size, results, repeat, session, directory):
+    entries = make_vault(size)
+    windows = []
+
+    def construct():
+        window = MainWindow([dict(e) for e in entries], session)
+        window.show()
+        windows.append(window)
+
+    def dispose_last():
+        while windows:
+            _dispose(windows.pop())
+
+    # 构造主窗口的次数随规模减少，避免 10k 条时耗时过长
+    construct_repeat = max(3, repeat // max(1, size // 1000))
+    _record(results, f"main_window_init[{size}]", sample(construct, construct_repeat, setup=dispose_last))
+    dispose_last()
+
+    construct()
+    window = windows[0]
+    _record(results, f"refresh_table[{size}]", sample(window.refresh_table, repeat))
+
+    # 导入：一半条目与现有条目相同，另一半同名但内容不同（走合并流程）；每次导入前删掉上次导入的条目
+    import_path = os.path.join(directory, "import.json")
+    export_json(make_vault(size, seed=1)[size // 2:] + entries[:size // 2], import_path)
+    _AutoFileDialog.path = import_path
+
+    def reset():
+        window.saver.flush()
+        del window.entries[size:]
+    _record(results, f"import_json[{size}]", sample(window.import_from_json, repeat, setup=reset))
+    reset()
+    dispose_last()
+
+
+def run(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, log=print):
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    app.setQuitOnLastWindowClosed(False)
+    results = {}
+    session = VaultSession.create(PASSWORD)
+    with tempfile.TemporaryDirectory() as directory, _Harness(directory):
+        start = time.perf_counter()
+        bench_dialogs(results, repeat)
+        log(f"对话框：{time.perf_counter() - start:.1f} s")
+        for size in sizes:
+            start = time.perf_counter()
+            bench_size(size, results, repeat, session, directory)
+            log(f"{size} 条：{time.perf_counter() - start:.1f} s")
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "qpa": app.platformName(),
+            "sizes": list(sizes),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def format_results(report: dict) -> str:
+    lines = [f"{'操作':<38}{'p50':>10}{'p95':>10}"]
+    for name, result in report["results"].items():
+        lines.append(f"{name:<40}{result['p50'] * 1000:>8.2f}ms{result['p95'] * 1000:>8.2f}ms")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DevSecretKeeper 界面延迟基准（无显示环境）")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="主窗口中的条目数")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="每项操作的测量次数")
+    parser.add_argument("-o", "--output", help="把结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与该 JSON 结果比较，有退化时退出码为 1")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="延迟超过基线多少比例视为退化（默认 0.25）")
+    parser.add_argument("--metric", choices=("p50", "p95"), default="p50", help="与基线比较的百分位")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.repeat, log=lambda msg: print(msg, file=sys.stderr))
+    print(format_results(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return check_baseline(report, args.baseline, args.threshold, args.metric)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""生成合成保管箱：Website / Server / Database 三类条目混合，内容由种子决定，每次生成结果相同"""
+import random
+
+DB_TYPES = ("MySQL", "PostgreSQL", "SQLite")
+
+
+def make_entry(i: int, rng: random.Random) -> dict:
+    kind = ("Website", "Server", "Database")[i % 3]
+    name = f"{kind.lower()}-{i:06d}"
+    password = "".join(rng.choice("abcdefghijkmnpqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ23456789!@#$%") for _ in range(20))
+    if kind == "Website":
+        return {"name": name, "type": kind, "url": f"https://app{i}.example.com/login",
+                "username": f"user{rng.randrange(10000)}@example.com", "password": password}
+    if kind == "Server":
+        return {"name": name, "type": kind, "ip": f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+                "port": "22", "username": "root", "password": password}
+    db_type = rng.choice(DB_TYPES)
+    if db_type == "SQLite":
+        return {"name": name, "type": kind, "db_type": db_type, "sqlite_path": f"/data/sqlite/db{i}.db"}
+    return {"name": name, "type": kind, "db_type": db_type, "host": f"db{rng.randrange(500)}.internal",
+            "port": "3306" if db_type == "MySQL" else "5432", "username": "app",
+            "password": password, "database_name": f"schema_{i % 97}"}
+
+
+def make_vault(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [make_entry(i, rng) for i in range(size)]
@@ -0,0 +1,294 @@
+"""加密备份：分段流式 AEAD，写出、校验和恢复都只占用固定大小的内存
+
+文件布局：
+    MAGIC | 版本号(1B) | 头部长度(2B) | 头部 JSON | 段 0 | 段 1 | … | 最后一段
+头部 JSON 记录密钥派生参数、salt、段大小、nonce 前缀、压缩算法和密码校验值；整个头部作为每一段的关联数据。
+明文是 NDJSON（每行一个条目），先整体流式压缩（见 core.codec，默认选择已安装的最佳算法），再按 SEGMENT_SIZE 切段，
+每段独立加密为 密文 + 16 字节标签，除最后一段外每段长度都等于段大小，最后一段可以为空。
+读取时每段认证通过后才送入解压器，内存占用与文件大小无关。
+
+每段的 nonce = nonce 前缀(7B) | 段序号(4B) | 是否最后一段(1B)：
+段被重排、替换或复制时序号对不上，文件被截断时最后一段的标志对不上，都会认证失败，
+而且每段可以单独认证，损坏时能准确指出是第几段、位于文件中的哪个偏移。
+"""
+import json
+import os
+import struct
+from datetime import datetime
+from typing import NamedTuple
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from .codec import BACKUP_COMPRESSION, Compression
+from .crypto import SALT_SIZE, KdfParams, calibrate, derive_key
+from .entries import to_json
+
+MAGIC = b"DSKB"
+FORMAT_VERSION = 1
+BACKUP_SUFFIX = ".dskbackup"
+SEGMENT_SIZE = 64 * 1024
+TAG_SIZE = 16
+NONCE_PREFIX_SIZE = 7
+MAX_SEGMENTS = 2 ** 32 - 1
+# 密码校验值使用段不会用到的序号和标志
+_CHECK_NONCE_SUFFIX = b"\xff\xff\xff\xff\x02"
+
+# 每写出或读取这么多个条目报告一次进度
+PROGRESS_EVERY = 500
+
+
+class BackupError(ValueError):
+    """备份文件损坏；segment 为出错的段序号（从 0 开始），offset 为该段在文件中的字节偏移"""
+
+    def __init__(self, message, segment=None, offset=None):
+        super().__init__(message)
+        self.segment = segment
+        self.offset = offset
+
+
+def is_backup(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _nonce(prefix: bytes, index: int, last: bool) -> bytes:
+    if index > MAX_SEGMENTS:
+        raise ValueError("备份文件过大")
+    return prefix + struct.pack(">IB", index, 1 if last else 0)
+
+
+def _header_bytes(meta: dict) -> bytes:
+    body = json.dumps(meta, sort_keys=True).encode()
+    return MAGIC + bytes([FORMAT_VERSION]) + struct.pack(">H", len(body)) + body
+
+
+class BackupWriter:
+    """把字节流压缩后按段加密写入文件；close() 写出最后一段，之前的段都是满的"""
+
+    def __init__(self, f, password: str, kdf: KdfParams = None, segment_size: int = SEGMENT_SIZE,
+                 compression: Compression = None):
+        self._f = f
+        self.segment_size = segment_size
+        kdf = kdf if kdf is not None else calibrate()
+        compression = compression if compression is not None else BACKUP_COMPRESSION
+        salt = os.urandom(SALT_SIZE)
+        self._prefix = os.urandom(NONCE_PREFIX_SIZE)
+        self._aesgcm = AESGCM(derive_key(password, salt, kdf))
+        meta = {
+            "kdf": kdf.to_dict(),
+            "salt": salt.hex(),
+            "segment_size": segment_size,
+            "nonce_prefix": self._prefix.hex(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "compression": compression.to_dict(),
+        }
+        check_aad = _header_bytes(meta)
+        meta["check"] = self._aesgcm.encrypt(self._prefix + _CHECK_NONCE_SUFFIX, b"", check_aad).hex()
+        self._aad = _header_bytes(meta)
+        f.write(self._aad)
+        self._compressor = compression.compressor()
+        self._buffer = bytearray()
+        self._index = 0
+        self.closed = False
+
+    def write(self, data: bytes):
+        self._buffer += self._compressor.compress(data)
+        self._drain()
+
+    def _drain(self):
+        while len(self._buffer) > self.segment_size:
+            # 多出的数据留到下一段，保证最后一段在 close() 时才写出
+            self._seal(bytes(self._buffer[:self.segment_size]), last=False)
+            del self._buffer[:self.segment_size]
+
+    def _seal(self, plain: bytes, last: bool):
+        self._f.write(self._aesgcm.encrypt(_nonce(self._prefix, self._index, last), plain, self._aad))
+        self._index += 1
+
+    def close(self):
+        if not self.closed:
+            self._buffer += self._compressor.flush()
+            self._drain()
+            self._seal(bytes(self._buffer), last=True)
+            self._buffer.clear()
+            self.closed = True
+
+
+class _Segments:
+    """按段读取并认证；迭代得到 (段序号, 偏移, 明文)，明文为 None 表示该段认证失败"""
+
+    def __init__(self, f, password: str):
+        self._f = f
+        head = f.read(len(MAGIC) + 3)
+        if len(head) < len(MAGIC) + 3 or head[:len(MAGIC)] != MAGIC:
+            raise BackupError("不是加密备份文件")
+        version = head[len(MAGIC)]
+        if version != FORMAT_VERSION:
+            raise BackupError(f"不支持的备份格式版本：{version}")
+        (length,) = struct.unpack_from(">H", head, len(MAGIC) + 1)
+        body = f.read(length)
+        try:
+            meta = json.loads(body)
+            check = bytes.fromhex(meta.pop("check"))
+            salt = bytes.fromhex(meta["salt"])
+            self._prefix = bytes.fromhex(meta["nonce_prefix"])
+            self.segment_size = int(meta["segment_size"])
+            kdf = KdfParams.from_dict(meta["kdf"])
+            self.compression = Compression.from_dict(meta["compression"])
+        except (ValueError, KeyError, TypeError) as e:
+            raise BackupError(f"备份文件头部损坏：{e}")
+        self.created = meta.get("created", "")
+        self._aesgcm = AESGCM(derive_key(password, salt, kdf))
+        try:
+            self._aesgcm.decrypt(self._prefix + _CHECK_NONCE_SUFFIX, check, _header_bytes(meta))
+        except InvalidTag:
+            raise ValueError("备份密码错误或头部被篡改")
+        self._aad = head + body
+        self.total = os.fstat(f.fileno()).st_size
+
+    def __iter__(self):
+        chunk_size = self.segment_size + TAG_SIZE
+        offset = len(self._aad)
+        chunk = self._f.read(chunk_size)
+        if not chunk:
+            yield 0, offset, None  # 只有头部，没有最后一段
+            return
+        index = 0
+        while chunk:
+            following = self._f.read(chunk_size)
+            last = not following
+            try:
+                yield index, offset, self._open(chunk, index, last)
+            except InvalidTag:
+                yield index, offset, None
+            offset += len(chunk)
+            index += 1
+            chunk = following
+
+    def _open(self, chunk, index, last):
+        return self._aesgcm.decrypt(_nonce(self._prefix, index, last), chunk, self._aad)
+
+    def truncated_at(self, chunk_index, chunk) -> bool:
+        """最后一段按“非最后一段”能通过认证，说明文件在段边界处被截断"""
+        try:
+            self._open(chunk, chunk_index, last=False)
+            return True
+        except InvalidTag:
+            return False
+
+
+def _segment_error(index, offset, last) -> BackupError:
+    where = f"第 {index + 1} 段（文件偏移 {offset}）"
+    if last:
+        return BackupError(f"{where}认证失败：文件被截断或最后一段损坏", index, offset)
+    return BackupError(f"{where}认证失败：数据损坏或被篡改", index, offset)
+
+
+def write_backup(entries, path: str, password: str, kdf: KdfParams = None, progress=None,
+                 segment_size: int = SEGMENT_SIZE, compression: Compression = None) -> bool:
+    """把条目写入加密备份；progress(已写条数, 总条数) 返回 False 时取消
+
+    先写入临时文件，完成后再替换 path；取消或出错时删除临时文件，返回是否完成。
+    """
+    tmp = path + ".tmp"
+    total = len(entries)
+    cancelled = False
+    try:
+        with open(tmp, "wb") as f:
+            writer = BackupWriter(f, password, kdf, segment_size, compression)
+            for done, entry in enumerate(entries, 1):
+                writer.write(json.dumps(entry, ensure_ascii=False, default=to_json).encode() + b"\n")
+                if progress is not None and done % PROGRESS_EVERY == 0 and progress(done, total) is False:
+                    cancelled = True
+                    break
+            writer.close()
+        if not cancelled:
+            os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return not cancelled
+
+
+def read_backup(path: str, password: str, progress=None):
+    """逐个产出备份中的条目；任何一段认证失败都抛出 BackupError，已产出的条目都来自认证通过的段
+
+    progress(已读字节, 文件字节数) 返回 False 时停止读取（生成器正常结束）。
+    """
+    with open(path, "rb") as f:
+        segments = _Segments(f, password)
+        decompressor = segments.compression.decompressor()
+        pending = b""
+        count = 0
+        last_offset = None
+        for index, offset, plain in segments:
+            if plain is None:
+                raise _segment_error(index, offset, _is_last(segments, f))
+            last_offset = offset
+            lines = (pending + decompressor.decompress(plain)).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+                    count += 1
+                    if progress is not None and count % PROGRESS_EVERY == 0 \
+                            and progress(f.tell(), segments.total) is False:
+                        return
+        if pending.strip():
+            raise BackupError("最后一个条目不完整", index, last_offset)
+        if progress is not None:
+            progress(segments.total, segments.total)
+
+
+def _is_last(segments, f) -> bool:
+    # 迭代时已经预读了下一段，读到文件末尾说明当前段是最后一段
+    return f.tell() >= segments.total
+
+
+class VerifyResult(NamedTuple):
+    """校验结果：段数、条目数（有损坏时只统计第一个损坏段之前的行）、损坏的段 [(段序号, 偏移, 说明)]、备份时间"""
+    segments: int
+    entries: int
+    bad_segments: list
+    created: str
+
+    @property
+    def ok(self) -> bool:
+        return not self.bad_segments
+
+
+def verify_backup(path: str, password: str, progress=None) -> VerifyResult:
+    """认证每一段但不保留明文，损坏的段全部列出；progress(已读字节, 文件字节数) 返回 False 时停止"""
+    with open(path, "rb") as f:
+        segments = _Segments(f, password)
+        decompressor = segments.compression.decompressor()
+        bad = []
+        count = 0
+        index = -1
+        for index, offset, plain in segments:
+            if plain is None:
+                decompressor = None  # 压缩流断开，后面的段仍然认证但不再统计行数
+                last = _is_last(segments, f)
+                if last and segments.truncated_at(index, _read_at(f, offset, segments)):
+                    bad.append((index, offset, f"文件在第 {index + 1} 段之后被截断，缺少最后一段"))
+                else:
+                    error = _segment_error(index, offset, last)
+                    bad.append((index, offset, str(error)))
+                continue
+            if decompressor is not None:
+                count += decompressor.decompress(plain).count(b"\n")
+            if progress is not None and progress(f.tell(), segments.total) is False:
+                break
+    return VerifyResult(index + 1, count, bad, segments.created)
+
+
+def _read_at(f, offset, segments) -> bytes:
+    position = f.tell()
+    f.seek(offset)
+    chunk = f.read(segments.segment_size + TAG_SIZE)
+    f.seek(position)
+    return chunk
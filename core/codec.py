@@ -0,0 +1,220 @@
+"""加密备份在加密前的压缩：算法记录在备份已认证的头部中
+
+zlib 为内置算法；加密备份默认使用 zlib，保证在任何安装上都能恢复，已安装 zstandard（zstd）或 lz4 时
+可以在导出时明确选择，读取时按头部记录的算法解压，读取 zstd / lz4 压缩的备份同样需要安装对应的库。
+压缩总是在加密之前、解压总是在认证之后，所以解压的只会是自己写出的数据。
+
+只有加密备份使用压缩：保管箱的条目是二进制序列化（core.serialize），单条只有一两百字节，逐条压缩只能再省几个字节，
+记录格式和 SQLite 后端都不压缩。
+"""
+import zlib
+from typing import NamedTuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+NONE = "none"
+ZLIB = "zlib"
+ZSTD = "zstd"
+LZ4 = "lz4"
+
+
+class Codec:
+    """压缩算法插件；available 为 False 时表示缺少对应的库"""
+
+    name = ""
+    label = ""
+    available = True
+    requirement = ""  # 缺少的库名，用于错误提示
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def compressor(self):
+        """流式压缩器：compress(data) -> bytes，flush() -> bytes"""
+        raise NotImplementedError
+
+    def decompressor(self):
+        """流式解压器：decompress(data) -> bytes"""
+        raise NotImplementedError
+
+
+CODECS = {}
+
+
+def register(cls):
+    CODECS[cls.name] = cls()
+    return cls
+
+
+def available_codecs():
+    return [name for name, codec in CODECS.items() if codec.available]
+
+
+def get_codec(name: str) -> Codec:
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"不支持的压缩算法：{name}")
+    if not codec.available:
+        raise ValueError(f"读写 {codec.label} 压缩的数据需要安装 {codec.requirement}")
+    return codec
+
+
+class _Passthrough:
+    def compress(self, data):
+        return data
+
+    def decompress(self, data):
+        return data
+
+    def flush(self):
+        return b""
+
+
+@register
+class Identity(Codec):
+    name = NONE
+    label = "不压缩"
+
+    def compress(self, data):
+        return data
+
+    def decompress(self, data):
+        return data
+
+    def compressor(self):
+        return _Passthrough()
+
+    def decompressor(self):
+        return _Passthrough()
+
+
+@register
+class Zlib(Codec):
+    name = ZLIB
+    label = "zlib"
+
+    def compress(self, data):
+        c = self.compressor()
+        return c.compress(data) + c.flush()
+
+    def decompress(self, data):
+        d = self.decompressor()
+        plain = d.decompress(data)
+        if not d.eof:
+            raise ValueError("压缩数据不完整")
+        return plain
+
+    def compressor(self):
+        return zlib.compressobj(6, zlib.DEFLATED, -15)
+
+    def decompressor(self):
+        return zlib.decompressobj(-15)
+
+
+@register
+class Zstd(Codec):
+    name = ZSTD
+    label = "zstd"
+    available = zstandard is not None
+    requirement = "zstandard"
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor().compress(data)
+
+    def decompress(self, data):
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    def compressor(self):
+        return zstandard.ZstdCompressor().compressobj()
+
+    def decompressor(self):
+        return zstandard.ZstdDecompressor().decompressobj()
+
+
+class _Lz4Compressor:
+    def __init__(self):
+        self._c = lz4_frame.LZ4FrameCompressor()
+        self._started = False
+
+    def compress(self, data):
+        head = b""
+        if not self._started:
+            head = self._c.begin()
+            self._started = True
+        return head + self._c.compress(data)
+
+    def flush(self):
+        head = b"" if self._started else self._c.begin()
+        return head + self._c.flush()
+
+
+@register
+class Lz4(Codec):
+    name = LZ4
+    label = "lz4"
+    available = lz4_frame is not None
+    requirement = "lz4"
+
+    def compress(self, data):
+        return lz4_frame.compress(data)
+
+    def decompress(self, data):
+        return lz4_frame.decompress(data)
+
+    def compressor(self):
+        return _Lz4Compressor()
+
+    def decompressor(self):
+        return lz4_frame.LZ4FrameDecompressor()
+
+
+class Compression(NamedTuple):
+    """压缩算法，记录在文件头部"""
+    codec: str = NONE
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+    @classmethod
+    def from_dict(cls, data) -> "Compression":
+        compression = cls(data["codec"])
+        if compression.codec not in CODECS:
+            raise ValueError(f"不支持的压缩算法：{compression.codec}")
+        return compression
+
+    @property
+    def enabled(self) -> bool:
+        return self.codec != NONE
+
+    def compress(self, data: bytes) -> bytes:
+        return get_codec(self.codec).compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return get_codec(self.codec).decompress(data)
+
+    def compressor(self):
+        return get_codec(self.codec).compressor()
+
+    def decompressor(self):
+        return get_codec(self.codec).decompressor()
+
+
+NO_COMPRESSION = Compression()
+# 加密备份整个 NDJSON 流连续压缩；默认使用内置的 zlib，备份在只按 requirements.txt 安装的机器上也能恢复
+BACKUP_COMPRESSION = Compression(ZLIB)
+
+
+def backup_codecs():
+    """导出加密备份时可选的压缩算法（已安装的），第一个为默认值"""
+    return [name for name in (ZLIB, ZSTD, LZ4) if CODECS[name].available]
@@ -1,32 +1,377 @@
+import base64
+import functools
+import hmac as hmac_compare
+import json
 import os
+import time
+from typing import NamedTuple
 
-from cryptography.hazmat.primitives import hashes
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes, hmac
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
 
+from .startup import profiler
 
-def derive_key(password: str, salt: bytes) -> bytes:
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=100_000,
+try:  # cryptography 44 起提供 Argon2id
+    from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
+except ImportError:
+    Argon2id = None
+
+# 版本化格式：MAGIC | 版本号(1B) | salt(16B) | nonce(12B) | 密文
+# 旧格式（无头部）：salt(16B) | 密文，salt 同时用作 nonce
+MAGIC = b"DSKV"
+FORMAT_VERSION = 1
+SALT_SIZE = 16
+NONCE_SIZE = 12
+HEADER_SIZE = len(MAGIC) + 1 + SALT_SIZE
+
+
+# ---------- 密钥派生 ----------
+
+PBKDF2 = "pbkdf2-sha256"
+SCRYPT = "scrypt"
+ARGON2ID = "argon2id"
+
+ALGORITHM_LABELS = {
+    PBKDF2: "PBKDF2-SHA256",
+    SCRYPT: "scrypt（内存密集）",
+    ARGON2ID: "Argon2id（内存密集）",
+}
+
+SCRYPT_R = 8
+ARGON2_MEMORY_KIB = 64 * 1024
+ARGON2_LANES = 4
+
+# 校准时以解锁耗时接近该秒数为目标
+TARGET_SECONDS = 0.3
+# 校准结果的下限（慢机器上也不低于此强度，耗时可能超过目标）和上限
+MIN_PBKDF2_ITERATIONS = 100_000
+MAX_PBKDF2_ITERATIONS = 10_000_000
+MIN_SCRYPT_N = 2 ** 15
+MAX_SCRYPT_N = 2 ** 18  # r=8 时约 256 MiB 内存
+MIN_ARGON2_ITERATIONS = 2
+MAX_ARGON2_ITERATIONS = 64
+
+
+class KdfParams(NamedTuple):
+    """密钥派生算法及参数，记录在数据文件头部，解锁时按文件中的参数派生"""
+    algorithm: str = PBKDF2
+    iterations: int = 100_000  # PBKDF2 的迭代次数 / Argon2id 的遍数
+    n: int = 0  # scrypt 的 CPU/内存成本（2 的幂）
+    memory_kib: int = 0  # Argon2id 的内存（KiB）
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+    @classmethod
+    def from_dict(cls, data) -> "KdfParams":
+        """头部中没有参数（旧文件）时返回 LEGACY_KDF"""
+        if not data:
+            return LEGACY_KDF
+        params = cls(**{key: data[key] for key in cls._fields if key in data})
+        if params.algorithm not in ALGORITHM_LABELS:
+            raise ValueError(f"不支持的密钥派生算法: {params.algorithm}")
+        return params
+
+
+# 此前固定使用的参数；没有记录参数的数据文件按它解锁
+LEGACY_KDF = KdfParams(PBKDF2, 100_000)
+
+
+def available_algorithms():
+    return [a for a in ALGORITHM_LABELS if a != ARGON2ID or Argon2id is not None]
+
+
+def _kdf(params: KdfParams, salt: bytes):
+    if params.algorithm == PBKDF2:
+        return PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=params.iterations)
+    if params.algorithm == SCRYPT:
+        return Scrypt(salt=salt, length=32, n=params.n, r=SCRYPT_R, p=1)
+    if params.algorithm == ARGON2ID:
+        if Argon2id is None:
+            raise ValueError("当前 cryptography 版本不支持 Argon2id，请升级到 44 或更高版本")
+        return Argon2id(salt=salt, length=32, iterations=params.iterations,
+                        lanes=ARGON2_LANES, memory_cost=params.memory_kib)
+    raise ValueError(f"不支持的密钥派生算法: {params.algorithm}")
+
+
+def derive_key(password: str, salt: bytes, params: KdfParams = LEGACY_KDF) -> bytes:
+    kdf = _kdf(params, salt)
+    with profiler.phase("kdf"):
+        return kdf.derive(password.encode())
+
+
+# 校准用的小参数：先测出它的耗时，再按比例放大到目标耗时
+_PROBES = {
+    PBKDF2: KdfParams(PBKDF2, iterations=20_000),
+    SCRYPT: KdfParams(SCRYPT, iterations=0, n=2 ** 12),
+    ARGON2ID: KdfParams(ARGON2ID, iterations=1, memory_kib=ARGON2_MEMORY_KIB),
+}
+
+
+def _time_derive(params: KdfParams) -> float:
+    best = None
+    for _ in range(2):
+        start = time.perf_counter()
+        derive_key("calibration", b"\0" * SALT_SIZE, params)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        if elapsed > 0.1:  # 单次已足够长，不再重复
+            break
+    return best
+
+
+def scale_params(params: KdfParams, factor: float) -> KdfParams:
+    """把参数的成本放大 factor 倍（各算法耗时与成本近似成正比），并限制在上下限之间"""
+    if params.algorithm == PBKDF2:
+        iterations = round(params.iterations * factor, -3)
+        return params._replace(iterations=int(min(max(iterations, MIN_PBKDF2_ITERATIONS), MAX_PBKDF2_ITERATIONS)))
+    if params.algorithm == SCRYPT:
+        n = 1 << max(0, int(params.n * factor).bit_length() - 1)  # 不超过目标的 2 的幂
+        return params._replace(n=min(max(n, MIN_SCRYPT_N), MAX_SCRYPT_N))
+    iterations = int(params.iterations * factor)
+    return params._replace(iterations=min(max(iterations, MIN_ARGON2_ITERATIONS), MAX_ARGON2_ITERATIONS))
+
+
+@functools.lru_cache(maxsize=None)
+def calibrate(algorithm: str = PBKDF2, target: float = TARGET_SECONDS) -> KdfParams:
+    """测量本机的派生速度，返回派生耗时接近 target 秒的参数；同一进程内结果会缓存"""
+    probe = _PROBES[algorithm]
+    return scale_params(probe, target / _time_derive(probe))
+
+
+# ---------- 密钥层次（信封加密） ----------
+# 保管箱数据由随机的数据密钥加密；每种解锁方式是一个密钥槽，保存用该方式派生的密钥包装后的数据密钥。
+# 修改主密码只需重新包装 32 字节的数据密钥，恢复密钥等其他解锁方式也不需要复制数据。
+
+DATA_KEY_SIZE = 32
+PASSWORD_SLOT = "password"
+RECOVERY_SLOT = "recovery"
+SLOT_METHODS = (PASSWORD_SLOT, RECOVERY_SLOT)
+# 恢复密钥：160 位随机数，以 Base32 分组显示
+RECOVERY_KEY_BYTES = 20
+_RECOVERY_INFO = b"DevSecretKeeper recovery"
+
+
+def new_recovery_key() -> str:
+    text = base64.b32encode(os.urandom(RECOVERY_KEY_BYTES)).decode()
+    return "-".join(text[i:i + 4] for i in range(0, len(text), 4))
+
+
+def parse_recovery_key(text: str):
+    """返回恢复密钥的字节；不是恢复密钥格式时返回 None"""
+    text = "".join(text.split()).replace("-", "").upper()
+    if len(text) != RECOVERY_KEY_BYTES * 8 // 5:
+        return None
+    try:
+        return base64.b32decode(text)
+    except ValueError:
+        return None
+
+
+class KeySlot(NamedTuple):
+    """一种解锁方式：salt、派生参数（只有主密码需要）和被包装的数据密钥（nonce + 密文）"""
+    method: str
+    salt: bytes
+    wrapped: bytes
+    kdf: KdfParams = None
+
+    def to_dict(self) -> dict:
+        data = {"method": self.method, "salt": self.salt.hex(), "wrapped": self.wrapped.hex()}
+        if self.kdf is not None:
+            data["kdf"] = self.kdf.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data) -> "KeySlot":
+        if data.get("method") not in SLOT_METHODS:
+            raise ValueError(f"不支持的解锁方式: {data.get('method')}")
+        kdf = KdfParams.from_dict(data["kdf"]) if data.get("kdf") else None
+        return cls(data["method"], bytes.fromhex(data["salt"]), bytes.fromhex(data["wrapped"]), kdf)
+
+    def _aad(self) -> bytes:
+        # 解锁方式、salt 和派生参数都参与认证
+        kdf = json.dumps(self.kdf.to_dict(), sort_keys=True) if self.kdf is not None else ""
+        return b"keyslot" + self.method.encode() + self.salt + kdf.encode()
+
+    def _kek(self, secret: str):
+        """由主密码或恢复密钥派生包装密钥；恢复密钥格式不对时返回 None"""
+        if self.method == PASSWORD_SLOT:
+            return derive_key(secret, self.salt, self.kdf)
+        raw = parse_recovery_key(secret)
+        if raw is None:
+            return None
+        # 恢复密钥本身是高熵随机数，不需要慢速派生
+        return HKDF(algorithm=hashes.SHA256(), length=32, salt=self.salt, info=_RECOVERY_INFO).derive(raw)
+
+    @classmethod
+    def wrap(cls, method: str, secret: str, data_key: bytes, kdf: KdfParams = None) -> "KeySlot":
+        slot = cls(method, os.urandom(SALT_SIZE), b"", kdf if method == PASSWORD_SLOT else None)
+        nonce = os.urandom(NONCE_SIZE)
+        return slot._replace(wrapped=nonce + AESGCM(slot._kek(secret)).encrypt(nonce, data_key, slot._aad()))
+
+    def unwrap(self, secret: str) -> bytes:
+        """返回数据密钥；密码或恢复密钥错误时抛出 InvalidTag"""
+        kek = self._kek(secret)
+        if kek is None:
+            raise InvalidTag()
+        return AESGCM(kek).decrypt(self.wrapped[:NONCE_SIZE], self.wrapped[NONCE_SIZE:], self._aad())
+
+
+def _slot_order(slots, secret: str):
+    # 输入是恢复密钥格式时先试恢复密钥槽（不需要慢速派生）
+    recovery = parse_recovery_key(secret) is not None
+    return sorted(slots, key=lambda slot: (slot.method == RECOVERY_SLOT) != recovery)
+
+
+class VaultSession:
+    """解锁会话：主密码只在创建时派生一次密钥，之后每次加密只生成新的随机 nonce
+
+    kdf 为派生参数：打开已有文件时使用文件头部记录的参数，新建或修改主密码时使用 calibrate() 的结果。
+    直接构造的会话由主密码和 salt 直接派生密钥，只用于整块加密格式；保管箱的存储容器使用
+    create() / unlock() 得到的信封加密会话，slots 为密钥槽列表，salt 只作为保管箱的标识参与认证。
+    """
+
+    def __init__(self, password: str, salt: bytes = None, kdf: KdfParams = LEGACY_KDF):
+        self.salt = salt if salt is not None else os.urandom(SALT_SIZE)
+        self.kdf = kdf
+        self.slots = None
+        self._password = password
+        self._set_key(derive_key(password, self.salt, kdf))
+
+    def _set_key(self, key: bytes):
+        self._key = key
+        self._aesgcm = AESGCM(key)
+        # 索引用的散列密钥与加密密钥分离
+        self._mac_key = HKDF(
+            algorithm=hashes.SHA256(), length=32, salt=None, info=b"DevSecretKeeper index",
+        ).derive(key)
+
+    @classmethod
+    def _envelope(cls, data_key: bytes, slots, salt: bytes) -> "VaultSession":
+        session = cls.__new__(cls)
+        session.salt = salt
+        session._password = None
+        session.slots = None
+        session._set_key(data_key)
+        session.use_slots(slots)
+        return session
+
+    @classmethod
+    def create(cls, password: str, kdf: KdfParams = LEGACY_KDF) -> "VaultSession":
+        """新建保管箱的会话：随机数据密钥，由主密码包装"""
+        data_key = os.urandom(DATA_KEY_SIZE)
+        slots = [KeySlot.wrap(PASSWORD_SLOT, password, data_key, kdf)]
+        return cls._envelope(data_key, slots, os.urandom(SALT_SIZE))
+
+    @classmethod
+    def unlock(cls, slots, secret: str, salt: bytes) -> "VaultSession":
+        """用主密码或恢复密钥打开任一密钥槽；都不匹配时抛出 InvalidTag"""
+        for slot in _slot_order(slots, secret):
+            try:
+                data_key = slot.unwrap(secret)
+            except InvalidTag:
+                continue
+            return cls._envelope(data_key, slots, salt)
+        raise InvalidTag()
+
+    @property
+    def envelope(self) -> bool:
+        return self.slots is not None
+
+    def use_slots(self, slots):
+        """采用新的密钥槽（容器已写入文件后调用）；kdf 随主密码槽更新"""
+        self.slots = list(slots)
+        password = next((slot for slot in self.slots if slot.method == PASSWORD_SLOT), None)
+        self.kdf = password.kdf if password is not None else LEGACY_KDF
+
+    def verify(self, secret: str) -> bool:
+        """secret（主密码或恢复密钥）是否能解锁本会话"""
+        if not self.envelope:
+            raise ValueError("整块加密格式的会话没有密钥槽")
+        for slot in _slot_order(self.slots, secret):
+            try:
+                if hmac_compare.compare_digest(slot.unwrap(secret), self._key):
+                    return True
+            except InvalidTag:
+                continue
+        return False
+
+    def rewrapped(self, method: str, secret: str, kdf: KdfParams = None):
+        """返回替换了 method 密钥槽的新列表（不修改会话），只包装数据密钥，耗时与保管箱大小无关"""
+        if not self.envelope:
+            raise ValueError("整块加密格式的会话没有密钥槽")
+        slot = KeySlot.wrap(method, secret, self._key, kdf or self.kdf)
+        return [s for s in self.slots if s.method != method] + [slot]
+
+    def header(self) -> bytes:
+        return MAGIC + bytes([FORMAT_VERSION]) + self.salt
+
+    def seal(self, plaintext: bytes, aad: bytes = None) -> bytes:
+        """用会话密钥加密一段数据，返回 nonce + 密文"""
+        nonce = os.urandom(NONCE_SIZE)
+        return nonce + self._aesgcm.encrypt(nonce, plaintext, aad)
+
+    def open(self, sealed: bytes, aad: bytes = None) -> bytes:
+        """seal 的逆操作，认证失败抛出 InvalidTag"""
+        return self._aesgcm.decrypt(sealed[:NONCE_SIZE], sealed[NONCE_SIZE:], aad)
+
+    def keyed_hash(self, data: bytes) -> bytes:
+        """HMAC-SHA256，用于在不泄露明文的情况下建立可查找的索引"""
+        h = hmac.HMAC(self._mac_key, hashes.SHA256())
+        h.update(data)
+        return h.finalize()
+
+    def encrypt(self, plaintext: str) -> bytes:
+        if self.envelope:
+            raise ValueError("信封加密的会话不能读写整块加密格式，请使用 encrypt_data / decrypt_data")
+        # 整块格式的头部不记录派生参数，只能使用 LEGACY_KDF
+        if self.kdf != LEGACY_KDF:
+            raise ValueError("整块加密格式只支持默认的 PBKDF2 参数")
+        header = self.header()
+        # 头部作为关联数据参与认证，篡改版本号或 salt 都会导致解密失败
+        return header + self.seal(plaintext.encode(), header)
+
+    def decrypt(self, encrypted_data: bytes) -> str:
+        if self.envelope:
+            # 数据密钥是随机的，也没有保留主密码，无法派生整块格式的密钥
+            raise ValueError("信封加密的会话不能读写整块加密格式，请使用 encrypt_data / decrypt_data")
+        salt = read_salt(encrypted_data)
+        if salt == self.salt and self.kdf == LEGACY_KDF:
+            aesgcm = self._aesgcm
+        else:
+            # 文件由其他会话写入（salt 或派生参数不同），需要重新派生
+            aesgcm = AESGCM(derive_key(self._password, salt))
+        if not is_versioned(encrypted_data):
+            # 旧格式：salt 同时用作 nonce，无关联数据
+            return aesgcm.decrypt(salt, encrypted_data[SALT_SIZE:], None).decode()
+        header = encrypted_data[:HEADER_SIZE]
+        nonce = encrypted_data[HEADER_SIZE:HEADER_SIZE + NONCE_SIZE]
+        ciphertext = encrypted_data[HEADER_SIZE + NONCE_SIZE:]
+        return aesgcm.decrypt(nonce, ciphertext, header).decode()
+
+
+def is_versioned(encrypted_data: bytes) -> bool:
+    return (
+        len(encrypted_data) > HEADER_SIZE
+        and encrypted_data[:len(MAGIC)] == MAGIC
+        and encrypted_data[len(MAGIC)] == FORMAT_VERSION
     )
-    return kdf.derive(password.encode())
+
+
+def read_salt(encrypted_data: bytes) -> bytes:
+    """返回数据所用的 salt（兼容旧格式）"""
+    if is_versioned(encrypted_data):
+        return encrypted_data[len(MAGIC) + 1:HEADER_SIZE]
+    return encrypted_data[:SALT_SIZE]
 
 
 def encrypt_data(plaintext: str, password: str) -> bytes:
-    salt = os.urandom(16)
-    key = derive_key(password, salt)
-    aesgcm = AESGCM(key)
-    ciphertext = aesgcm.encrypt(salt, plaintext.encode(), None)
-    return salt + ciphertext
+    return VaultSession(password).encrypt(plaintext)
 
 
 def decrypt_data(encrypted_data: bytes, password: str) -> str:
-    salt = encrypted_data[:16]
-    ciphertext = encrypted_data[16:]
-    key = derive_key(password, salt)
-    aesgcm = AESGCM(key)
-    plaintext = aesgcm.decrypt(salt, ciphertext, None)
-    return plaintext.decode()
+    return VaultSession(password, read_salt(encrypted_data)).decrypt(encrypted_data)
@@ -0,0 +1,150 @@
+"""数据库驱动插件：每种数据库声明表单字段、默认端口和探测函数，客户端库在第一次探测时才导入
+
+新增一种数据库只需定义一个 Driver 子类并用 @register 注册，表单和连接测试会自动使用它。
+"""
+import importlib
+import os
+import threading
+from typing import NamedTuple
+
+DRIVERS = {}
+
+
+class Field(NamedTuple):
+    key: str  # 条目中的字段名
+    label: str
+    kind: str = "text"  # text / password / path
+
+
+HOST = Field("host", "主机:")
+PORT = Field("port", "端口:")
+USERNAME = Field("username", "用户名:")
+PASSWORD = Field("password", "密码:", "password")
+DATABASE_NAME = Field("database_name", "数据库名:")
+SQLITE_PATH = Field("sqlite_path", "数据库文件:", "path")
+
+CONNECT_TIMEOUT = 5
+
+
+class MissingDriverError(Exception):
+    """所需的客户端库没有安装"""
+
+
+class ConfigError(Exception):
+    """条目缺少连接所需的信息（例如没有指定文件），不需要尝试连接"""
+
+
+class Driver:
+    name = ""  # 条目中 db_type 的取值，也是界面上显示的名称
+    module = None  # 客户端库的模块名
+    default_port = None
+    fields = (HOST, PORT, USERNAME, PASSWORD, DATABASE_NAME)
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        """第一次调用时才导入客户端库"""
+        with self._lock:
+            if self._client is None:
+                try:
+                    self._client = importlib.import_module(self.module)
+                except ImportError as e:
+                    raise MissingDriverError(f"缺少 {self.name} 客户端库 {self.module}，请先安装") from e
+            return self._client
+
+    @property
+    def field_keys(self):
+        return tuple(field.key for field in self.fields)
+
+    def location(self, entry) -> str:
+        """表格“位置”列显示的内容"""
+        return f"{entry.get('host', '')}:{entry.get('port', '')}"
+
+    def port(self, entry) -> int:
+        return int(entry.get("port") or self.default_port)
+
+    def probe(self, entry) -> str:
+        """测试连接，成功时返回结果文字，失败时抛出异常（条目信息不全时抛出 ConfigError）"""
+        raise NotImplementedError
+
+
+def register(driver_cls):
+    DRIVERS[driver_cls.name] = driver_cls()
+    return driver_cls
+
+
+def get_driver(db_type):
+    """按 db_type 查找驱动（不区分大小写），找不到返回 None"""
+    driver = DRIVERS.get(db_type)
+    if driver is None and db_type:
+        driver = next((d for name, d in DRIVERS.items() if name.lower() == db_type.lower()), None)
+    return driver
+
+
+def driver_names():
+    """按注册顺序返回驱动名称；界面下拉框按此排列，第一个（MySQL）为新条目的默认类型"""
+    return list(DRIVERS)
+
+
+@register
+class MySQLDriver(Driver):
+    name = "MySQL"
+    module = "pymysql"
+    default_port = 3306
+
+    def probe(self, entry) -> str:
+        conn = self.client().connect(
+            host=entry.get("host"),
+            port=self.port(entry),
+            user=entry.get("username"),
+            password=entry.get("password"),
+            database=entry.get("database_name"),
+            connect_timeout=CONNECT_TIMEOUT
+        )
+        conn.close()
+        return "✅ MySQL 连接成功"
+
+
+@register
+class PostgreSQLDriver(Driver):
+    name = "PostgreSQL"
+    module = "psycopg2"
+    default_port = 5432
+
+    def probe(self, entry) -> str:
+        conn = self.client().connect(
+            host=entry.get("host"),
+            port=self.port(entry),
+            user=entry.get("username"),
+            password=entry.get("password"),
+            dbname=entry.get("database_name"),
+            connect_timeout=CONNECT_TIMEOUT
+        )
+        conn.close()
+        return "✅ PostgreSQL 连接成功"
+
+
+@register
+class SQLiteDriver(Driver):
+    name = "SQLite"
+    module = "sqlite3"
+    fields = (SQLITE_PATH,)
+
+    def location(self, entry) -> str:
+        return entry.get("sqlite_path", "")
+
+    def probe(self, entry) -> str:
+        path = entry.get("sqlite_path", "").strip()
+        if not path:
+            raise ConfigError("未指定数据库文件路径")
+        if not os.path.exists(path):
+            raise ConfigError(f"文件不存在: {path}")
+        # 尝试连接并执行简单查询
+        conn = self.client().connect(path)
+        try:
+            conn.execute("SELECT 1;").fetchone()
+        finally:
+            conn.close()
+        return "✅ SQLite 连接成功"
@@ -1,65 +1,150 @@
-import os
-import sqlite3
+import threading
+import time
+from collections import deque
 from typing import Dict, Any
 
-import psycopg2
-import pymysql
+from .db_drivers import ConfigError, MissingDriverError, get_driver
+from .health import HostLimiter, shared_cache
+from .tasks import IO_LANE, IO_WORKERS, shared_executor
 
 
 def test_database_connection(entry: Dict[str, Any]) -> str:
-    db_type = entry.get("db_type", "").lower()
-    print(entry)
+    driver = get_driver(entry.get("db_type", ""))
+    if driver is None:
+        return "❌ 不支持的数据库类型"
     try:
-        if db_type == "sqlite":
-            path = entry.get("sqlite_path", "").strip()
-            if not path:
-                return "❌ 未指定数据库文件路径"
-            if not os.path.exists(path):
-                return f"❌ 文件不存在: {path}"
-            # 尝试连接并执行简单查询
-            conn = sqlite3.connect(path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1;")
-            cursor.fetchone()
-            conn.close()
-            return "✅ SQLite 连接成功"
-
-        elif db_type == "mysql":
-            host = entry.get("host")
-            port = int(entry.get("port", 3306))
-            user = entry.get("username")
-            password = entry.get("password")
-            database = entry.get("database_name")
-            conn = pymysql.connect(
-                host=host,
-                port=port,
-                user=user,
-                password=password,
-                database=database,
-                connect_timeout=5
-            )
-            conn.close()
-            return "✅ MySQL 连接成功"
-
-        elif db_type == "postgresql":
-            host = entry.get("host")
-            port = int(entry.get("port", 5432))
-            user = entry.get("username")
-            password = entry.get("password")
-            database = entry.get("database_name")
-            conn = psycopg2.connect(
-                host=host,
-                port=port,
-                user=user,
-                password=password,
-                dbname=database,
-                connect_timeout=5
-            )
-            conn.close()
-            return "✅ PostgreSQL 连接成功"
+        return driver.probe(entry)
+    except (ConfigError, MissingDriverError) as e:
+        return f"❌ {e}"
+    except Exception as e:
+        return f"❌ 连接失败: {str(e)}"
+
+
+# 批量测试时同时进行的连接数，与执行器 I/O 通道的线程数一致（多提交的测试只会在通道中排队，无法取消）
+DEFAULT_CONCURRENCY = IO_WORKERS
+
+
+class ConnectionTester:
+    """在任务执行器的 I/O 通道中测试数据库连接，界面线程不再等待连接超时
+
+    executor 默认为进程共用的执行器（core.tasks.shared_executor），需要有 IO_LANE 通道。
+    回调 callback(条目, 结果) 在工作线程中执行，界面需要自行切回 GUI 线程。
+    条目在提交时复制一份（可能触发机密字段解密），工作线程不接触原条目。
+    给定 cache 时每次的结果和耗时都记入该 HealthCache；给定 limiter 时对同一主机的探测经其限流。
+    """
+
+    def __init__(self, test_func=None, cache=None, limiter=None, executor=None):
+        self.test_func = test_func or test_database_connection
+        self.cache = cache
+        self.limiter = limiter
+        self._executor = executor or shared_executor()
+
+    def submit(self, entry, callback):
+        return self._submit(entry, dict(entry), callback)
+
+    def _submit(self, entry, snapshot, callback):
+        def run():
+            host = snapshot.get("host") or None  # SQLite 是本地文件，不需要限流
+            if self.limiter is not None and host:
+                self.limiter.acquire(host)
+            start = time.perf_counter()
+            try:
+                result = self.test_func(snapshot)
+            except Exception as e:
+                result = f"❌ 连接失败: {str(e)}"
+            finally:
+                if self.limiter is not None and host:
+                    self.limiter.release(host)
+            if self.cache is not None:
+                self.cache.put(snapshot, result, time.perf_counter() - start)
+            callback(entry, result)
+            return result
+        return self._executor.submit(run, lane=IO_LANE)
+
+    def test_all(self, entries, on_result=None, on_done=None, concurrency: int = DEFAULT_CONCURRENCY):
+        """批量测试，同时进行的测试不超过 concurrency 个；返回可取消的 TestBatch"""
+        batch = TestBatch(self, entries, concurrency, on_result, on_done)
+        batch.start()
+        return batch
+
+
+_shared_tester = None
+_shared_lock = threading.Lock()
 
+
+def shared_tester() -> ConnectionTester:
+    """进程内共用的连接测试器，主窗口和编辑对话框都通过它提交测试"""
+    global _shared_tester
+    with _shared_lock:
+        if _shared_tester is None:
+            _shared_tester = ConnectionTester(cache=shared_cache(), limiter=HostLimiter())
+        return _shared_tester
+
+
+class TestBatch:
+    """一次批量测试：完成一个再启动下一个，保证并发上限；取消后不再启动新的测试
+
+    on_result(条目, 结果) 每完成一个调用一次，on_done(batch) 在全部结束（或取消后正在进行的都结束）时调用一次，
+    两者都可能在工作线程中执行。
+    """
+
+    def __init__(self, tester, entries, concurrency, on_result=None, on_done=None):
+        self.tester = tester
+        self.on_result = on_result
+        self.on_done = on_done
+        self.concurrency = max(1, concurrency)
+        self._pending = deque((entry, dict(entry)) for entry in entries)
+        self.total = len(self._pending)
+        self.done = 0
+        self.cancelled = False
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        if not self._pending:
+            self._finish()
+            return
+        for _ in range(min(self.concurrency, len(self._pending))):
+            self._next()
+
+    @property
+    def finished(self) -> bool:
+        with self._lock:
+            return self._running == 0 and (self.cancelled or not self._pending)
+
+    def _next(self):
+        with self._lock:
+            if self.cancelled or not self._pending:
+                return
+            entry, snapshot = self._pending.popleft()
+            self._running += 1
+        self.tester._submit(entry, snapshot, self._on_finished)
+
+    def _on_finished(self, entry, result):
+        with self._lock:
+            self.done += 1
+            self._running -= 1
+            last = self._running == 0 and (self.cancelled or not self._pending)
+        if self.on_result is not None:
+            self.on_result(entry, result)
+        if last:
+            self._finish()
         else:
-            return "❌ 不支持的数据库类型"
+            self._next()
 
-    except Exception as e:
-        return f"❌ 连接失败: {str(e)}"
+    def _finish(self):
+        if self.on_done is not None:
+            self.on_done(self)
+
+    def cancel(self):
+        """不再启动剩余的测试，返回未开始测试的条目；正在进行的测试结束后仍会回调"""
+        with self._lock:
+            if self.cancelled:
+                return []
+            self.cancelled = True
+            skipped = [entry for entry, _ in self._pending]
+            self._pending.clear()
+            idle = self._running == 0
+        if idle:
+            self._finish()
+        return skipped
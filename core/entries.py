@@ -0,0 +1,235 @@
+"""类型化条目：网站、服务器、数据库各一个带 __slots__ 的类，字段固定，按类型分派只在构造时发生一次
+
+条目实现 MutableMapping 接口（get / [] / in / items，与内容相同的 dict 相等），按 dict 读写条目的代码不用修改，
+但每个条目只占几个槽位而不是一张散列表。schema 之外的字段（旧版本或手工编辑的文件）放在 extra 中原样保留；
+没有 type 或 type 未知的条目由 make_entry() 原样返回 dict，旧的保管箱和导入文件照常读取。
+
+从记录格式读出的条目只含列表字段，访问其他字段时才通过 loader 解密补全（与 records.LazyEntry 相同）。
+"""
+from collections.abc import Mapping, MutableMapping
+
+from .db_drivers import PASSWORD, get_driver
+from .serialize import pack, unpack
+from .validation import validate_entry
+
+_MISSING = object()
+
+
+def to_json(obj):
+    """json 的 default 钩子：把条目转换为 dict"""
+    if isinstance(obj, Entry):
+        return obj.to_dict()
+    raise TypeError(f"无法序列化为 JSON：{type(obj).__name__}")
+
+
+class Entry(MutableMapping):
+    """条目基类；子类在 FIELDS 中声明 schema（以 name 开头，不含 type），同名的槽位未赋值表示该字段不存在"""
+
+    __slots__ = ("_extra", "_loader", "_fields", "digest")
+    TYPE = ""
+    FIELDS = ()
+    _FIELD_SET = frozenset()
+    _SETTERS = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._FIELD_SET = frozenset(cls.FIELDS)
+        cls._SETTERS = {key: getattr(cls, key).__set__ for key in cls.FIELDS}
+
+    def __init__(self, **fields):
+        self._init(fields)
+
+    def _init(self, data, loader=None, fields=None, digest=None):
+        self._extra = None
+        self._loader = loader
+        self._fields = fields  # 已解密的字段，loader 为 None 时不使用
+        self.digest = digest  # 保存时的摘要，只对未解密的条目有意义
+        self._assign(data)
+
+    def _assign(self, data):
+        setters = self._SETTERS
+        for key, value in data.items():
+            setter = setters.get(key)
+            if setter is not None:
+                setter(self, value)
+            elif key != "type":
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[key] = value
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        return make_entry(unpack(data))
+
+    def to_bytes(self) -> bytes:
+        """二进制序列化（见 core.serialize），与保管箱载荷和内容摘要相同"""
+        return pack(self)
+
+    # ---------- 延迟解密 ----------
+
+    @property
+    def resolved(self) -> bool:
+        return self._loader is None
+
+    def resolve(self):
+        loader = self._loader
+        if loader is not None:
+            self._assign(loader(self._listing()))
+            self._loader = None  # 字段都赋值后才标记，其他线程不会读到不完整的条目
+        return self
+
+    def _listing(self) -> dict:
+        """已解密的字段（不触发解密），键顺序与界面创建的条目一致：name、type、其余字段"""
+        data = {}
+        for key in self.FIELDS:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                data[key] = value
+            if key == "name":
+                data["type"] = self.TYPE
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    # ---------- Mapping 接口 ----------
+
+    def get(self, key, default=None):
+        if self._loader is not None and key not in self._fields:
+            self.resolve()
+        if key in self._FIELD_SET:
+            return getattr(self, key, default)
+        if key == "type":
+            return self.TYPE
+        extra = self._extra
+        return extra.get(key, default) if extra is not None else default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __setitem__(self, key, value):
+        self.resolve()
+        if key in self._FIELD_SET:
+            self._SETTERS[key](self, value)
+        elif key == "type":
+            if value != self.TYPE:
+                raise ValueError(f"不能把 {self.TYPE} 条目改为 {value}，请创建新条目")
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        self.resolve()
+        if key in self._FIELD_SET and hasattr(self, key):
+            delattr(self, key)
+        elif key == "type":
+            raise ValueError("条目类型不能删除")
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    # 遍历、比较需要完整的条目；keys / items / values 返回同一时刻的快照
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __len__(self):
+        return len(self.to_dict())
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def values(self):
+        return self.to_dict().values()
+
+    def to_dict(self) -> dict:
+        return self.resolve()._listing()
+
+    def copy(self) -> dict:
+        return self.to_dict()
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        # 不解密、不显示机密字段
+        return f"<{type(self).__name__} {getattr(self, 'name', '')!r}>"
+
+    # ---------- 类型相关 ----------
+
+    def problems(self):
+        """校验结果 [(级别, 字段, 说明)]，规则见 core.validation"""
+        return validate_entry(self)
+
+    def location(self) -> str:
+        """表格“位置”列显示的内容"""
+        return ""
+
+    def has_password(self) -> bool:
+        return True
+
+
+class WebsiteEntry(Entry):
+    TYPE = "Website"
+    FIELDS = ("name", "url", "username", "password")
+    __slots__ = FIELDS
+
+    def location(self) -> str:
+        return self.get("url", "")
+
+
+class ServerEntry(Entry):
+    TYPE = "Server"
+    FIELDS = ("name", "ip", "port", "username", "password")
+    __slots__ = FIELDS
+
+    def location(self) -> str:
+        return self.get("ip", "")
+
+
+class DatabaseEntry(Entry):
+    TYPE = "Database"
+    FIELDS = ("name", "db_type", "host", "port", "username", "password", "database_name", "sqlite_path")
+    __slots__ = FIELDS
+
+    def location(self) -> str:
+        driver = get_driver(self.get("db_type", ""))
+        if driver is not None:
+            return driver.location(self)
+        return f"{self.get('host', '')}:{self.get('port', '')}"
+
+    def has_password(self) -> bool:
+        # 没有密码字段的数据库（如 SQLite）密码列留空
+        driver = get_driver(self.get("db_type", ""))
+        return driver is None or PASSWORD in driver.fields
+
+
+ENTRY_TYPES = {cls.TYPE: cls for cls in (WebsiteEntry, ServerEntry, DatabaseEntry)}
+
+
+def make_entry(data, loader=None, fields=None, digest=None):
+    """按 type 构造类型化条目；已经是条目时原样返回，type 未知时返回 dict（兼容层）
+
+    loader / fields / digest 用于延迟解密：data 只含 fields 中的字段，其余字段由 loader(已解密的字段) 补全。
+    """
+    if isinstance(data, Entry):
+        return data
+    cls = ENTRY_TYPES.get(data.get("type")) if isinstance(data, dict) else None
+    if cls is None:
+        return data
+    entry = cls.__new__(cls)
+    entry._init(data, loader, fields, digest)
+    return entry
@@ -0,0 +1,111 @@
+"""可观察的条目列表：增删改时通知监听者具体变化了哪些位置，界面据此只更新受影响的行"""
+
+
+class EntryList(list):
+    """list 的子类，修改时依次回调监听者的以下方法（监听者只需实现需要的部分）：
+
+    entries_removing(start, count)  删除之前
+    entries_removed(start, count)   删除之后
+    entries_inserted(start, count)  插入之后
+    entry_replaced(index)           替换之后
+    entries_reset()                 其他无法细分的修改（排序、切片赋值等）之后
+    """
+
+    def __init__(self, entries=()):
+        super().__init__(entries)
+        self._listeners = []
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, event, *args):
+        for listener in list(self._listeners):
+            method = getattr(listener, event, None)
+            if method is not None:
+                method(*args)
+
+    def _position(self, index: int) -> int:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("list index out of range")
+        return index
+
+    def index_of(self, entry) -> int:
+        """按对象身份查找（不比较内容，避免触发延迟解密）；找不到返回 -1"""
+        for i, e in enumerate(self):
+            if e is entry:
+                return i
+        return -1
+
+    # ---------- 插入 ----------
+
+    def append(self, entry):
+        super().append(entry)
+        self._notify("entries_inserted", len(self) - 1, 1)
+
+    def extend(self, entries):
+        start = len(self)
+        super().extend(entries)
+        if len(self) > start:
+            self._notify("entries_inserted", start, len(self) - start)
+
+    def __iadd__(self, entries):
+        self.extend(entries)
+        return self
+
+    def insert(self, index, entry):
+        index = max(0, min(len(self), index + len(self) if index < 0 else index))
+        super().insert(index, entry)
+        self._notify("entries_inserted", index, 1)
+
+    # ---------- 删除 ----------
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            super().__delitem__(index)
+            self._notify("entries_reset")
+            return
+        index = self._position(index)
+        self._notify("entries_removing", index, 1)
+        super().__delitem__(index)
+        self._notify("entries_removed", index, 1)
+
+    def pop(self, index=-1):
+        index = self._position(index)
+        entry = self[index]
+        del self[index]
+        return entry
+
+    def remove(self, entry):
+        del self[self.index(entry)]
+
+    def clear(self):
+        count = len(self)
+        if count:
+            self._notify("entries_removing", 0, count)
+            super().clear()
+            self._notify("entries_removed", 0, count)
+
+    # ---------- 替换与其他修改 ----------
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            super().__setitem__(index, value)
+            self._notify("entries_reset")
+            return
+        index = self._position(index)
+        super().__setitem__(index, value)
+        self._notify("entry_replaced", index)
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._notify("entries_reset")
+
+    def reverse(self):
+        super().reverse()
+        self._notify("entries_reset")
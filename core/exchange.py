@@ -0,0 +1,130 @@
+"""JSON 导入导出：界面和基准测试共用
+
+除整个文件是一个 JSON 数组的格式外，还支持 NDJSON（每行一个条目，扩展名 .ndjson / .jsonl）：
+逐行写出、逐行读取校验去重，内存占用与文件大小无关，可以随时报告进度和取消。
+"""
+import json
+import os
+
+from .entries import make_entry, to_json
+from .merge import entry_hash
+from .validation import ValidationReport
+
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+
+# 流式读写时每处理这么多条报告一次进度
+PROGRESS_EVERY = 500
+
+
+def is_ndjson(path: str) -> bool:
+    return path.lower().endswith(NDJSON_SUFFIXES)
+
+
+def export_json(entries, path: str):
+    """把条目写入 JSON 文件（保留中文、缩进格式化）"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False, indent=2, default=to_json)
+
+
+def read_json(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def export_ndjson(entries, path: str, progress=None) -> bool:
+    """每行写出一个条目；progress(已写条数, 总条数) 返回 False 时取消
+
+    先写入临时文件，完成后再替换 path；取消或出错时删除临时文件，返回是否完成。
+    """
+    tmp = path + ".tmp"
+    total = len(entries)
+    cancelled = False
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            for done, entry in enumerate(entries, 1):
+                f.write(json.dumps(entry, ensure_ascii=False, default=to_json))
+                f.write("\n")
+                if progress is not None and done % PROGRESS_EVERY == 0 and progress(done, total) is False:
+                    cancelled = True
+                    break
+        if not cancelled:
+            os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return not cancelled
+
+
+class ImportResult:
+    """导入的结果：新条目、与现有条目同名但内容不同的条目、有效条目数、重复数、校验报告、是否被取消
+
+    通过校验的条目转换为类型化条目（core.entries）；changed 中的条目交给 core.merge.merge() 按策略合并，
+    重复指与现有条目内容相同，或与文件中前面的条目同名。
+    """
+
+    def __init__(self, existing, unit: str = "项"):
+        self.new_entries = []
+        self.changed = []
+        self.valid = 0
+        self.duplicates = 0
+        self.report = ValidationReport(unit)
+        self.cancelled = False
+        self._existing = {}
+        for entry in existing:
+            self._existing.setdefault(entry["name"], entry)
+        self._seen = set()
+
+    def _offer(self, position: int, item):
+        # 校验通过且名称在文件中第一次出现的条目才导入；同名时才计算内容散列
+        if not self.report.check(position, item):
+            return
+        item = make_entry(item)
+        self.valid += 1
+        name = item["name"]
+        if name in self._seen:
+            self.duplicates += 1
+            return
+        self._seen.add(name)
+        current = self._existing.get(name)
+        if current is None:
+            self.new_entries.append(item)
+        elif entry_hash(current) == entry_hash(item):
+            self.duplicates += 1
+        else:
+            self.changed.append(item)
+
+
+def import_entries(items, existing) -> ImportResult:
+    """一次校验整批条目（例如 JSON 数组或脚本生成的列表）并按 name 去重，不合格的条目汇总在 result.report 中"""
+    result = ImportResult(existing)
+    for position, item in enumerate(items, 1):
+        result._offer(position, item)
+    return result
+
+
+def import_ndjson(path: str, existing, progress=None) -> ImportResult:
+    """逐行读取、校验并按 name 去重（包括与文件中前面的条目重复），问题汇总在 result.report 中
+
+    只有新条目留在内存中；progress(已读字节, 文件字节数) 返回 False 时停止读取，result.cancelled 为 True。
+    """
+    result = ImportResult(existing, unit="行")
+    total = os.path.getsize(path)
+    read = 0
+    with open(path, "rb") as f:
+        for line_no, line in enumerate(f, 1):
+            read += len(line)
+            if progress is not None and line_no % PROGRESS_EVERY == 0 and progress(read, total) is False:
+                result.cancelled = True
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                result.report.reject(line_no, f"不是有效的 JSON：{e}")
+                continue
+            result._offer(line_no, item)
+    if progress is not None and not result.cancelled:
+        progress(total, total)
+    return result
@@ -0,0 +1,96 @@
+"""数据库连接健康状态：记住最近一次测试的结果、耗时和时间，并限制对同一主机的探测频率"""
+import threading
+import time
+from collections import defaultdict
+from typing import NamedTuple, Optional
+
+# 状态超过该秒数视为过期，后台会重新探测
+DEFAULT_TTL = 600
+
+# 决定“同一个连接”的字段；都在列表段中，读取时不会触发机密字段的解密
+CONNECTION_FIELDS = ("db_type", "host", "port", "username", "database_name", "sqlite_path")
+
+
+class HealthStatus(NamedTuple):
+    ok: bool
+    message: str
+    latency: float  # 秒
+    checked_at: float  # time.time()
+
+
+class HealthCache:
+    """按连接参数保存最近一次的测试结果，可在多个线程中读写"""
+
+    def __init__(self, ttl: float = DEFAULT_TTL):
+        self.ttl = ttl
+        self._items = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(entry):
+        return tuple(str(entry.get(field) or "") for field in CONNECTION_FIELDS)
+
+    def put(self, entry, message: str, latency: float, checked_at: float = None) -> HealthStatus:
+        status = HealthStatus(message.startswith("✅"), message, latency,
+                              time.time() if checked_at is None else checked_at)
+        with self._lock:
+            self._items[self.key(entry)] = status
+        return status
+
+    def get(self, entry) -> Optional[HealthStatus]:
+        with self._lock:
+            return self._items.get(self.key(entry))
+
+    def is_stale(self, entry, now: float = None) -> bool:
+        status = self.get(entry)
+        now = time.time() if now is None else now
+        return status is None or now - status.checked_at >= self.ttl
+
+    def invalidate(self, entry):
+        with self._lock:
+            self._items.pop(self.key(entry), None)
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache() -> HealthCache:
+    """进程内共用的健康状态缓存"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = HealthCache()
+        return _shared_cache
+
+
+class HostLimiter:
+    """限流：同一主机同时进行的探测不超过 per_host 个，相邻两次开始至少间隔 interval 秒
+
+    不同主机之间互不影响，批量测试仍然并发进行。
+    """
+
+    def __init__(self, per_host: int = 2, interval: float = 0.1):
+        self.per_host = per_host
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._active = defaultdict(int)
+        self._last = {}
+
+    def acquire(self, host):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = self._last.get(host, now - self.interval) + self.interval - now
+                if self._active[host] < self.per_host and wait <= 0:
+                    break
+                self._cond.wait(wait if wait > 0 else None)
+            self._active[host] += 1
+            self._last[host] = now
+
+    def release(self, host):
+        with self._cond:
+            self._active[host] -= 1
+            if not self._active[host]:
+                del self._active[host]
+            self._cond.notify_all()
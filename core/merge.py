@@ -0,0 +1,222 @@
+"""按内容散列合并条目：导入时识别同名但内容不同的条目，以及两个保管箱之间的同步
+
+条目以 name 标识，内容散列与记录格式中保存的摘要相同（core.serialize 二进制序列化的 SHA-256），
+未解密的条目直接使用保存时的摘要，计算散列不需要解密。
+
+VaultSummary 是两层的 Merkle 摘要：按名称的 CRC32 分到 BUCKET_COUNT 个桶，每个桶对桶内
+条目散列（已包含名称）排序后求摘要，根摘要覆盖所有桶。比较两个摘要时先比根、再比桶，只展开不同的桶，
+两边相同的保管箱比较只需一次比较，工作量与变化的条目数相关。
+
+merge() 做字段级三方合并：给出共同祖先 base 时，只有一方修改的字段自动合并，
+双方都改且结果不同的字段是冲突，按策略处理；没有 base 时（例如导入文件）两边不同的字段都视为冲突。
+"""
+import hashlib
+import zlib
+from typing import NamedTuple
+
+from .entries import make_entry
+from .records import _entry_digest
+
+KEEP_MINE = "mine"
+TAKE_THEIRS = "theirs"
+KEEP_BOTH = "both"
+POLICY_LABELS = {
+    KEEP_MINE: "保留我的",
+    TAKE_THEIRS: "采用对方的",
+    KEEP_BOTH: "两者都保留",
+}
+
+BUCKET_COUNT = 256
+
+_MISSING = object()
+
+
+def entry_hash(entry) -> bytes:
+    """条目的内容散列，与字段顺序无关"""
+    return _entry_digest(entry)
+
+
+class VaultSummary:
+    """一组条目的 Merkle 摘要；同名条目只取第一个"""
+
+    def __init__(self, entries):
+        self.entries = {}  # name -> 条目（保持原顺序）
+        self.hashes = {}  # name -> 内容散列
+        self._buckets = [[] for _ in range(BUCKET_COUNT)]  # 桶内的名称
+        for entry in entries:
+            name = entry.get("name")
+            if name in self.entries:
+                continue
+            self.entries[name] = entry
+            self.hashes[name] = entry_hash(entry)
+            self._buckets[zlib.crc32(str(name).encode()) % BUCKET_COUNT].append(name)
+        self._bucket_digests = [None] * BUCKET_COUNT
+        self._root = None
+
+    def bucket_digest(self, index: int) -> bytes:
+        if self._bucket_digests[index] is None:
+            hashes = self.hashes
+            digests = sorted(hashes[name] for name in self._buckets[index])
+            self._bucket_digests[index] = hashlib.sha256(b"".join(digests)).digest()
+        return self._bucket_digests[index]
+
+    @property
+    def root(self) -> bytes:
+        if self._root is None:
+            self._root = hashlib.sha256(b"".join(self.bucket_digest(i) for i in range(BUCKET_COUNT))).digest()
+        return self._root
+
+    def diff(self, other: "VaultSummary"):
+        """返回 (只在 self 中的名称, 只在 other 中的名称, 两边内容不同的名称)"""
+        only_self, only_other, changed = [], [], []
+        if self.root == other.root:
+            return only_self, only_other, changed
+        for i in range(BUCKET_COUNT):
+            if self.bucket_digest(i) == other.bucket_digest(i):
+                continue
+            theirs = other.hashes
+            for name in self._buckets[i]:
+                digest = theirs.get(name)
+                if digest is None:
+                    only_self.append(name)
+                elif digest != self.hashes[name]:
+                    changed.append(name)
+            only_other.extend(name for name in other._buckets[i] if name not in self.hashes)
+        return only_self, only_other, changed
+
+
+class Conflict(NamedTuple):
+    """一处冲突；field 为空表示一方删除、另一方修改了整个条目，缺失的值为 None"""
+    name: str
+    field: str
+    base: object
+    mine: object
+    theirs: object
+
+
+def _merge_fields(base, mine, theirs):
+    """字段级三方合并，返回 (合并结果（冲突字段取我方的值）, 冲突字段列表)"""
+    merged, conflicts = {}, []
+    keys = list(mine) + [key for key in theirs if key not in mine]
+    for key in keys:
+        m, t = mine.get(key, _MISSING), theirs.get(key, _MISSING)
+        b = base.get(key, _MISSING) if base is not None else _MISSING
+        if m == t or (base is not None and t == b):
+            value = m
+        elif base is not None and m == b:
+            value = t
+        else:
+            conflicts.append(key)
+            value = m
+        if value is not _MISSING:
+            merged[key] = value
+    return merged, conflicts
+
+
+def _value(value):
+    return None if value is _MISSING else value
+
+
+def _copy_name(name, taken) -> str:
+    n = 2
+    while f"{name} ({n})" in taken:
+        n += 1
+    copy = f"{name} ({n})"
+    taken.add(copy)
+    return copy
+
+
+class MergeResult:
+    """合并结果：对我方条目的修改（新增、按名称替换、按名称删除）、冲突和未变化的条目数
+
+    新增和替换的条目都是类型化条目（core.entries，类型未知时为 dict）。
+    """
+
+    def __init__(self):
+        self.added = []
+        self.updated = {}  # name -> 新条目
+        self.removed = set()
+        self.conflicts = []
+        self.unchanged = 0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.updated or self.removed)
+
+    def summary(self) -> str:
+        parts = [f"新增 {len(self.added)} 个", f"更新 {len(self.updated)} 个", f"删除 {len(self.removed)} 个"]
+        if self.conflicts:
+            parts.append(f"冲突 {len(self.conflicts)} 处")
+        return "，".join(parts)
+
+    def apply(self, entries):
+        """把修改应用到条目列表（可以是 EntryList，界面只更新受影响的行）"""
+        remove = []
+        seen = set()
+        for i, entry in enumerate(entries):
+            name = entry.get("name")
+            if name in seen:
+                continue
+            seen.add(name)
+            if name in self.updated:
+                entries[i] = self.updated[name]
+            elif name in self.removed:
+                remove.append(i)
+        for i in reversed(remove):
+            del entries[i]
+        entries.extend(self.added)
+        return entries
+
+
+def merge(mine, theirs, base=None, policy: str = KEEP_MINE) -> MergeResult:
+    """把 theirs 合并到 mine，返回 MergeResult（不修改 mine）；base 为双方的共同祖先，可以省略"""
+    if policy not in POLICY_LABELS:
+        raise ValueError(f"未知的合并策略：{policy}")
+    ours, other = VaultSummary(mine), VaultSummary(theirs)
+    ancestor = VaultSummary(base) if base is not None else None
+    only_mine, only_theirs, changed = ours.diff(other)
+    result = MergeResult()
+    result.unchanged = len(ours.entries) - len(only_mine) - len(changed)
+    taken = set(ours.entries) | set(other.entries)
+
+    for name in only_mine:
+        if ancestor is None or name not in ancestor.hashes:
+            continue  # 我方新增
+        if ancestor.hashes[name] == ours.hashes[name]:
+            result.removed.add(name)  # 对方删除，我方未修改
+            continue
+        result.conflicts.append(Conflict(name, "", ancestor.entries[name], ours.entries[name], None))
+        if policy == TAKE_THEIRS:
+            result.removed.add(name)
+
+    positions = {name: i for i, name in enumerate(other.entries)}
+    for name in sorted(only_theirs, key=positions.get):
+        entry = other.entries[name]
+        if ancestor is not None and name in ancestor.hashes:
+            if ancestor.hashes[name] == other.hashes[name]:
+                continue  # 我方删除，对方未修改
+            result.conflicts.append(Conflict(name, "", ancestor.entries[name], None, entry))
+            if policy == KEEP_MINE:
+                continue
+        result.added.append(make_entry(entry))
+
+    for name in changed:
+        m, t = ours.entries[name], other.entries[name]
+        b = ancestor.entries.get(name) if ancestor is not None else None
+        merged, fields = _merge_fields(b, m, t)
+        for field in fields:
+            result.conflicts.append(Conflict(name, field, _value(b.get(field, _MISSING) if b else _MISSING),
+                                             _value(m.get(field, _MISSING)), _value(t.get(field, _MISSING))))
+        if fields and policy == TAKE_THEIRS:
+            for field in fields:
+                if field in t:
+                    merged[field] = t[field]
+                else:
+                    merged.pop(field, None)
+        elif fields and policy == KEEP_BOTH:
+            result.added.append(make_entry(dict(t, name=_copy_name(name, taken))))
+        if entry_hash(merged) != ours.hashes[name]:
+            result.updated[name] = make_entry(merged)
+        else:
+            result.unchanged += 1
+    return result
@@ -0,0 +1,579 @@
+"""记录级加密容器：每个条目是一条独立 AEAD 加密的记录，修改只追加变化的部分
+
+文件布局：
+    头部区（固定 HEADER_REGION 字节）: 两个 HEADER_COPY 字节的头部副本，各为 MAGIC | 版本号(1B) | 长度(2B) | 头部 JSON | 0 填充
+    记录帧（依次追加）: 类型(1B) | 序号(4B) | 记录 ID(16B) | 长度(4B) | 帧体
+
+头部记录 salt（保管箱标识）、各解锁方式的密钥槽（见 core.crypto.KeySlot）和 generation；
+条目由随机数据密钥加密，修改主密码只重写头部。更新头部时先写入另一个副本并同步到磁盘，再作废旧副本，
+中途断电也总有一个完整的头部，generation 大的副本优先。
+
+PUT 帧体分为两段，打开时只解密列表段：
+    列表段长度(4B) | 列表段 nonce + 密文（摘要 + 名称/类型/位置等列表字段）| 机密段 nonce + 密文（其余字段）
+两段都是二进制序列化（见 core.serialize），单条只有一两百字节，不压缩；摘要按整个条目的二进制序列化计算。
+
+帧头作为关联数据参与认证，序号必须连续，防止记录被重排或从中间删除。
+截断文件末尾则无法发现：截回之前某次保存时的长度得到的仍是完整有效的旧版本，之后的保存会静默丢失。
+头部不记录结尾位置，否则每次保存都要重写并同步头部，而写入中断留下的残缺尾帧本来就按不存在处理。
+机密段以记录 ID 作为关联数据，解密后再用列表段中的摘要校验整个条目。
+同一 ID 的后一条 PUT 覆盖前一条，DELETE 为删除标记；被覆盖的帧是死空间，由压缩回收。
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from collections import deque
+from functools import partial
+
+from cryptography.exceptions import InvalidTag
+
+from .crypto import KeySlot, VaultSession
+from .entries import Entry, make_entry
+from .serialize import pack, unpack
+from .tasks import shared_executor
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DSKR"
+FORMAT_VERSION = 1
+HEADER_COPY = 2048
+HEADER_REGION = 2 * HEADER_COPY
+FRAME = struct.Struct(">BI16sI")  # 类型, 序号, 记录 ID, 数据长度
+LISTING_LEN = struct.Struct(">I")
+DIGEST_SIZE = 16
+SECRET_AAD = b"secret"
+
+KIND_PUT = 1
+KIND_DELETE = 2
+
+# 主窗口列表和搜索需要的字段，打开时即解密；其余字段（密码等）在第一次访问时才解密
+LISTING_FIELDS = frozenset({
+    "name", "type", "url", "ip", "port", "db_type", "host", "sqlite_path", "username", "database_name",
+})
+
+# 死空间超过该值且超过存活数据量时触发后台压缩
+COMPACT_MIN_DEAD = 64 * 1024
+
+
+def is_record_file(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _digest(payload: bytes) -> bytes:
+    # 用于判断条目是否变化，并在延迟解密时校验整个条目
+    return hashlib.sha256(payload).digest()[:DIGEST_SIZE]
+
+
+def _entry_digest(entry) -> bytes:
+    if isinstance(entry, (Entry, LazyEntry)) and not entry.resolved:
+        return entry.digest  # 未解密的条目不可能被修改，沿用保存时的摘要
+    return _digest(pack(entry))
+
+
+def _split(entry):
+    listing, secret = {}, {}
+    for key, value in entry.items():
+        (listing if key in LISTING_FIELDS else secret)[key] = value
+    return listing, secret
+
+
+class LazyEntry(dict):
+    """只含列表字段的条目；访问其他字段时才从文件中解密补全（resolve）
+
+    已知类型的条目以 core.entries 中的类型化条目返回，只有类型未知的条目（兼容层）使用本类。
+    """
+
+    __slots__ = ("digest", "_loader", "_fields")
+
+    def __init__(self, listing: dict, digest: bytes, loader, fields=LISTING_FIELDS):
+        super().__init__(listing)
+        self.digest = digest
+        self._loader = loader
+        self._fields = fields  # 列表段中包含的字段
+
+    @property
+    def resolved(self) -> bool:
+        return self._loader is None
+
+    def resolve(self):
+        if self._loader is not None:
+            dict.update(self, self._loader(dict(dict.items(self))))
+            self._loader = None
+        return self
+
+    def _wants(self, key) -> bool:
+        return self._loader is not None and key not in self._fields
+
+    def __getitem__(self, key):
+        if self._wants(key):
+            self.resolve()
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if self._wants(key):
+            self.resolve()
+        return dict.get(self, key, default)
+
+    def __contains__(self, key):
+        if self._wants(key):
+            self.resolve()
+        return dict.__contains__(self, key)
+
+    # 遍历、比较和修改都需要完整的条目
+    def __iter__(self):
+        return dict.__iter__(self.resolve())
+
+    def __len__(self):
+        return dict.__len__(self.resolve())
+
+    def keys(self):
+        return dict.keys(self.resolve())
+
+    def values(self):
+        return dict.values(self.resolve())
+
+    def items(self):
+        return dict.items(self.resolve())
+
+    def copy(self):
+        return dict(dict.items(self.resolve()))
+
+    def __eq__(self, other):
+        if isinstance(other, LazyEntry):
+            other.resolve()
+        return dict.__eq__(self.resolve(), other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self.resolve(), key, value)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self.resolve(), key)
+
+    def update(self, *args, **kwargs):
+        dict.update(self.resolve(), *args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        return dict.setdefault(self.resolve(), key, default)
+
+    def pop(self, key, *default):
+        return dict.pop(self.resolve(), key, *default)
+
+    def popitem(self):
+        return dict.popitem(self.resolve())
+
+    def clear(self):
+        self._loader = None
+        dict.clear(self)
+
+
+def diff_records(old: dict, digests: list):
+    """对比已保存的记录（有序的 记录 ID -> 摘要）与新的条目摘要列表
+
+    返回 (rids, puts, free)：每个条目对应的记录 ID、需要写入的条目下标、需要删除的记录 ID。
+    内容未变的条目沿用原记录；变化的条目优先沿用同一位置上的旧 ID（编辑），否则分配新 ID（新增）。
+    """
+    unmatched = {}
+    for rid, digest in old.items():
+        unmatched.setdefault(digest, deque()).append(rid)
+    rids = [None] * len(digests)
+    for i, digest in enumerate(digests):
+        if unmatched.get(digest):
+            rids[i] = unmatched[digest].popleft()
+    free = {rid for queue in unmatched.values() for rid in queue}
+
+    old_order = list(old)
+    puts = []
+    for i, rid in enumerate(rids):
+        if rid is not None:
+            continue
+        if i < len(old_order) and old_order[i] in free:
+            rid = old_order[i]
+            free.discard(rid)
+        else:
+            rid = os.urandom(16)
+        rids[i] = rid
+        puts.append(i)
+    return rids, puts, free
+
+
+class RecordStore:
+    name = "records"
+
+    def __init__(self, path: str, session: VaultSession):
+        if not session.envelope:
+            raise ValueError("记录格式需要信封加密的会话（VaultSession.create / unlock）")
+        self.path = path
+        self.session = session
+        self._lock = threading.RLock()
+        # 偏移表：记录 ID -> (帧偏移, 帧长度, 条目摘要)，顺序即条目顺序
+        self._index = {}
+        self._end = HEADER_REGION
+        self._copy = 0  # 当前有效的头部副本
+        self._generation = 0
+        self._seq = 0
+        self._dead = 0
+        self._compacting = False
+        self._map = None  # 只读内存映射，延迟解密时按偏移读取
+
+    # ---------- 头部 ----------
+
+    @staticmethod
+    def _header_aad(meta: dict) -> bytes:
+        return MAGIC + bytes([FORMAT_VERSION]) + json.dumps(meta, sort_keys=True).encode()
+
+    def _header_copy(self, slots=None, generation: int = 0) -> bytes:
+        """一个头部副本；slots 为 None 时使用会话当前的密钥槽"""
+        slots = self.session.slots if slots is None else slots
+        meta = {
+            "salt": self.session.salt.hex(),
+            "keys": [slot.to_dict() for slot in slots],
+            "generation": generation,
+        }
+        # check 用于空库时也能校验主密码，同时认证头部其他字段
+        check = self.session.seal(b"", self._header_aad(meta))
+        body = json.dumps(dict(meta, check=check.hex())).encode()
+        region = MAGIC + bytes([FORMAT_VERSION]) + struct.pack(">H", len(body)) + body
+        if len(region) > HEADER_COPY:
+            raise ValueError("头部过大")
+        return region.ljust(HEADER_COPY, b"\0")
+
+    def _header_bytes(self) -> bytes:
+        # 整体写入时只有第一个副本有效
+        return self._header_copy().ljust(HEADER_REGION, b"\0")
+
+    @staticmethod
+    def _read_header(data: bytes, offset: int = 0) -> dict:
+        if data[offset:offset + len(MAGIC)] != MAGIC:
+            raise ValueError("不是记录格式的数据文件")
+        (length,) = struct.unpack_from(">H", data, offset + len(MAGIC) + 1)
+        start = offset + len(MAGIC) + 3
+        return json.loads(data[start:start + length])
+
+    @classmethod
+    def _read_headers(cls, data):
+        """返回有效的头部副本 [(副本序号, 头部字段)]，generation 大的在前"""
+        # 第一个副本的 MAGIC 和版本号总是有效的（作废副本时保留）
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("不是记录格式的数据文件")
+        if data[len(MAGIC)] != FORMAT_VERSION:
+            raise ValueError(f"不支持的记录格式版本：{data[len(MAGIC)]}")
+        copies = []
+        for copy in range(2):
+            try:
+                copies.append((copy, cls._read_header(data, copy * HEADER_COPY)))
+            except ValueError:
+                continue  # 已作废或写入中断的副本
+        if not copies:
+            raise ValueError("头部已损坏")
+        return sorted(copies, key=lambda c: -c[1]["generation"])
+
+    def update_keys(self, slots):
+        """只重写头部中的密钥槽（修改主密码、添加恢复密钥），耗时与条目数量无关
+
+        先把新头部写入另一个副本并同步到磁盘，再作废当前副本，之后会话采用新的密钥槽。
+        """
+        with self._lock:
+            target = 1 - self._copy
+            header = self._header_copy(slots, self._generation + 1)
+            with open(self.path, "r+b") as f:
+                f.seek(target * HEADER_COPY)
+                f.write(header)
+                f.flush()
+                os.fsync(f.fileno())
+                # 作废旧副本（保留文件开头的 MAGIC 和版本号，长度为 0）
+                f.seek(self._copy * HEADER_COPY)
+                f.write(MAGIC + bytes([FORMAT_VERSION]) + bytes(HEADER_COPY - len(MAGIC) - 1))
+                f.flush()
+                os.fsync(f.fileno())
+            self._copy = target
+            self._generation += 1
+            self.session.use_slots(slots)
+
+    @staticmethod
+    def detect(path: str) -> bool:
+        return is_record_file(path)
+
+    @classmethod
+    def create(cls, path: str, session: VaultSession, entries):
+        """以记录格式写入全部条目并原子替换 path，返回打开的容器"""
+        store = cls(path, session)
+        store.rewrite(entries)
+        return store
+
+    def close(self):
+        with self._lock:
+            self._close_map()
+
+    @classmethod
+    def open(cls, path: str, password: str):
+        """校验主密码（或恢复密钥）并读取列表字段，返回 (store, entries)
+
+        条目只含列表字段，机密字段在第一次访问时才解密。
+        """
+        with open(path, "rb") as f:
+            view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            error = None
+            sessions = {}  # 两个副本的密钥槽相同时只派生一次
+            for copy, meta in cls._read_headers(view):
+                try:
+                    store = cls._unlock(path, copy, meta, password, sessions)
+                    break
+                except InvalidTag as e:  # 密码错误，或该副本已过期
+                    error = e
+            else:
+                raise error
+            store._map = view
+            return store, store._load(view)
+        except Exception:
+            view.close()
+            raise
+
+    @classmethod
+    def _unlock(cls, path, copy, meta, password, sessions):
+        key = json.dumps(meta["keys"], sort_keys=True)
+        if key not in sessions:
+            slots = [KeySlot.from_dict(slot) for slot in meta["keys"]]
+            try:
+                sessions[key] = VaultSession.unlock(slots, password, bytes.fromhex(meta["salt"]))
+            except InvalidTag:
+                sessions[key] = None
+        if sessions[key] is None:
+            raise InvalidTag()
+        store = cls(path, sessions[key])
+        store._copy = copy
+        store._generation = meta["generation"]
+        check = bytes.fromhex(meta.pop("check"))
+        store.session.open(check, store._header_aad(meta))  # 密码错误时抛出 InvalidTag
+        return store
+
+    # ---------- 读取 ----------
+
+    def _view(self):
+        # 追加或重写后重新映射，保证偏移表中的帧都在映射范围内
+        if self._map is None or len(self._map) < self._end:
+            self._close_map()
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _close_map(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _load(self, data):
+        entries = {}
+        pos = HEADER_REGION
+        while pos + FRAME.size <= len(data):
+            kind, seq, rid, length = FRAME.unpack_from(data, pos)
+            body = pos + FRAME.size
+            if body + length > len(data):
+                break  # 写入中断留下的残缺尾帧，视为不存在，下次写入时覆盖
+            if seq != self._seq:
+                raise ValueError("记录序号不连续，数据可能被篡改")
+            size = FRAME.size + length
+            if rid in self._index:
+                self._dead += self._index[rid][1]
+            if kind == KIND_PUT:
+                entry, digest = self._open_listing(data, pos, rid)
+                self._index[rid] = (pos, size, digest)
+                entries[rid] = entry
+            elif kind == KIND_DELETE:
+                self.session.open(data[body:body + length], data[pos:body])
+                self._index.pop(rid, None)
+                entries.pop(rid, None)
+                self._dead += size
+            else:
+                raise ValueError(f"未知的记录类型: {kind}")
+            pos = body + length
+            self._seq += 1
+        self._end = pos
+        return [entries[rid] for rid in self._index]
+
+    def _decrypt_listing(self, data, pos: int):
+        """解密 PUT 帧的列表部分，返回 (字段, 摘要)"""
+        body = pos + FRAME.size
+        (listing_len,) = LISTING_LEN.unpack_from(data, body)
+        start = body + LISTING_LEN.size
+        plain = self.session.open(data[start:start + listing_len], data[pos:body])
+        return unpack(plain[DIGEST_SIZE:]), plain[:DIGEST_SIZE]
+
+    def _open_listing(self, data, pos: int, rid: bytes):
+        """解密 PUT 帧的列表部分，返回 (条目, 摘要)"""
+        listing, digest = self._decrypt_listing(data, pos)
+        loader = partial(self._read_secret, rid, digest)
+        entry = make_entry(listing, loader, LISTING_FIELDS, digest)
+        if entry is listing:  # 类型未知
+            entry = LazyEntry(listing, digest, loader)
+        return entry, digest
+
+    def _open_secret(self, data, rid: bytes) -> dict:
+        offset, size, _ = self._index[rid]
+        body = offset + FRAME.size
+        (listing_len,) = LISTING_LEN.unpack_from(data, body)
+        start = body + LISTING_LEN.size + listing_len
+        return unpack(self.session.open(data[start:offset + size], SECRET_AAD + rid))
+
+    def _read_secret(self, rid: bytes, digest: bytes, listing: dict) -> dict:
+        """延迟解密条目的加载函数：从内存映射中解密机密段并校验整个条目"""
+        with self._lock:
+            if rid not in self._index or self._index[rid][2] != digest:
+                raise ValueError("条目已被修改或删除")
+            try:
+                entry = dict(listing, **self._open_secret(self._view(), rid))
+            except InvalidTag:
+                raise ValueError("记录已损坏或被篡改")
+        if _digest(pack(entry)) != digest:
+            raise ValueError("记录已损坏或被篡改")
+        return entry
+
+    def _read_entry(self, data, rid: bytes) -> dict:
+        listing, _ = self._decrypt_listing(data, self._index[rid][0])
+        return dict(listing, **self._open_secret(data, rid))
+
+    # ---------- 写入 ----------
+
+    def _frame(self, kind: int, seq: int, rid: bytes, payload: bytes) -> bytes:
+        # 帧头中的长度需要先确定：nonce(12) + 明文 + tag(16)
+        head = FRAME.pack(kind, seq, rid, 12 + len(payload) + 16)
+        return head + self.session.seal(payload, head)
+
+    def _put_frame(self, seq: int, rid: bytes, entry, digest: bytes) -> bytes:
+        listing, secret = _split(entry)
+        listing_plain = digest + pack(listing)
+        secret_sealed = self.session.seal(pack(secret), SECRET_AAD + rid)
+        length = LISTING_LEN.size + 12 + len(listing_plain) + 16 + len(secret_sealed)
+        head = FRAME.pack(KIND_PUT, seq, rid, length)
+        listing_sealed = self.session.seal(listing_plain, head)
+        return head + LISTING_LEN.pack(len(listing_sealed)) + listing_sealed + secret_sealed
+
+    def save(self, entries):
+        """把内存中的条目列表同步到文件，只为发生变化的条目追加记录"""
+        with self._lock:
+            digests = [_entry_digest(e) for e in entries]
+
+            old = {rid: value[2] for rid, value in self._index.items()}
+            rids, puts, free = diff_records(old, digests)
+
+            # 顺序无法通过追加表达时（例如重新排序）整体重写
+            expected = [rid for rid in old if rid not in free]
+            expected += [rid for rid in rids if rid not in old]
+            if expected != rids:
+                self._rewrite(list(zip(rids, entries, digests)))
+                return
+
+            frames = []
+            offset, seq = self._end, self._seq
+            updates = {}
+            for rid in free:
+                frames.append(self._frame(KIND_DELETE, seq, rid, b""))
+                offset += len(frames[-1])
+                seq += 1
+            for i in puts:
+                frames.append(self._put_frame(seq, rids[i], entries[i], digests[i]))
+                updates[rids[i]] = (offset, len(frames[-1]), digests[i])
+                offset += len(frames[-1])
+                seq += 1
+            if not frames:
+                return
+
+            self._append(b"".join(frames))
+
+            for rid in free:
+                self._dead += self._index.pop(rid)[1]
+            for rid, value in updates.items():
+                if rid in self._index:
+                    self._dead += self._index[rid][1]
+                self._index[rid] = value
+            self._dead += sum(len(f) for f in frames[:len(free)])
+            self._end, self._seq = offset, seq
+        self.maybe_compact()
+
+    def _append(self, frames: bytes):
+        self._close_map()
+        with open(self.path, "r+b") as f:
+            f.seek(self._end)
+            f.write(frames)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+    def rewrite(self, entries):
+        """整体写入全部条目（原子替换）"""
+        with self._lock:
+            self._rewrite([(os.urandom(16), e, _entry_digest(e)) for e in entries])
+
+    def _rewrite(self, records):
+        chunks = [None]
+        index = {}
+        offset = HEADER_REGION
+        for seq, (rid, entry, digest) in enumerate(records):
+            chunks.append(self._put_frame(seq, rid, entry, digest))
+            index[rid] = (offset, len(chunks[-1]), digest)
+            offset += len(chunks[-1])
+        self._copy = self._generation = 0
+        chunks[0] = self._header_bytes()
+
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(b"".join(chunks))
+                f.flush()
+                os.fsync(f.fileno())
+            self._close_map()
+            os.replace(tmp_path, self.path)
+        finally:
+            # 写入失败（例如磁盘已满）时原文件不变，不留下临时文件
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self._index = index
+        self._end = offset
+        self._seq = len(records)
+        self._dead = 0
+
+    # ---------- 压缩 ----------
+
+    def dead_bytes(self) -> int:
+        return self._dead
+
+    def needs_compaction(self) -> bool:
+        live = self._end - HEADER_REGION - self._dead
+        return self._dead >= COMPACT_MIN_DEAD and self._dead > live
+
+    def maybe_compact(self):
+        """死空间过多时交给任务执行器在工作线程中压缩，不阻塞调用方"""
+        with self._lock:
+            if self._compacting or not self.needs_compaction():
+                return
+            self._compacting = True
+        shared_executor().submit(self.compact, on_done=self._compacted)
+
+    def _compacted(self, result, error):
+        # 后台压缩失败时文件保持原样，记录原因，下次保存时会再次尝试
+        if error is not None:
+            logger.error("记录文件压缩失败：%s", error, exc_info=error)
+
+    def compact(self):
+        """只保留存活记录重写文件，回收被覆盖和删除的记录占用的空间"""
+        with self._lock:
+            try:
+                data = self._view()
+                records = [
+                    (rid, self._read_entry(data, rid), digest)
+                    for rid, (_, _, digest) in self._index.items()
+                ]
+                self._rewrite(records)
+            finally:
+                self._compacting = False
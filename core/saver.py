@@ -0,0 +1,107 @@
+"""后台保存：在工作线程中写入，短时间内的多次修改合并为一次写入"""
+import threading
+import time
+
+from .tasks import shared_executor
+
+STATUS_PENDING = "pending"
+STATUS_SAVING = "saving"
+STATUS_SAVED = "saved"
+STATUS_FAILED = "failed"
+
+
+class SaveScheduler:
+    """write-behind 保存调度器
+
+    schedule() 只记录最新的条目快照并立即返回；delay 秒内没有新的修改时由任务执行器（core.tasks）
+    在工作线程中调用 save_func 写入最后一次快照，同一时刻只有一次写入。on_status(status, error)
+    在工作线程中回调，界面需要自行切回 GUI 线程。
+    """
+
+    def __init__(self, save_func, delay: float = 0.3, on_status=None, executor=None):
+        self.save_func = save_func
+        self.delay = delay
+        self.on_status = on_status
+        self.executor = executor or shared_executor()
+        self._cond = threading.Condition()
+        self._pending = None
+        self._saving = False
+        self._closed = False
+        self._error = None
+        self._timer = None
+        self._flushing = 0  # 正在 flush 的调用数，期间的写入不再等待 delay
+
+    def schedule(self, entries):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("保存调度器已关闭")
+            self._pending = list(entries)
+            if not self._saving:
+                self._arm(self.delay)  # 正在写入时，写入结束后再计时
+        self._notify(STATUS_PENDING)
+
+    def _arm(self, delay):
+        # 调用方持有 _cond；新的计时取代尚未到期的旧计时
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = self.executor.call_later(delay, self._run) if delay > 0 else self.executor.submit(self._run)
+
+    def pending(self) -> bool:
+        with self._cond:
+            return self._pending is not None or self._saving
+
+    @property
+    def last_error(self):
+        return self._error
+
+    def flush(self, timeout: float = None) -> bool:
+        """立即写入待保存的快照并等待完成；超时返回 False"""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._pending is not None and not self._saving:
+                self._arm(0)
+            self._flushing += 1
+            try:
+                while self._pending is not None or self._saving:
+                    remaining = None if end is None else end - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def close(self, timeout: float = None) -> bool:
+        """写入剩余的修改，之后不再接受新的修改"""
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return flushed
+
+    def _notify(self, status, error=None):
+        if self.on_status is not None:
+            self.on_status(status, error)
+
+    def _run(self):
+        with self._cond:
+            if self._saving or self._pending is None:
+                return  # 已由另一次计时写入
+            entries, self._pending = self._pending, None
+            self._saving = True
+            self._timer = None
+        self._notify(STATUS_SAVING)
+        try:
+            self.save_func(entries)
+            error = None
+        except Exception as e:
+            error = e
+        with self._cond:
+            self._saving = False
+            self._error = error
+            if self._pending is not None:
+                self._arm(0 if self._flushing else self.delay)  # 写入期间又有修改
+            self._cond.notify_all()
+        self._notify(STATUS_FAILED if error else STATUS_SAVED, error)
@@ -0,0 +1,215 @@
+"""条目搜索：对列表字段建立三元组（trigram）倒排索引，随条目增删改增量更新
+
+查询由空格分隔的若干词组成，条目需同时满足所有词（不区分大小写）：
+    abc         任一搜索字段包含 abc（前缀也是子串的一种）
+    host:10.    指定字段包含 10.；字段名见 FILTER_FIELDS
+    type:data   类型以 data 开头，例如 type:Database
+"""
+from collections import defaultdict
+
+# 参与搜索的字段，都在列表段中，搜索不会触发机密字段的解密
+SEARCH_FIELDS = ("name", "url", "ip", "host", "username", "database_name")
+
+# 查询中可用的字段名 -> 条目字段
+FILTER_FIELDS = {
+    "name": "name",
+    "url": "url",
+    "ip": "ip",
+    "host": "host",
+    "user": "username",
+    "username": "username",
+    "db": "database_name",
+    "database": "database_name",
+}
+
+TYPE = "type"
+GRAM = 3
+
+
+def parse_query(text: str):
+    """把查询文本解析为 [(字段, 词)]，字段为 None 表示任意搜索字段，TYPE 表示类型前缀过滤"""
+    terms = []
+    for word in text.casefold().split():
+        field, sep, value = word.partition(":")
+        if sep and (field == TYPE or field in FILTER_FIELDS):
+            if value:
+                terms.append((FILTER_FIELDS.get(field, TYPE), value))
+        else:
+            terms.append((None, word))
+    return terms
+
+
+def _grams(text: str):
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+def _refines(new, old) -> bool:
+    """new 的结果是否一定是 old 结果的子集（继续输入时只需在上次结果中过滤）"""
+    if len(new) < len(old):
+        return False
+    for (field, term), (old_field, old_term) in zip(new, old):
+        if field != old_field:
+            return False
+        if not (term.startswith(old_term) if field == TYPE else old_term in term):
+            return False
+    return True
+
+
+class SearchIndex:
+    """条目列表的搜索索引，作为 EntryList 的监听者增量更新
+
+    字段值在第一次查询时才整理；每个三元组的倒排表在第一次被查询时扫描一遍建立，之后随条目变化增量维护，
+    这样既不需要在解锁时为全部条目建立完整索引，继续输入时每次也最多新建一个倒排表。
+    matches 保存当前查询的结果（条目 id() 的集合，没有查询时为 None），条目变化时同步更新，表格过滤直接读取该集合。
+    """
+
+    def __init__(self, entries):
+        self._entries = entries
+        self._keys = None  # 与条目列表逐位对应的 id(条目)；None 表示尚未建立
+        # 小写后的字段值：全部搜索字段以换行连接（查询词不含空白，不会跨字段匹配）、各字段、类型
+        self._texts = {}
+        self._values = {field: {} for field in SEARCH_FIELDS}
+        self._type_of = {}
+        self._postings = {}  # 已建立的三元组倒排表；空集合同样是有效结果
+        self._types = defaultdict(set)
+        self._terms = []
+        self.matches = None
+        if hasattr(entries, "subscribe"):
+            entries.subscribe(self)
+
+    # ---------- 建立与维护 ----------
+
+    def _build(self):
+        self._texts.clear()
+        self._type_of.clear()
+        self._postings.clear()
+        self._types.clear()
+        for values in self._values.values():
+            values.clear()
+        self._keys = [self._add(entry) for entry in self._entries]
+
+    def _add(self, entry) -> int:
+        key = id(entry)
+        values = [str(entry.get(field) or "").casefold() for field in SEARCH_FIELDS]
+        for field, value in zip(SEARCH_FIELDS, values):
+            if value:
+                self._values[field][key] = value
+        text = self._texts[key] = "\n".join(values)
+        if self._postings:
+            for gram in _grams(text):
+                posting = self._postings.get(gram)
+                if posting is not None:
+                    posting.add(key)
+        kind = self._type_of[key] = str(entry.get("type") or "").casefold()
+        self._types[kind].add(key)
+        if self.matches is not None and self._filter({key}, self._terms):
+            self.matches.add(key)
+        return key
+
+    def _discard(self, key):
+        text = self._texts.pop(key, None)
+        if text is None:
+            return
+        for gram in _grams(text) if self._postings else ():
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(key)
+        for values in self._values.values():
+            values.pop(key, None)
+        self._types[self._type_of.pop(key)].discard(key)
+        if self.matches is not None:
+            self.matches.discard(key)
+
+    def entries_inserted(self, start: int, count: int):
+        if self._keys is not None:
+            self._keys[start:start] = [self._add(e) for e in self._entries[start:start + count]]
+
+    def entries_removing(self, start: int, count: int):
+        if self._keys is not None:
+            for key in self._keys[start:start + count]:
+                self._discard(key)
+            del self._keys[start:start + count]
+
+    def entry_replaced(self, index: int):
+        if self._keys is not None:
+            self._discard(self._keys[index])
+            self._keys[index] = self._add(self._entries[index])
+
+    def entries_reset(self):
+        if self._keys is not None:
+            self._build()
+            self.matches = self._search(self._terms) if self._terms else None
+
+    # ---------- 查询 ----------
+
+    def _filter(self, keys, terms):
+        """在 keys 中逐词过滤；keys 为 None 表示全部条目"""
+        for field, term in terms:
+            if field == TYPE:
+                hits = self._typed(term)
+                keys = hits if keys is None else keys & hits
+                continue
+            values = self._texts if field is None else self._values[field]
+            if keys is not None and len(keys) * 3 < len(values):
+                keys = {k for k in keys if term in values.get(k, "")}
+            else:
+                # 候选较多时顺序扫描比逐个查找快
+                hits = {k for k, v in values.items() if term in v}
+                keys = hits if keys is None else keys & hits
+        return keys
+
+    def _typed(self, prefix):
+        keys = set()
+        for kind, posting in self._types.items():
+            if kind.startswith(prefix):
+                keys |= posting
+        return keys
+
+    def _posting(self, gram):
+        posting = self._postings.get(gram)
+        if posting is None:
+            posting = self._postings[gram] = {k for k, v in self._texts.items() if gram in v}
+        return posting
+
+    def _candidates(self, field, term):
+        """用索引缩小候选范围；返回 (候选集合, 是否已精确匹配)，不值得使用索引时返回 (None, False)"""
+        if field == TYPE:
+            return self._typed(term), True
+        if len(term) < GRAM:
+            return None, False
+        grams = _grams(term)
+        if field is None and len(term) == GRAM:
+            # 恰好一个三元组且不限字段时，倒排表本身就是结果
+            return set(self._posting(grams.pop())), True
+        # 只用已建立的倒排表；都没有时只新建一个，其余由逐条校验保证正确
+        postings = [self._postings[g] for g in grams if g in self._postings] or [self._posting(grams.pop())]
+        postings.sort(key=len)
+        if len(postings[0]) * 4 > len(self._texts):
+            return None, False
+        return set(postings[0]).intersection(*postings[1:]), False
+
+    def _search(self, terms):
+        if self._keys is None:
+            self._build()
+        # 从最具选择性的词开始：类型过滤和较长的词候选最少
+        terms = sorted(terms, key=lambda t: (t[0] != TYPE, -len(t[1])))
+        keys, exact = self._candidates(*terms[0])
+        return self._filter(keys, terms[1:] if exact else terms)
+
+    def search(self, text: str):
+        """返回匹配查询的条目 id() 集合；查询为空时返回 None"""
+        terms = parse_query(text)
+        return self._search(terms) if terms else None
+
+    def set_query(self, text: str):
+        """设置当前查询并更新 matches；继续输入时只在上次的结果中过滤"""
+        terms = parse_query(text)
+        if terms == self._terms:
+            return self.matches
+        if self.matches is not None and _refines(terms, self._terms):
+            changed = [t for i, t in enumerate(terms) if i >= len(self._terms) or t != self._terms[i]]
+            self.matches = self._filter(self.matches, changed)
+        else:
+            self.matches = self._search(terms) if terms else None
+        self._terms = terms
+        return self.matches
@@ -0,0 +1,206 @@
+"""条目的二进制序列化：保管箱载荷和内容摘要使用的紧凑格式，JSON 只用于人可读的导出
+
+布局（整数均为小端）：
+    布局号(1B) | 类型标签(1B) | 槽位数 n(2B) | 字段编号 n×1B | 值类型 n×1B | 字符数 n×2B（长布局为 4B）| 文本
+字段名按 FIELD_NAMES 编号，Website / Server / Database 按 TYPE_TAGS 编号（0 表示没有 type 或类型未知，
+此时 type 作为普通字段保存）；schema 之外的字段占两个槽位：EXTRA_KEY（字段名）紧跟 EXTRA_VALUE（值）。
+所有槽位的文本按顺序拼接后整体做一次 UTF-8 编码，长度按字符计，解码时一次解码再切片。
+非文本值记录值类型：整数、浮点数以文本保存，布尔和 null 不占文本，列表和对象保存为规范化 JSON。
+
+字段按编号排序、额外字段按名称排序，内容相同的条目总是得到相同的字节，可以直接用于摘要。
+FIELD_NAMES 和 TYPE_TAGS 一旦发布只能追加。
+
+pack / unpack 是实际使用的实现：全部字段都是已知的文本时用缓存的 Struct 一次打包 / 解包，否则交给
+pack_reference / unpack_reference —— 逐槽位处理的参考实现，覆盖所有情况，测试用它校验两者输出一致。
+"""
+import json
+import struct
+from operator import itemgetter
+
+LAYOUT_SHORT = 1  # 每个值最多 65535 个字符
+LAYOUT_LONG = 2
+_MAX_SHORT = 0xFFFF
+
+FIELD_NAMES = (
+    "name", "type", "url", "ip", "port", "db_type", "host", "sqlite_path", "username", "database_name", "password",
+)
+EXTRA_KEY = 0xFE
+EXTRA_VALUE = 0xFF
+TYPE_TAGS = ("", "Website", "Server", "Database")
+
+# 值类型
+STR, INT, FLOAT, TRUE, FALSE, NULL, JSON = range(7)
+
+_FIELD_IDS = {name: i for i, name in enumerate(FIELD_NAMES)}
+_TYPE_IDS = {name: i for i, name in enumerate(TYPE_TAGS) if name}
+_PREFIX = struct.Struct("<BBH")
+_HEADERS = {}
+
+
+def _header(n: int) -> struct.Struct:
+    """短布局下 n 个文本槽位的完整头部"""
+    header = _HEADERS.get(n)
+    if header is None:
+        header = _HEADERS[n] = struct.Struct(f"<BBH{n}s{n}s{n}H")
+    return header
+
+
+def _type_tag(entry) -> int:
+    typ = entry.get("type")
+    return _TYPE_IDS.get(typ, 0) if type(typ) is str else 0
+
+
+def _as_dict(entry) -> dict:
+    # 类型化条目和延迟解密的条目先取完整内容
+    return entry if type(entry) is dict else dict(entry.items())
+
+
+# ---------- 参考实现 ----------
+
+def _text(value):
+    """返回 (值类型, 文本)"""
+    if isinstance(value, str):
+        return STR, value
+    if value is True:
+        return TRUE, ""
+    if value is False:
+        return FALSE, ""
+    if value is None:
+        return NULL, ""
+    if isinstance(value, int):
+        return INT, str(int(value))
+    if isinstance(value, float):
+        return FLOAT, repr(value)
+    return JSON, json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+
+_PARSERS = {
+    STR: str,
+    INT: int,
+    FLOAT: float,
+    TRUE: lambda text: True,
+    FALSE: lambda text: False,
+    NULL: lambda text: None,
+    JSON: json.loads,
+}
+
+
+def pack_reference(entry) -> bytes:
+    entry = _as_dict(entry)
+    tag = _type_tag(entry)
+    known, extra = [], []
+    for key, value in entry.items():
+        if key == "type" and tag:
+            continue
+        field = _FIELD_IDS.get(key)
+        if field is None:
+            extra.append((key, value))
+        else:
+            known.append((field, value))
+    slots = sorted(known, key=itemgetter(0))
+    for key, value in sorted(extra, key=itemgetter(0)):
+        slots.append((EXTRA_KEY, key))
+        slots.append((EXTRA_VALUE, value))
+
+    fields, kinds, texts = [], [], []
+    for field, value in slots:
+        kind, text = _text(value)
+        fields.append(field)
+        kinds.append(kind)
+        texts.append(text)
+    lengths = [len(text) for text in texts]
+    long = any(length > _MAX_SHORT for length in lengths)
+    n = len(slots)
+    return b"".join([
+        _PREFIX.pack(LAYOUT_LONG if long else LAYOUT_SHORT, tag, n),
+        bytes(fields),
+        bytes(kinds),
+        struct.pack(f"<{n}{'I' if long else 'H'}", *lengths),
+        "".join(texts).encode(),
+    ])
+
+
+def unpack_reference(data: bytes) -> dict:
+    layout, tag, n = _PREFIX.unpack_from(data)
+    if layout not in (LAYOUT_SHORT, LAYOUT_LONG):
+        raise ValueError(f"未知的序列化布局：{layout}")
+    if tag >= len(TYPE_TAGS):
+        raise ValueError(f"未知的类型标签：{tag}")
+    pos = _PREFIX.size
+    fields, kinds = data[pos:pos + n], data[pos + n:pos + 2 * n]
+    lengths_format = struct.Struct(f"<{n}{'I' if layout == LAYOUT_LONG else 'H'}")
+    lengths = lengths_format.unpack_from(data, pos + 2 * n)
+    text = bytes(data[pos + 2 * n + lengths_format.size:]).decode()
+    if sum(lengths) != len(text):
+        raise ValueError("序列化数据长度不一致")
+
+    entry = {"type": TYPE_TAGS[tag]} if tag else {}
+    start = 0
+    key = None
+    for field, kind, length in zip(fields, kinds, lengths):
+        chunk = text[start:start + length]
+        start += length
+        if field == EXTRA_KEY:
+            key = chunk
+            continue
+        if kind not in _PARSERS:
+            raise ValueError(f"未知的值类型：{kind}")
+        value = _PARSERS[kind](chunk)
+        if field == EXTRA_VALUE:
+            if key is None:
+                raise ValueError("额外字段缺少字段名")
+            entry[key] = value
+            key = None
+        elif field < len(FIELD_NAMES):
+            entry[FIELD_NAMES[field]] = value
+        else:
+            raise ValueError(f"未知的字段编号：{field}")
+    return entry
+
+
+# ---------- 快速路径 ----------
+
+_field_id = _FIELD_IDS.__getitem__
+_TYPE_FIELD = _FIELD_IDS["type"]
+
+
+def pack(entry) -> bytes:
+    """序列化一个条目（或条目的一部分字段）"""
+    entry = _as_dict(entry)
+    tag = _type_tag(entry)
+    try:
+        fields = sorted(map(_field_id, entry))
+        if tag:
+            fields.remove(_TYPE_FIELD)
+        names = FIELD_NAMES
+        values = [entry[names[field]] for field in fields]
+        text = "".join(values)
+    except (KeyError, TypeError):
+        return pack_reference(entry)  # 有额外字段或非文本值
+    lengths = list(map(len, values))
+    if lengths and max(lengths) > _MAX_SHORT:
+        return pack_reference(entry)
+    n = len(fields)
+    return _header(n).pack(LAYOUT_SHORT, tag, n, bytes(fields), bytes(n), *lengths) + text.encode()
+
+
+def unpack(data: bytes) -> dict:
+    """反序列化 pack() 的结果，得到 dict"""
+    layout, tag, n = _PREFIX.unpack_from(data)
+    if layout != LAYOUT_SHORT or tag >= len(TYPE_TAGS):
+        return unpack_reference(data)
+    header = _header(n)
+    _, _, _, fields, kinds, *lengths = header.unpack_from(data)
+    if kinds.count(STR) != n or (fields and max(fields) >= len(FIELD_NAMES)):
+        return unpack_reference(data)  # 有额外字段或非文本值
+    text = str(data[header.size:], "utf-8")
+    if sum(lengths) != len(text):
+        raise ValueError("序列化数据长度不一致")
+    entry = {"type": TYPE_TAGS[tag]} if tag else {}
+    names = FIELD_NAMES
+    start = 0
+    for field, length in zip(fields, lengths):
+        end = start + length
+        entry[names[field]] = text[start:end]
+        start = end
+    return entry
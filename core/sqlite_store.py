@@ -0,0 +1,219 @@
+"""SQLite 存储后端：每个条目是一行，载荷单独加密，可按行事务更新
+
+表结构：
+    meta(key, value)                          — 格式版本、salt、密钥槽、密码校验值
+    entries(id, pos, type, name_hash, payload) — 记录 ID、排列顺序、类型、名称的带密钥散列、nonce + 密文
+
+条目由随机数据密钥加密，meta 中的 keys 记录各解锁方式的密钥槽（见 core.crypto.KeySlot），修改主密码只更新这一行。
+载荷是二进制序列化（见 core.serialize），单条只有一两百字节，不压缩。
+载荷以记录 ID 作为关联数据加密，整行被替换到其他 ID 下会认证失败。
+名称只保存 HMAC，可以按名称建立索引查找而不暴露明文。
+"""
+import json
+import os
+import sqlite3
+import threading
+
+from .crypto import KeySlot, VaultSession
+from .entries import make_entry
+from .records import _digest, diff_records
+from .serialize import pack, unpack
+
+SQLITE_MAGIC = b"SQLite format 3\0"
+FORMAT_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id BLOB PRIMARY KEY,
+    pos INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    name_hash BLOB NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_pos ON entries (pos);
+CREATE INDEX IF NOT EXISTS entries_type ON entries (type);
+CREATE INDEX IF NOT EXISTS entries_name_hash ON entries (name_hash);
+"""
+
+
+def is_sqlite_file(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+
+
+def _keys_json(slots) -> str:
+    return json.dumps([slot.to_dict() for slot in slots])
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")  # 读者不阻塞写入
+    conn.execute("PRAGMA synchronous=FULL")
+    return conn
+
+
+class SqliteStore:
+    name = "sqlite"
+
+    def __init__(self, path: str, session: VaultSession, conn: sqlite3.Connection = None):
+        if not session.envelope:
+            raise ValueError("SQLite 存储需要信封加密的会话（VaultSession.create / unlock）")
+        self.path = path
+        self.session = session
+        self._conn = conn
+        self._lock = threading.RLock()
+        # 记录 ID -> (pos, 明文摘要)，顺序即条目顺序
+        self._index = {}
+
+    @staticmethod
+    def detect(path: str) -> bool:
+        return is_sqlite_file(path)
+
+    def _check_aad(self) -> bytes:
+        return b"meta" + bytes([FORMAT_VERSION]) + self.session.salt
+
+    def _row(self, rid: bytes, pos: int, entry: dict, payload: bytes):
+        name_hash = self.session.keyed_hash(str(entry.get("name", "")).encode())
+        sealed = self.session.seal(payload, rid)
+        return rid, pos, str(entry.get("type", "")), name_hash, sealed
+
+    def _open_payload(self, sealed: bytes, rid: bytes) -> bytes:
+        return self.session.open(sealed, rid)
+
+    @classmethod
+    def create(cls, path: str, session: VaultSession, entries):
+        """在临时文件中建库写入全部条目，再原子替换 path，返回打开的容器"""
+        store = cls(path, session)
+        payloads = [pack(e) for e in entries]
+        rids = [os.urandom(16) for _ in entries]
+
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            with conn:
+                conn.executescript(SCHEMA)
+                conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                    ("version", FORMAT_VERSION),
+                    ("salt", session.salt),
+                    ("keys", _keys_json(session.slots)),
+                    ("check", session.seal(b"", store._check_aad())),
+                ])
+                conn.executemany(
+                    "INSERT INTO entries (id, pos, type, name_hash, payload) VALUES (?, ?, ?, ?, ?)",
+                    [store._row(rid, pos, e, p) for pos, (rid, e, p) in enumerate(zip(rids, entries, payloads))],
+                )
+        finally:
+            conn.close()
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.replace(tmp_path, path)
+
+        store._conn = _connect(path)
+        store._index = {rid: (pos, _digest(p)) for pos, (rid, p) in enumerate(zip(rids, payloads))}
+        return store
+
+    @classmethod
+    def open(cls, path: str, password: str):
+        """校验主密码（或恢复密钥）并读取全部条目，返回 (store, entries)"""
+        conn = _connect(path)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            if meta.get("version") != FORMAT_VERSION:
+                raise ValueError(f"不支持的 SQLite 存储版本：{meta.get('version')}")
+            slots = [KeySlot.from_dict(slot) for slot in json.loads(meta["keys"])]
+            session = VaultSession.unlock(slots, password, meta["salt"])  # 都不匹配时抛出 InvalidTag
+            store = cls(path, session, conn)
+            store.session.open(meta["check"], store._check_aad())  # 密码错误时抛出 InvalidTag
+            return store, store._load()
+        except Exception:
+            conn.close()
+            raise
+
+    def update_keys(self, slots):
+        """只更新 meta 中的密钥槽（修改主密码、添加恢复密钥），耗时与条目数量无关"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("UPDATE meta SET value = ? WHERE key = 'keys'", (_keys_json(slots),))
+            self.session.use_slots(slots)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ---------- 读取 ----------
+
+    def _load(self):
+        entries = []
+        for rid, pos, sealed in self._conn.execute("SELECT id, pos, payload FROM entries ORDER BY pos"):
+            plain = self._open_payload(sealed, rid)
+            self._index[rid] = (pos, _digest(plain))
+            entries.append(make_entry(unpack(plain)))
+        return entries
+
+    def find(self, name: str):
+        """按名称查找条目，只解密命中索引的行"""
+        name_hash = self.session.keyed_hash(name.encode())
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload FROM entries WHERE name_hash = ? ORDER BY pos", (name_hash,)
+            ).fetchall()
+        return [make_entry(unpack(self._open_payload(sealed, rid))) for rid, sealed in rows]
+
+    # ---------- 写入 ----------
+
+    def save(self, entries):
+        """在一个事务中只写入发生变化的行"""
+        with self._lock:
+            payloads = [pack(e) for e in entries]
+            digests = [_digest(p) for p in payloads]
+            old = {rid: digest for rid, (_, digest) in self._index.items()}
+            rids, puts, free = diff_records(old, digests)
+
+            # 只有顺序无法保持时才调整 pos，删除和追加不会牵动其他行
+            positions = []
+            prev = -1
+            for rid in rids:
+                pos = self._index[rid][0] if rid in self._index else None
+                if pos is None or pos <= prev:
+                    pos = prev + 1
+                positions.append(pos)
+                prev = pos
+
+            changed = set(puts)
+            moves = [
+                (positions[i], rid) for i, rid in enumerate(rids)
+                if i not in changed and self._index[rid][0] != positions[i]
+            ]
+            if not changed and not free and not moves:
+                return
+
+            with self._conn:
+                self._conn.executemany("DELETE FROM entries WHERE id = ?", [(rid,) for rid in free])
+                self._conn.executemany("UPDATE entries SET pos = ? WHERE id = ?", moves)
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries (id, pos, type, name_hash, payload) VALUES (?, ?, ?, ?, ?)",
+                    [self._row(rids[i], positions[i], entries[i], payloads[i]) for i in puts],
+                )
+            self._index = {rid: (pos, digest) for rid, pos, digest in zip(rids, positions, digests)}
+
+    def rewrite(self, entries):
+        """整体替换全部条目（单个事务）"""
+        with self._lock:
+            payloads = [pack(e) for e in entries]
+            rids = [os.urandom(16) for _ in entries]
+            with self._conn:
+                self._conn.execute("DELETE FROM entries")
+                self._conn.executemany(
+                    "INSERT INTO entries (id, pos, type, name_hash, payload) VALUES (?, ?, ?, ?, ?)",
+                    [self._row(rid, pos, e, p) for pos, (rid, e, p) in enumerate(zip(rids, entries, payloads))],
+                )
+            self._index = {rid: (pos, _digest(p)) for pos, (rid, p) in enumerate(zip(rids, payloads))}
@@ -0,0 +1,99 @@
+"""启动剖析：记录从启动到托盘就绪各阶段的耗时并写入 JSON 文件，用来衡量冷启动到密码框的时间
+
+启用方式：python main.py --profile-startup[=文件]，或设置环境变量 DSK_PROFILE_STARTUP=文件（值为 1 时使用默认文件名）。
+未启用时各记录点只做一次判断，不影响正常启动。
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+
+ENV_VAR = "DSK_PROFILE_STARTUP"
+FLAG = "--profile-startup"
+DEFAULT_OUTPUT = "startup_profile.json"
+
+# 从开始导入 main 到密码框显示的预算（秒），超出时报告中 over_budget 为 true
+PROMPT_BUDGET = 1.0
+PROMPT = "prompt"
+
+
+class StartupProfiler:
+    """启动过程的时间线
+
+    mark(名称) 记录一个时间点，报告中给出距启动的时间和距上一个时间点的耗时；
+    phase(名称) 统计一段代码的累计耗时（如 kdf、decrypt），嵌套的阶段只计入最内层。
+    计时从导入本模块开始，main.py 最先导入它。
+    """
+
+    def __init__(self, budget: float = PROMPT_BUDGET):
+        self.origin = time.perf_counter()
+        self.budget = budget
+        self.output = None  # 报告文件；None 表示未启用
+        self.marks = []
+        self.phases = {}
+        self._stack = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.output is not None
+
+    def configure(self, argv, environ=os.environ):
+        """根据命令行参数和环境变量决定是否启用，返回去掉剖析参数后的 argv"""
+        rest = []
+        for arg in argv:
+            if arg == FLAG:
+                self.output = DEFAULT_OUTPUT
+            elif arg.startswith(FLAG + "="):
+                self.output = arg.split("=", 1)[1] or DEFAULT_OUTPUT
+            else:
+                rest.append(arg)
+        value = environ.get(ENV_VAR, "")
+        if self.output is None and value and value != "0":
+            self.output = DEFAULT_OUTPUT if value == "1" else value
+        return rest
+
+    def mark(self, name: str):
+        if self.enabled:
+            self.marks.append((name, time.perf_counter() - self.origin))
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        frame = [time.perf_counter(), 0.0]  # 开始时间、子阶段耗时
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed - frame[1]
+            if self._stack:
+                self._stack[-1][1] += elapsed
+
+    def report(self) -> dict:
+        marks, last = [], 0.0
+        for name, at in self.marks:
+            marks.append({"name": name, "at_ms": round(at * 1000, 1), "delta_ms": round((at - last) * 1000, 1)})
+            last = at
+        prompt = next((at for name, at in self.marks if name == PROMPT), None)
+        return {
+            "marks": marks,
+            "phases_ms": {name: round(t * 1000, 1) for name, t in self.phases.items()},
+            "prompt_ms": None if prompt is None else round(prompt * 1000, 1),
+            "prompt_budget_ms": round(self.budget * 1000, 1),
+            "over_budget": prompt is not None and prompt > self.budget,
+        }
+
+    def finish(self):
+        """写出报告并停止记录；未启用时什么也不做"""
+        if not self.enabled:
+            return None
+        path, self.output = self.output, None
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        return path
+
+
+profiler = StartupProfiler()
@@ -1,25 +1,152 @@
 import json
 import os
+import weakref
 
-from .crypto import encrypt_data, decrypt_data
+from cryptography.exceptions import InvalidTag
+
+from .crypto import (
+    PASSWORD_SLOT, RECOVERY_SLOT, LEGACY_KDF, KdfParams, VaultSession, decrypt_data, new_recovery_key,
+)
+from .entries import Entry, make_entry
+from .records import LazyEntry, RecordStore
+from .sqlite_store import SqliteStore
+from .startup import profiler
 
 DATA_FILE = "secrets.dat"
 
+# 可选的存储后端：按文件头识别，新建或迁移时按名称选择
+BACKENDS = {backend.name: backend for backend in (RecordStore, SqliteStore)}
+DEFAULT_BACKEND = RecordStore.name
 
-def load_entries(password: str):
+# 密码错误（认证失败）或解密出的内容无法解析时统一提示；派生算法不受支持等错误保留原来的说明
+_UNLOCK_ERRORS = (InvalidTag, UnicodeDecodeError, json.JSONDecodeError)
+
+# 每个会话对应一个已打开的存储容器，保存时据此只写入变化的条目
+_stores = weakref.WeakKeyDictionary()
+
+
+def detect_backend(path: str):
+    """返回能读取 path 的后端；旧的整块加密格式返回 None"""
+    for backend in BACKENDS.values():
+        if backend.detect(path):
+            return backend
+    return None
+
+
+def unlock(password: str):
+    """验证主密码并解锁：只派生一次密钥、读取并解析一次文件，返回 (session, entries)
+
+    password 也可以是恢复密钥。
+    条目是 core.entries 中的类型化条目（类型未知的条目保持为 dict）；
+    记录格式的条目只解密列表字段，密码等字段在第一次访问时才解密。
+    """
     if not os.path.exists(DATA_FILE):
-        return []
-    with open(DATA_FILE, "rb") as f:
-        data = f.read()
+        return VaultSession.create(password), []
+    try:
+        backend = detect_backend(DATA_FILE)
+        if backend is not None:
+            # 记录格式逐条解密并解析列表字段，两者一起计入 decrypt
+            with profiler.phase("decrypt"):
+                store, entries = backend.open(DATA_FILE, password)
+            _stores[store.session] = store
+            return store.session, entries
+
+        # 旧的整块加密格式：密钥由主密码直接派生，解密后换用新的随机数据密钥，下次保存时转换为记录格式
+        with open(DATA_FILE, "rb") as f:
+            data = f.read()
+        with profiler.phase("decrypt"):
+            plain = decrypt_data(data, password)
+        session = VaultSession.create(password)
+        with profiler.phase("parse"):
+            return session, [make_entry(entry) for entry in json.loads(plain)]
+    except _UNLOCK_ERRORS as e:
+        raise ValueError("主密码错误或数据损坏") from e
+
+
+def load_entries(password: str):
+    """解锁并返回完整解密的条目（普通 dict）"""
+    return [dict(entry) for entry in unlock(password)[1]]
+
+
+def read_vault(path: str, password: str):
+    """读取另一个保管箱文件（任意存储格式），返回完整解密的条目，不影响当前打开的数据文件"""
     try:
-        plain = decrypt_data(data, password)
-        return json.loads(plain)
-    except Exception as e:
-        raise ValueError("主密码错误或数据损坏")
+        backend = detect_backend(path)
+        if backend is None:
+            with open(path, "rb") as f:
+                return json.loads(decrypt_data(f.read(), password))
+        store, entries = backend.open(path, password)
+        try:
+            return [dict(entry) for entry in entries]
+        finally:
+            store.close()
+    except _UNLOCK_ERRORS as e:
+        raise ValueError("主密码错误或数据损坏") from e
+
+
+def _close_stores(path: str):
+    # 整体替换文件前关闭仍指向它的容器（例如修改主密码前的旧会话）
+    for store in list(_stores.values()):
+        if store.path == path:
+            store.close()
+
+
+def save_entries(entries, session, backend: str = None):
+    """保存条目；session 可以是 VaultSession（推荐，不再重复派生密钥）或主密码字符串
+
+    backend 指定存储后端名称时，若与当前文件格式不同则整体转换。
+    """
+    if isinstance(session, str):
+        session = VaultSession.create(session)
+    store = _stores.get(session)
+    if store is not None and store.path == DATA_FILE and backend in (None, store.name):
+        store.save(entries)
+        return
+    # 新会话（首次运行、整块加密格式转换）或切换后端：整体写入
+    # 先补全尚未解密的条目，它们依赖的旧容器会在替换文件前关闭
+    for entry in entries:
+        if isinstance(entry, (Entry, LazyEntry)):
+            entry.resolve()
+    if backend is None:
+        current = detect_backend(DATA_FILE) if os.path.exists(DATA_FILE) else None
+        backend = current.name if current is not None else DEFAULT_BACKEND
+    _close_stores(DATA_FILE)
+    _stores[session] = BACKENDS[backend].create(DATA_FILE, session, entries)
+
+
+def migrate(password: str, backend: str):
+    """一次性把现有 secrets.dat 转换为指定后端，返回解锁后的会话"""
+    session, entries = unlock(password)
+    save_entries(entries, session, backend=backend)
+    return session
+
+
+def change_password(session, entries, old_password: str, new_password: str, kdf: KdfParams = LEGACY_KDF):
+    """修改主密码，返回之后使用的会话；old_password 也可以是恢复密钥
+
+    只重新包装数据密钥、重写头部（或 meta 中的一行），与条目数量无关，恢复密钥继续有效；
+    尚未转换的整块加密文件以新的会话整体写入。
+    """
+    if not session.verify(old_password):
+        raise ValueError("当前主密码错误")
+    store = _stores.get(session)
+    if store is not None and store.path == DATA_FILE:
+        store.update_keys(session.rewrapped(PASSWORD_SLOT, new_password, kdf))
+        return session
+    new_session = VaultSession.create(new_password, kdf)
+    save_entries(entries, new_session)
+    return new_session
+
 
+def add_recovery_key(session, entries) -> str:
+    """生成并写入恢复密钥（取代已有的恢复密钥），返回恢复密钥
 
-def save_entries(entries, password: str):
-    plain = json.dumps(entries, ensure_ascii=False)
-    encrypted = encrypt_data(plain, password)
-    with open(DATA_FILE, "wb") as f:
-        f.write(encrypted)
+    尚未转换的整块加密文件先整体写入为当前格式。
+    """
+    store = _stores.get(session)
+    if store is None or store.path != DATA_FILE:
+        save_entries(entries, session)
+        store = _stores[session]
+    key = new_recovery_key()
+    store.update_keys(session.rewrapped(RECOVERY_SLOT, key))
+    return key
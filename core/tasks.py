@@ -0,0 +1,219 @@
+"""应用内共用的后台任务执行器：有界的工作线程池 + 时间轮定时任务 + 结果切回 GUI 线程
+
+阻塞的文件读写、延迟执行的任务（剪贴板清除等）都经由同一个执行器，不再为每次操作创建线程。
+等待网络的任务（数据库连接测试、后台健康探测）提交到单独的 I/O 通道：线程数另有上限，不占用磁盘任务的线程。
+任务可以带 key：提交同一 key 的新任务时取消尚未执行的旧任务（例如再次复制密码时取消上一次的清除），
+已经开始执行的旧任务照常完成，但结果不再回调。
+
+core 不依赖 Qt：界面通过 set_dispatcher() 注册一个把函数排队到 GUI 线程执行的函数，
+on_done 回调和 in_gui=True 的定时任务都经由它执行；没有注册时在工作线程 / 定时线程中直接调用。
+"""
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 工作线程数上限：任务多为磁盘读写，不需要很多线程
+DEFAULT_WORKERS = 4
+# I/O 通道：任务大多在等待网络，线程数可以多于 CPU 核数，但仍有上限
+IO_LANE = "io"
+IO_WORKERS = 32
+# 时间轮：每格 TICK 秒，SLOTS 格一圈；更远的任务在所在格中等待若干圈
+DEFAULT_TICK = 0.05
+DEFAULT_SLOTS = 512
+
+
+def _direct(fn):
+    fn()
+
+
+class Task:
+    """提交给 TaskExecutor 的一个任务；cancel() 后未开始的不再执行，已在执行的不再回调 on_done"""
+
+    __slots__ = ("fn", "args", "key", "on_done", "in_gui", "deadline", "cancelled", "_done")
+
+    def __init__(self, fn, args, key=None, on_done=None, in_gui=False, deadline=0):
+        self.fn = fn
+        self.args = args
+        self.key = key
+        self.on_done = on_done  # on_done(结果, 异常)，经由 dispatcher 执行
+        self.in_gui = in_gui
+        self.deadline = deadline  # 时间轮的到期格号，立即执行的任务为 0
+        self.cancelled = False
+        self._done = threading.Event()
+
+    def cancel(self) -> bool:
+        """返回任务是否还未结束"""
+        self.cancelled = True
+        return not self._done.is_set()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """等待任务执行结束（被取消而不再执行的任务不会结束）"""
+        return self._done.wait(timeout)
+
+
+class TimerWheel:
+    """哈希时间轮：添加、取消都是 O(1)，只有一个线程按格推进；没有定时任务时线程一直等待，不空转
+
+    到期的任务交给 on_expire(task) 处理（在定时线程中调用，应尽快返回）。
+    """
+
+    def __init__(self, on_expire, tick: float = DEFAULT_TICK, slots: int = DEFAULT_SLOTS):
+        self.on_expire = on_expire
+        self.tick = tick
+        self._slots = [[] for _ in range(slots)]
+        self._start = time.monotonic()
+        self._cursor = 0  # 下一个要处理的格号
+        self._count = 0  # 时间轮中的任务数（包括已取消、尚未移出的）
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="TimerWheel", daemon=True)
+        self._thread.start()
+
+    def _now_tick(self) -> float:
+        return (time.monotonic() - self._start) / self.tick
+
+    def add(self, task: Task, delay: float):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("任务执行器已关闭")
+            now = self._now_tick()
+            if not self._count:
+                self._cursor = max(self._cursor, int(now))  # 空闲期间的格不需要逐格补处理
+            task.deadline = max(self._cursor, math.ceil(now + delay / self.tick))
+            self._slots[task.deadline % len(self._slots)].append(task)
+            self._count += 1
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self._count:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                wait = (self._cursor - self._now_tick()) * self.tick
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                slot = self._slots[self._cursor % len(self._slots)]
+                expired = [task for task in slot if task.deadline <= self._cursor]
+                if expired:
+                    slot[:] = [task for task in slot if task.deadline > self._cursor]
+                    self._count -= len(expired)
+                self._cursor += 1
+            for task in expired:
+                if not task.cancelled:
+                    self.on_expire(task)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+
+class TaskExecutor:
+    """工作线程池 + 时间轮；线程数有上限，线程按需创建
+
+    lanes 为 {通道名: 线程数上限}：submit(..., lane=通道名) 的任务在该通道自己的线程中执行，
+    不传 lane 的任务使用默认的 max_workers 个线程。
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS, tick: float = DEFAULT_TICK,
+                 slots: int = DEFAULT_SLOTS, dispatcher=None, lanes=None):
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="task")
+        self._lanes = {
+            name: ThreadPoolExecutor(workers, thread_name_prefix=f"task-{name}")
+            for name, workers in (lanes or {}).items()
+        }
+        self._wheel = TimerWheel(self._expire, tick, slots)
+        self._dispatch = dispatcher or _direct
+        self._lock = threading.Lock()
+        self._keyed = {}  # key -> 最近提交的任务
+
+    def set_dispatcher(self, dispatcher):
+        """dispatcher(fn) 把 fn 排队到 GUI 线程执行；传 None 恢复为直接调用"""
+        self._dispatch = dispatcher or _direct
+
+    def _register(self, task: Task) -> Task:
+        if task.key is not None:
+            with self._lock:
+                previous = self._keyed.get(task.key)
+                self._keyed[task.key] = task
+            if previous is not None:
+                previous.cancel()
+        return task
+
+    def submit(self, fn, *args, key=None, on_done=None, lane: str = None) -> Task:
+        """在工作线程（给定 lane 时为该通道的线程）中执行 fn(*args)"""
+        if lane is None:
+            pool = self._pool
+        elif lane in self._lanes:
+            pool = self._lanes[lane]
+        else:
+            raise ValueError(f"未知的任务通道：{lane}")
+        task = self._register(Task(fn, args, key, on_done))
+        pool.submit(self._run, task)
+        return task
+
+    def call_later(self, delay: float, fn, *args, key=None, on_done=None, in_gui: bool = False) -> Task:
+        """delay 秒后执行 fn(*args)：in_gui 为 True 时在 GUI 线程中执行（可以操作界面），否则在工作线程中"""
+        task = self._register(Task(fn, args, key, on_done, in_gui))
+        self._wheel.add(task, delay)
+        return task
+
+    def call_in_gui(self, fn, *args):
+        """从任意线程把 fn(*args) 排队到 GUI 线程执行"""
+        self._dispatch(lambda: fn(*args))
+
+    def cancel(self, key) -> bool:
+        """取消 key 对应的任务；返回是否取消了尚未结束的任务"""
+        with self._lock:
+            task = self._keyed.pop(key, None)
+        return task is not None and task.cancel()
+
+    def _expire(self, task: Task):
+        if task.in_gui:
+            self._dispatch(lambda: self._run(task))
+        else:
+            self._pool.submit(self._run, task)
+
+    def _run(self, task: Task):
+        if task.cancelled:
+            return
+        result = error = None
+        try:
+            result = task.fn(*task.args)
+        except Exception as e:
+            error = e
+        finally:
+            task._done.set()
+            if task.key is not None:
+                with self._lock:
+                    if self._keyed.get(task.key) is task:
+                        del self._keyed[task.key]
+        # 没有 on_done 的任务需要自行处理异常（与线程池相同，异常不会传到界面）
+        if task.on_done is not None and not task.cancelled:
+            self._dispatch(lambda: task.on_done(result, error))
+
+    def shutdown(self, wait: bool = False):
+        self._wheel.close()
+        for pool in (self._pool, *self._lanes.values()):
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_shared_executor = None
+_shared_lock = threading.Lock()
+
+
+def shared_executor() -> TaskExecutor:
+    """进程内共用的执行器，保存、压缩、剪贴板清除、连接测试等都通过它提交"""
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is None:
+            _shared_executor = TaskExecutor(lanes={IO_LANE: IO_WORKERS})
+        return _shared_executor
@@ -0,0 +1,161 @@
+"""条目校验：按类型检查必填字段、端口范围、数据库类型等，一次处理整批条目并汇总为报告
+
+错误（ERROR）的条目不能导入或保存；警告（WARNING）的条目照常导入，只在报告中提示。
+添加/编辑对话框、JSON / NDJSON 导入和脚本导入共用同一套规则。
+"""
+import csv
+from collections.abc import Mapping
+from typing import NamedTuple
+
+from .db_drivers import get_driver
+
+ERROR = "error"
+WARNING = "warning"
+SEVERITY_LABELS = {ERROR: "错误", WARNING: "警告"}
+
+KNOWN_TYPES = ("Website", "Server", "Database")
+# 各类型表示“位置”的字段，缺少时给出警告
+LOCATION_FIELDS = {"Website": "url", "Server": "ip"}
+PORT_RANGE = (1, 65535)
+
+# 报告最多保留的问题详情数，其余只计数，流式导入大文件时内存不随问题数增长
+MAX_ISSUES = 10_000
+
+
+class Issue(NamedTuple):
+    position: int  # 条目在文件中的位置（JSON 数组的第几项或 NDJSON 的行号），从 1 开始
+    name: str
+    field: str
+    severity: str
+    message: str
+
+
+def _check_port(value):
+    if value in (None, ""):
+        return None
+    try:
+        port = int(str(value).strip())
+    except ValueError:
+        return f"端口必须是数字：{value!r}"
+    if not PORT_RANGE[0] <= port <= PORT_RANGE[1]:
+        return f"端口超出范围 {PORT_RANGE[0]}-{PORT_RANGE[1]}：{port}"
+    return None
+
+
+def validate_entry(entry):
+    """校验单个条目，返回 [(级别, 字段, 说明)]，没有问题时为空列表"""
+    if not isinstance(entry, Mapping):
+        return [(ERROR, "", "不是对象")]
+    problems = []
+    name = entry.get("name")
+    if "name" not in entry:
+        problems.append((ERROR, "name", "缺少 'name' 字段"))
+    elif not isinstance(name, str) or not name.strip():
+        problems.append((ERROR, "name", "名称必须是非空文本"))
+
+    for field, value in entry.items():
+        if isinstance(value, (dict, list)):
+            problems.append((ERROR, field, "字段值必须是文本或数字"))
+
+    typ = entry.get("type")
+    if typ is None or typ == "":
+        problems.append((WARNING, "type", "缺少类型"))
+    elif typ not in KNOWN_TYPES:
+        problems.append((ERROR, "type", f"未知的类型：{typ!r}"))
+
+    if typ == "Database":
+        db_type = entry.get("db_type")
+        driver = get_driver(db_type) if isinstance(db_type, str) else None
+        if not db_type:
+            problems.append((WARNING, "db_type", "缺少数据库类型"))
+        elif driver is None:
+            problems.append((ERROR, "db_type", f"不支持的数据库类型：{db_type!r}"))
+        location = driver.fields[0].key if driver is not None else "host"
+        if not entry.get(location):
+            problems.append((WARNING, location, f"缺少 {location}"))
+        if driver is None or "port" in driver.field_keys:
+            message = _check_port(entry.get("port"))
+            if message:
+                problems.append((ERROR, "port", message))
+    elif typ in LOCATION_FIELDS:
+        field = LOCATION_FIELDS[typ]
+        if not entry.get(field):
+            problems.append((WARNING, field, f"缺少 {field}"))
+        if typ == "Server":
+            message = _check_port(entry.get("port"))
+            if message:
+                problems.append((ERROR, "port", message))
+    return problems
+
+
+def errors(entry):
+    """只返回错误的说明文字，供对话框阻止保存"""
+    return [message for severity, _, message in validate_entry(entry) if severity == ERROR]
+
+
+class ValidationReport:
+    """一批条目的校验结果；unit 为位置的单位（JSON 数组为“项”，NDJSON 为“行”）"""
+
+    def __init__(self, unit: str = "项"):
+        self.unit = unit
+        self.issues = []  # 最多 MAX_ISSUES 条
+        self.error_count = 0  # 有错误的条目数
+        self.warning_count = 0  # 只有警告的条目数
+        self.issue_count = 0
+        self.checked = 0
+
+    def check(self, position: int, entry) -> bool:
+        """校验一个条目并记录问题，返回该条目是否可以导入（没有错误）"""
+        self.checked += 1
+        problems = validate_entry(entry)
+        if not problems:
+            return True
+        self.add(position, entry, problems)
+        return not any(severity == ERROR for severity, _, _ in problems)
+
+    def reject(self, position: int, message: str):
+        """记录一个无法解析的条目（例如不是有效 JSON 的行）"""
+        self.checked += 1
+        self.add(position, None, [(ERROR, "", message)])
+
+    def add(self, position: int, entry, problems):
+        name = str(entry.get("name", "")) if isinstance(entry, Mapping) else ""
+        if any(severity == ERROR for severity, _, _ in problems):
+            self.error_count += 1
+        else:
+            self.warning_count += 1
+        for severity, field, message in problems:
+            self.issue_count += 1
+            if len(self.issues) < MAX_ISSUES:
+                self.issues.append(Issue(position, name, field, severity, message))
+
+    @property
+    def truncated(self) -> bool:
+        return self.issue_count > len(self.issues)
+
+    def __bool__(self):
+        return self.issue_count > 0
+
+    def summary(self) -> str:
+        parts = [f"检查 {self.checked} 个条目"]
+        if self.error_count:
+            parts.append(f"{self.error_count} 个有错误（将跳过）")
+        if self.warning_count:
+            parts.append(f"{self.warning_count} 个有警告")
+        return "，".join(parts)
+
+    def write_csv(self, path: str):
+        """导出为 CSV（带 BOM，Excel 可直接打开）"""
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow([f"位置（{self.unit}）", "名称", "字段", "级别", "说明"])
+            for issue in self.issues:
+                writer.writerow([issue.position, issue.name, issue.field,
+                                 SEVERITY_LABELS[issue.severity], issue.message])
+
+
+def validate_entries(items, unit: str = "项"):
+    """一次校验整批条目，返回 (可导入的条目, ValidationReport)"""
+    report = ValidationReport(unit)
+    valid = [item for position, item in enumerate(items, 1) if report.check(position, item)]
+    return valid, report
@@ -1,5 +1,8 @@
+from core.startup import profiler  # 最先导入，计时从这里开始
+
 import os
 import sys
+import threading
 import traceback
 from datetime import datetime
 
@@ -9,8 +12,8 @@ from PySide6.QtWidgets import (
     QPushButton, QMessageBox
 )
 
-from core.storage import load_entries, save_entries
-from ui.main_window import MainWindow
+# 加密库、存储和主窗口在显示密码框之后才导入（见 preload），冷启动只需加载密码框用到的模块
+PRELOAD_MODULES = ("core.storage", "ui.main_window")
 
 
 def excepthook(exc_type, exc_value, exc_tb):
@@ -25,20 +28,36 @@ def excepthook(exc_type, exc_value, exc_tb):
 sys.excepthook = excepthook
 
 
+def preload():
+    """在后台线程中导入解锁后才用到的模块，与用户输入密码同时进行；主线程用到时若仍在导入会等待其完成"""
+    def run():
+        import importlib
+        for name in PRELOAD_MODULES:
+            importlib.import_module(name)
+    threading.Thread(target=run, name="preload", daemon=True).start()
+
+
+def unlock(password: str):
+    from core.storage import unlock as unlock_storage
+    return unlock_storage(password)
+
+
 class PasswordDialog(QDialog):
-    def __init__(self, first_run=False, verify_password_func=None, parent=None):
+    def __init__(self, first_run=False, unlock_func=None, parent=None):
         super().__init__(parent)
         self.setWindowTitle("主密码" if not first_run else "首次使用")
         self.setFixedSize(320, 160)
         self.setWindowFlags(Qt.Window | Qt.CustomizeWindowHint | Qt.WindowTitleHint)
 
         self.first_run = first_run
-        self.verify_password_func = verify_password_func  # 用于验证密码的函数
+        self.unlock_func = unlock_func  # 验证密码并解锁的函数，返回 (session, entries)
         self.password = ""
+        self.session = None
+        self.entries = []
 
         layout = QVBoxLayout(self)
 
-        msg = "请设置主密码：" if first_run else "请输入主密码："
+        msg = "请设置主密码：" if first_run else "请输入主密码（或恢复密钥）："
         layout.addWidget(QLabel(msg))
 
         self.password_edit = QLineEdit()
@@ -57,6 +76,10 @@ class PasswordDialog(QDialog):
         layout.addWidget(self.btn_ok)
         layout.addWidget(self.btn_cancel)
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        profiler.mark("prompt")
+
     def _on_ok_clicked(self):
         pwd = self.password_edit.text().strip()
         if not pwd:
@@ -68,14 +91,16 @@ class PasswordDialog(QDialog):
             self.password = pwd
             self.accept()
         else:
-            # 非首次：尝试验证密码
+            # 非首次：验证密码的同时完成解锁，主窗口直接使用结果
             try:
-                if self.verify_password_func:
-                    self.verify_password_func(pwd)  # 如果抛异常，说明密码错
+                profiler.mark("password_entered")
+                if self.unlock_func:
+                    self.session, self.entries = self.unlock_func(pwd)  # 密码错误时抛出 ValueError
                 self.password = pwd
                 self.accept()
-            except ValueError:
-                self.error_label.setText("❌ 主密码错误，请重试")
+            except ValueError as e:
+                # 密码错误，或派生算法不受支持等无法解锁的原因
+                self.error_label.setText(f"❌ {e}")
                 self.password_edit.selectAll()
                 self.password_edit.setFocus()
             except Exception as e:
@@ -85,51 +110,52 @@ class PasswordDialog(QDialog):
 
 
 def main():
-    app = QApplication(sys.argv)
+    argv = profiler.configure(sys.argv)
+    profiler.mark("imports")
+    app = QApplication(argv)
     app.setQuitOnLastWindowClosed(False)
+    profiler.mark("app")
 
     first_run = not os.path.exists("secrets.dat")
-    def verify_password(pwd):
-        load_entries(pwd)  # 如果密码错，会抛 ValueError
+    preload()
 
     while True:
-        # 传入验证函数
+        # 传入解锁函数
         dialog = PasswordDialog(
             first_run=first_run,
-            verify_password_func=None if first_run else verify_password
+            unlock_func=None if first_run else unlock
         )
         result = dialog.exec()
 
         if result == QDialog.Rejected:
             sys.exit(0)
 
-        password = dialog.password
-
         if first_run:
+            from core.crypto import VaultSession, calibrate
+            from core.storage import save_entries
+            # 按本机速度选择派生参数，参数记录在文件头部；随机数据密钥由主密码包装
+            session = VaultSession.create(dialog.password, kdf=calibrate())
             entries = []
             try:
-                save_entries(entries, password)
+                save_entries(entries, session)
                 break
             except Exception as e:
                 # 首次保存失败，重新循环
                 QMessageBox.critical(None, "错误", f"无法保存初始数据:\n{str(e)}")
                 continue
         else:
-            # 密码已在 dialog 内部验证成功，直接加载
-            try:
-                entries = load_entries(password)
-                break
-            except Exception:
-                # 理论上不会走到这里，但保险起见
-                continue
-
-        # 启动主窗口
-
-    def save_wrapper():
-        save_entries(entries, password)
-
-    window = MainWindow(entries, save_wrapper, password)
+            # 密码已在 dialog 内部验证，解锁结果直接交给主窗口
+            session, entries = dialog.session, dialog.entries
+            break
+
+    profiler.mark("unlocked")
+    from ui.main_window import MainWindow
+    profiler.mark("window_imported")
+    window = MainWindow(entries, session)  # 内部记录 table、tray 两个时间点
     window.hide()
+    path = profiler.finish()
+    if path:
+        print(f"启动剖析已写入 {path}")
     sys.exit(app.exec())
 
 
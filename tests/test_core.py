@@ -2,13 +2,32 @@
 import json
 import os
 import tempfile
+import time
 import pytest
 
 # 确保能导入 core 模块
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core.crypto import encrypt_data, decrypt_data, derive_key
+from core.crypto import encrypt_data, decrypt_data, derive_key, VaultSession
+
+
+@pytest.fixture
+def data_file(tmp_path, monkeypatch):
+    """把 core.storage.DATA_FILE 指向临时目录，结束时关闭仍指向它的存储容器"""
+    import core.storage
+
+    path = str(tmp_path / "secrets.dat")
+    monkeypatch.setattr(core.storage, "DATA_FILE", path)
+    yield path
+    core.storage._close_stores(path)
+
+
+def _entries(n, type="Server"):
+    """n 个名称不同的条目：Server 带 ip，Database 带 host"""
+    address = "host" if type == "Database" else "ip"
+    return [{"name": f"{type.lower()}-{i}", "type": type, address: f"10.0.0.{i % 250}", "password": "x" * 32}
+            for i in range(n)]
 
 
 class TestCrypto:
@@ -68,11 +87,62 @@ class TestCrypto:
         encrypted = encrypt_data("", "password")
         assert decrypt_data(encrypted, "password") == ""
 
+    def test_decrypt_legacy_format(self):
+        """旧格式（salt + 密文，无头部）仍能解密"""
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        salt = os.urandom(16)
+        key = derive_key("password", salt)
+        legacy = salt + AESGCM(key).encrypt(salt, "旧数据".encode(), None)
+        assert decrypt_data(legacy, "password") == "旧数据"
+        assert VaultSession("password").decrypt(legacy) == "旧数据"
+
+
+class TestVaultSession:
+    """解锁会话测试"""
+
+    def test_session_derives_key_once(self, monkeypatch):
+        """会话创建后多次加密不再调用 derive_key"""
+        import core.crypto
+
+        calls = []
+        original = core.crypto.derive_key
+        monkeypatch.setattr(core.crypto, "derive_key", lambda p, s, *kdf: calls.append(s) or original(p, s, *kdf))
+        session = VaultSession("password")
+        for _ in range(3):
+            session.decrypt(session.encrypt("data"))
+        assert len(calls) == 1
+
+    def test_session_uses_fresh_nonce(self):
+        """同一会话两次加密产生不同密文，但共享 salt"""
+        session = VaultSession("password")
+        ct1 = session.encrypt("same")
+        ct2 = session.encrypt("same")
+        assert ct1 != ct2
+        assert ct1[:20] == ct2[:20]  # MAGIC + 版本号 + salt 的前缀相同
+        assert decrypt_data(ct1, "password") == "same"
+
+    def test_tampered_header_raises(self):
+        """头部参与认证，篡改版本号之外的字节也会失败"""
+        session = VaultSession("password")
+        data = bytearray(session.encrypt("secret"))
+        data[6] ^= 0x01  # salt 中的一个字节
+        with pytest.raises(Exception):
+            decrypt_data(bytes(data), "password")
+
+    def test_envelope_session_rejects_blob_format(self):
+        """信封加密的会话没有主密码，读写整块加密格式时给出明确的错误"""
+        session = VaultSession.create("password")
+        with pytest.raises(ValueError, match="decrypt_data"):
+            session.decrypt(encrypt_data("x", "other"))
+        with pytest.raises(ValueError, match="encrypt_data"):
+            session.encrypt("x")
+
 
 class TestStorage:
     """存储模块测试"""
 
-    def test_save_and_load_entries(self):
+    def test_save_and_load_entries(self, data_file):
         """保存后能正确加载"""
         from core.storage import save_entries, load_entries
 
@@ -82,54 +152,63 @@ class TestStorage:
         ]
         password = "master_password"
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            data_file = os.path.join(tmpdir, "secrets.dat")
-            # 临时替换 DATA_FILE 路径
-            import core.storage
-            original = core.storage.DATA_FILE
-            core.storage.DATA_FILE = data_file
-            try:
-                save_entries(entries, password)
-                loaded = load_entries(password)
-                assert loaded == entries
-                assert len(loaded) == 2
-                assert loaded[0]["name"] == "GitHub"
-            finally:
-                core.storage.DATA_FILE = original
+        save_entries(entries, password)
+        loaded = load_entries(password)
+        assert loaded == entries
+        assert len(loaded) == 2
+        assert loaded[0]["name"] == "GitHub"
+
+    def test_save_with_session(self, data_file):
+        """使用 VaultSession 保存的数据可用主密码加载"""
+        from core.storage import save_entries, load_entries
+
+        entries = [{"name": "GitHub", "type": "Website", "password": "pass123"}]
+        session = VaultSession.create("master_password")
+
+        save_entries(entries, session)
+        save_entries(entries + [{"name": "New", "type": "Website"}], session)
+        loaded = load_entries("master_password")
+        assert [e["name"] for e in loaded] == ["GitHub", "New"]
+
+    def test_unlock_derives_key_once(self, data_file, monkeypatch):
+        """unlock 只派生一次密钥，返回的会话可直接用于保存"""
+        import core.crypto
+        from core.storage import save_entries, unlock, load_entries
 
-    def test_load_nonexistent_file(self):
+        entries = [{"name": "GitHub", "type": "Website", "password": "pass123"}]
+
+        save_entries(entries, "master_password")
+
+        calls = []
+        derive = core.crypto.derive_key
+        monkeypatch.setattr(core.crypto, "derive_key", lambda p, s, *kdf: calls.append(s) or derive(p, s, *kdf))
+        session, loaded = unlock("master_password")
+        assert loaded == entries
+        save_entries(loaded, session)
+        assert len(calls) == 1
+
+        monkeypatch.setattr(core.crypto, "derive_key", derive)
+        assert load_entries("master_password") == entries
+        with pytest.raises(ValueError):
+            unlock("wrong_password")
+
+    def test_load_nonexistent_file(self, data_file):
         """不存在的数据文件返回空列表"""
         from core.storage import load_entries
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            data_file = os.path.join(tmpdir, "nonexistent.dat")
-            import core.storage
-            original = core.storage.DATA_FILE
-            core.storage.DATA_FILE = data_file
-            try:
-                assert load_entries("any_password") == []
-            finally:
-                core.storage.DATA_FILE = original
+        assert load_entries("any_password") == []
 
-    def test_load_wrong_password_raises(self):
+    def test_load_wrong_password_raises(self, data_file):
         """错误密码加载应抛出 ValueError"""
         from core.storage import save_entries, load_entries
 
         entries = [{"name": "Test", "type": "Website"}]
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            data_file = os.path.join(tmpdir, "secrets.dat")
-            import core.storage
-            original = core.storage.DATA_FILE
-            core.storage.DATA_FILE = data_file
-            try:
-                save_entries(entries, "correct_password")
-                with pytest.raises(ValueError):
-                    load_entries("wrong_password")
-            finally:
-                core.storage.DATA_FILE = original
+        save_entries(entries, "correct_password")
+        with pytest.raises(ValueError):
+            load_entries("wrong_password")
 
-    def test_save_and_load_chinese_content(self):
+    def test_save_and_load_chinese_content(self, data_file):
         """中文内容保存后能正确加载"""
         from core.storage import save_entries, load_entries
 
@@ -137,29 +216,15 @@ class TestStorage:
             {"name": "测试服务器", "type": "Server", "ip": "10.0.0.1", "port": "22", "username": "管理员", "password": "密码123"},
         ]
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            data_file = os.path.join(tmpdir, "secrets.dat")
-            import core.storage
-            original = core.storage.DATA_FILE
-            core.storage.DATA_FILE = data_file
-            try:
-                save_entries(entries, "主密码")
-                loaded = load_entries("主密码")
-                assert loaded == entries
-                assert loaded[0]["name"] == "测试服务器"
-                assert loaded[0]["username"] == "管理员"
-            finally:
-                core.storage.DATA_FILE = original
+        save_entries(entries, "主密码")
+        loaded = load_entries("主密码")
+        assert loaded == entries
+        assert loaded[0]["name"] == "测试服务器"
+        assert loaded[0]["username"] == "管理员"
 
 
 class TestDbTester:
-    """数据库连接测试模块"""
-
-    @classmethod
-    def setup_class(cls):
-        """跳过未安装数据库驱动的测试"""
-        pytest.importorskip("psycopg2")
-        pytest.importorskip("pymysql")
+    """数据库连接测试模块（驱动按需导入，未安装 MySQL/PostgreSQL 客户端库时也能运行）"""
 
     def test_unsupported_db_type(self):
         """不支持的数据库类型返回错误信息"""
@@ -199,3 +264,1756 @@ class TestDbTester:
             assert "成功" in result
         finally:
             os.unlink(db_path)
+
+
+class TestRecordStore:
+    """记录级容器测试"""
+
+    def test_single_change_appends_one_record(self, data_file):
+        """修改一个条目只追加一条记录，而不是重写整个文件"""
+        from core.storage import save_entries, unlock
+
+        entries = _entries(50)
+        session = VaultSession.create("pw")
+        save_entries(entries, session)
+        size = os.path.getsize(data_file)
+
+        entries[10] = dict(entries[10], password="changed")
+        save_entries(entries, session)
+        grown = os.path.getsize(data_file) - size
+        assert 0 < grown < 200
+
+        entries.append({"name": "new", "type": "Website"})
+        del entries[3]
+        save_entries(entries, session)
+
+        _, loaded = unlock("pw")
+        assert loaded == entries
+
+    def test_unchanged_save_writes_nothing(self, data_file):
+        """内容没有变化时不写文件"""
+        from core.storage import save_entries
+
+        entries = _entries(5)
+        session = VaultSession.create("pw")
+        save_entries(entries, session)
+        mtime = os.stat(data_file).st_mtime_ns
+        size = os.path.getsize(data_file)
+        save_entries([dict(e) for e in entries], session)
+        assert os.path.getsize(data_file) == size
+        assert os.stat(data_file).st_mtime_ns == mtime
+
+    def test_reorder_and_reopen(self, data_file):
+        """重新排序后整体重写，重新打开的会话可继续增量保存"""
+        from core.storage import save_entries, unlock
+
+        entries = _entries(5)
+        save_entries(entries, "pw")
+        session, loaded = unlock("pw")
+        loaded.reverse()
+        save_entries(loaded, session)
+        loaded[0]["ip"] = "127.0.0.1"
+        save_entries(loaded, session)
+        assert unlock("pw")[1] == loaded
+
+    def test_truncated_tail_is_ignored(self, data_file):
+        """写入中断留下的残缺尾帧被忽略，之前的数据完整可读"""
+        from core.storage import save_entries, unlock
+
+        entries = _entries(3)
+        session = VaultSession.create("pw")
+        save_entries(entries, session)
+        save_entries(entries + [{"name": "tail", "type": "Website"}], session)
+        with open(data_file, "r+b") as f:
+            f.truncate(os.path.getsize(data_file) - 10)
+
+        session, loaded = unlock("pw")
+        assert loaded == entries
+        save_entries(loaded + [{"name": "again", "type": "Website"}], session)
+        assert unlock("pw")[1][-1]["name"] == "again"
+
+    def test_tampered_record_raises(self, data_file):
+        """列表段被篡改时无法解锁；机密段被篡改时在访问机密字段时报错"""
+        from core.records import HEADER_REGION
+        from core.storage import save_entries, unlock
+
+        def flip(offset, whence):
+            with open(data_file, "r+b") as f:
+                f.seek(offset, whence)
+                byte = f.read(1)
+                f.seek(offset, whence)
+                f.write(bytes([byte[0] ^ 1]))
+
+        save_entries(_entries(3), "pw")
+        flip(-1, os.SEEK_END)  # 最后一条记录的机密段
+        _, loaded = unlock("pw")
+        assert loaded[2]["name"] == "server-2"
+        with pytest.raises(ValueError):
+            loaded[2]["password"]
+
+        flip(HEADER_REGION + 40, os.SEEK_SET)  # 第一条记录的列表段
+        with pytest.raises(ValueError):
+            unlock("pw")
+
+    def test_empty_vault_checks_password(self, data_file):
+        """空库也能校验主密码"""
+        from core.storage import save_entries, unlock
+
+        save_entries([], "pw")
+        assert unlock("pw")[1] == []
+        with pytest.raises(ValueError):
+            unlock("wrong")
+
+    def test_legacy_blob_upgraded_on_save(self, data_file):
+        """旧的整块格式可读取，保存后转换为记录格式"""
+        from core.crypto import encrypt_data
+        from core.records import is_record_file
+        from core.storage import save_entries, unlock
+
+        entries = _entries(2)
+        with open(data_file, "wb") as f:
+            f.write(encrypt_data(json.dumps(entries), "pw"))
+        session, loaded = unlock("pw")
+        assert loaded == entries
+        save_entries(loaded, session)
+        assert is_record_file(data_file)
+        assert unlock("pw")[1] == entries
+
+    def test_unlock_decrypts_listing_only(self, data_file, monkeypatch):
+        """解锁只解密列表字段，机密字段在第一次访问时才解密"""
+        from core.entries import ServerEntry
+        from core.storage import load_entries, save_entries, unlock
+
+        entries = _entries(10)
+        save_entries(entries, "pw")
+        session, loaded = unlock("pw")
+        assert all(isinstance(e, ServerEntry) and not e.resolved for e in loaded)
+        assert [e.get("ip") for e in loaded] == [e["ip"] for e in entries]
+        assert all(not e.resolved for e in loaded)
+
+        assert loaded[4]["password"] == "x" * 32
+        assert loaded[4].resolved and not loaded[5].resolved
+
+        # 未解密的条目保存时不会被读取或重写
+        opened = []
+        original = session.open
+        monkeypatch.setattr(session, "open", lambda *a: opened.append(a) or original(*a))
+        loaded[4]["password"] = "changed"
+        save_entries(loaded, session)
+        assert opened == []
+        assert sum(e.resolved for e in loaded) == 1
+        assert load_entries("pw") == [dict(entries[i], password="changed") if i == 4 else entries[i]
+                                           for i in range(10)]
+
+    def test_compaction_reclaims_dead_space(self, data_file):
+        """压缩后文件只包含存活记录"""
+        from core.records import RecordStore
+        from core.storage import unlock
+
+        store = RecordStore(data_file, VaultSession.create("pw"))
+        entries = _entries(20)
+        store.rewrite(entries)
+        size = os.path.getsize(data_file)
+        for i in range(5):
+            entries[0] = dict(entries[0], password=str(i))
+            store.save(entries)
+        assert store.dead_bytes() > 0
+
+        store.compact()
+        assert store.dead_bytes() == 0
+        assert abs(os.path.getsize(data_file) - size) < 50
+        assert unlock("pw")[1] == entries
+
+    def test_compaction_failure_is_logged(self, data_file, monkeypatch, caplog):
+        """压缩失败时记录日志、删除临时文件，原文件保持可用"""
+        import core.records
+        from core.records import RecordStore
+        from core.storage import unlock
+
+        store = RecordStore(data_file, VaultSession.create("pw"))
+        entries = _entries(20)
+        store.rewrite(entries)
+        entries[0] = dict(entries[0], password="changed")
+        store.save(entries)
+
+        def full_disk(src, dst):
+            raise OSError("磁盘已满")
+        replace = core.records.os.replace
+        monkeypatch.setattr(core.records.os, "replace", full_disk)
+        monkeypatch.setattr(store, "needs_compaction", lambda: True)
+        store.maybe_compact()
+        deadline = time.monotonic() + 5
+        while "压缩失败" not in caplog.text and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert "磁盘已满" in caplog.text
+        assert not os.path.exists(data_file + ".tmp")
+        store.close()
+        monkeypatch.setattr(core.records.os, "replace", replace)
+        assert unlock("pw")[1] == entries
+
+
+class TestSqliteStore:
+    """SQLite 存储后端测试"""
+
+    def test_migrate_from_record_file(self, data_file):
+        """记录格式一次性迁移到 SQLite，之后的保存只更新变化的行"""
+        from core.sqlite_store import is_sqlite_file
+        from core.storage import migrate, save_entries, unlock
+
+        entries = _entries(10, "Database")
+        save_entries(entries, "pw")
+        session = migrate("pw", "sqlite")
+        assert is_sqlite_file(data_file)
+
+        entries[4] = dict(entries[4], password="changed")
+        del entries[1]
+        entries.append({"name": "new", "type": "Website"})
+        save_entries(entries, session)
+        assert unlock("pw")[1] == entries
+
+    def test_legacy_blob_migrates(self, data_file):
+        """旧的整块格式也能直接迁移"""
+        from core.storage import migrate, unlock
+
+        entries = _entries(3, "Database")
+        with open(data_file, "wb") as f:
+            f.write(encrypt_data(json.dumps(entries), "pw"))
+        migrate("pw", "sqlite")
+        assert unlock("pw")[1] == entries
+
+    def test_single_edit_touches_one_row(self, data_file):
+        """编辑和删除不会重新加密或移动其他行"""
+        import sqlite3
+        from core.sqlite_store import SqliteStore
+
+        entries = _entries(20, "Database")
+        store = SqliteStore.create(data_file, VaultSession.create("pw"), entries)
+        conn = sqlite3.connect(data_file)
+        rows = "SELECT id, payload, pos FROM entries"
+        before = {rid: (payload, pos) for rid, payload, pos in conn.execute(rows)}
+
+        entries[7] = dict(entries[7], host="127.0.0.1")
+        store.save(entries)
+        edited = {rid: (payload, pos) for rid, payload, pos in conn.execute(rows)}
+        assert edited.keys() == before.keys()
+        assert len([rid for rid in edited if edited[rid] != before[rid]]) == 1
+
+        del entries[2]
+        store.save(entries)
+        after = {rid: (payload, pos) for rid, payload, pos in conn.execute(rows)}
+        assert len(set(edited) - set(after)) == 1
+        assert all(after[rid] == edited[rid] for rid in after)
+        store.close()
+        conn.close()
+
+    def test_find_by_name_and_wrong_password(self, data_file):
+        """按名称散列查找；错误密码无法打开"""
+        from core.sqlite_store import SqliteStore
+        from core.storage import save_entries, unlock
+
+        save_entries(_entries(5, "Database"), "pw", backend="sqlite")
+        store, _ = SqliteStore.open(data_file, "pw")
+        assert [e["host"] for e in store.find("database-3")] == ["10.0.0.3"]
+        assert store.find("missing") == []
+        store.close()
+        with pytest.raises(ValueError):
+            unlock("wrong")
+
+    def test_password_change_keeps_backend(self, data_file):
+        """修改主密码（新会话整体写入）后仍是 SQLite 格式"""
+        from core.sqlite_store import is_sqlite_file
+        from core.storage import save_entries, unlock
+
+        entries = _entries(3, "Database")
+        save_entries(entries, "old", backend="sqlite")
+        save_entries(entries, VaultSession.create("new"))
+        assert is_sqlite_file(data_file)
+        assert unlock("new")[1] == entries
+
+
+class TestSaveScheduler:
+    """后台保存调度器测试"""
+
+    def test_burst_is_coalesced(self):
+        """连续多次修改只写入一次，写入的是最后一次快照"""
+        from core.saver import SaveScheduler
+
+        saved = []
+        saver = SaveScheduler(saved.append, delay=0.1)
+        for i in range(10):
+            saver.schedule([{"name": str(i)}])
+        assert saver.flush(timeout=5)
+        assert saved == [[{"name": "9"}]]
+        saver.close()
+
+    def test_snapshot_is_copied(self):
+        """schedule 保存的是调用时的列表快照"""
+        from core.saver import SaveScheduler
+
+        saved = []
+        saver = SaveScheduler(saved.append, delay=0.05)
+        entries = [{"name": "a"}]
+        saver.schedule(entries)
+        entries.append({"name": "b"})
+        saver.close(timeout=5)
+        assert saved == [[{"name": "a"}]]
+
+    def test_close_flushes_pending(self):
+        """关闭时写入尚未到期的修改"""
+        from core.saver import SaveScheduler
+
+        saved = []
+        saver = SaveScheduler(saved.append, delay=60)
+        saver.schedule([{"name": "a"}])
+        assert saver.close(timeout=5)
+        assert saved == [[{"name": "a"}]]
+        with pytest.raises(RuntimeError):
+            saver.schedule([])
+
+    def test_errors_are_reported(self):
+        """保存失败时通过状态回调报告错误"""
+        from core.saver import STATUS_FAILED, STATUS_SAVED, SaveScheduler
+
+        statuses = []
+
+        def save(entries):
+            if not entries:
+                raise OSError("disk full")
+
+        saver = SaveScheduler(save, delay=0, on_status=lambda s, e: statuses.append((s, e)))
+        saver.schedule([])
+        saver.flush(timeout=5)
+        assert isinstance(saver.last_error, OSError)
+        saver.schedule([{"name": "a"}])
+        saver.close(timeout=5)
+        assert saver.last_error is None
+        finished = [s for s, _ in statuses if s in (STATUS_FAILED, STATUS_SAVED)]
+        assert finished == [STATUS_FAILED, STATUS_SAVED]
+
+    def test_saves_through_storage(self, data_file):
+        """后台保存写入的数据可以正常解锁"""
+        from core.saver import SaveScheduler
+        from core.storage import save_entries, unlock
+
+        session = VaultSession.create("pw")
+        saver = SaveScheduler(lambda entries: save_entries(entries, session), delay=0.05)
+        entries = []
+        for i in range(5):
+            entries.append({"name": f"e{i}", "type": "Website", "password": "p"})
+            saver.schedule(entries)
+        saver.close(timeout=5)
+        assert unlock("pw")[1] == entries
+
+
+class TestTaskExecutor:
+    """后台任务执行器测试"""
+
+    @pytest.fixture
+    def executor(self):
+        from core.tasks import TaskExecutor
+
+        executor = TaskExecutor(max_workers=3, tick=0.01, slots=8)
+        yield executor
+        executor.shutdown(wait=True)
+
+    def test_pool_is_bounded(self, executor):
+        """同时执行的任务不超过线程数，结果和异常经 on_done 返回"""
+        import threading
+
+        lock = threading.Lock()
+        active, peak, results = [0], [0], []
+
+        def work(i):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            if i == 0:
+                raise OSError("boom")
+            return i
+
+        tasks = [executor.submit(work, i, on_done=lambda r, e: results.append((r, e))) for i in range(12)]
+        assert all(task.wait(5) for task in tasks)
+        time.sleep(0.05)
+        assert peak[0] <= 3
+        assert sorted(r for r, e in results if e is None) == list(range(1, 12))
+        assert [type(e) for r, e in results if e is not None] == [OSError]
+
+    def test_lanes_are_separate(self):
+        """通道中的任务有自己的线程数上限，不占用默认线程；未知通道报错"""
+        import threading
+        from core.tasks import TaskExecutor
+
+        executor = TaskExecutor(max_workers=1, lanes={"io": 2})
+        release = threading.Event()
+        lock = threading.Lock()
+        active, peak = [0], [0]
+
+        def wait():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            release.wait(5)
+            with lock:
+                active[0] -= 1
+
+        try:
+            blocked = [executor.submit(wait, lane="io") for _ in range(4)]
+            assert executor.submit(lambda: "disk").wait(5)  # I/O 通道占满时默认线程照常工作
+            time.sleep(0.05)
+            assert peak[0] == 2
+            release.set()
+            assert all(task.wait(5) for task in blocked)
+            with pytest.raises(ValueError):
+                executor.submit(wait, lane="gpu")
+        finally:
+            release.set()
+            executor.shutdown(wait=True)
+
+    def test_delayed_order(self, executor):
+        """定时任务按延迟先后执行，跨越时间轮多圈的任务不会提前"""
+        fired = []
+        start = time.monotonic()
+        tasks = [executor.call_later(delay, lambda d=delay: fired.append((d, time.monotonic() - start)))
+                 for delay in (0.25, 0.05, 0.12)]
+        assert all(task.wait(5) for task in tasks)
+        assert [d for d, _ in fired] == [0.05, 0.12, 0.25]
+        assert all(elapsed >= d - 0.011 for d, elapsed in fired)
+
+    def test_replace_and_cancel(self, executor):
+        """同一 key 的新任务取代尚未执行的旧任务；按 key 取消"""
+        fired = []
+        first = executor.call_later(0.05, fired.append, "first", key="clip")
+        second = executor.call_later(0.05, fired.append, "second", key="clip")
+        assert first.cancelled and second.wait(5)
+        executor.call_later(0.02, fired.append, "third", key="other")
+        assert executor.cancel("other")
+        time.sleep(0.1)
+        assert fired == ["second"] and not first.done
+
+    def test_gui_dispatch(self, executor):
+        """on_done 和 in_gui 的定时任务经由分发器执行（这里用队列模拟 GUI 线程的事件循环）"""
+        import queue
+        import threading
+
+        posted = queue.Queue()
+        executor.set_dispatcher(posted.put)
+        threads = {}
+        executor.submit(threading.get_ident, on_done=lambda r, e: threads.update(worker=r, callback=threading.get_ident()))
+        executor.call_later(0.01, lambda: threads.update(timer=threading.get_ident()), in_gui=True)
+        for _ in range(2):
+            posted.get(timeout=5)()
+        gui = threading.get_ident()
+        assert threads["worker"] != gui and threads["callback"] == threads["timer"] == gui
+
+    def test_no_thread_per_scheduler(self, executor):
+        """保存调度器共用执行器，不为每个实例创建线程"""
+        import threading
+        from core.saver import SaveScheduler
+
+        saved = []
+        before = threading.active_count()
+        savers = [SaveScheduler(saved.append, delay=0.01, executor=executor) for _ in range(20)]
+        assert threading.active_count() == before
+        for i, saver in enumerate(savers):
+            saver.schedule([{"name": str(i)}])
+        assert all(saver.close(timeout=5) for saver in savers)
+        assert len(saved) == 20 and threading.active_count() <= before + 3
+
+
+class TestEntryList:
+    """可观察条目列表测试"""
+
+    class Recorder:
+        def __init__(self):
+            self.events = []
+
+        def __getattr__(self, name):
+            if name.startswith("entr"):
+                return lambda *args: self.events.append((name,) + args)
+            raise AttributeError(name)
+
+    def test_events(self):
+        """增删改分别发出对应的事件"""
+        from core.entry_list import EntryList
+
+        entries = EntryList([{"name": "a"}, {"name": "b"}])
+        recorder = self.Recorder()
+        entries.subscribe(recorder)
+
+        entries.append({"name": "c"})
+        entries.extend([{"name": "d"}, {"name": "e"}])
+        entries[1] = {"name": "B"}
+        del entries[0]
+        entries.insert(-1, {"name": "x"})
+        entries[:] = [{"name": "z"}]
+        assert recorder.events == [
+            ("entries_inserted", 2, 1),
+            ("entries_inserted", 3, 2),
+            ("entry_replaced", 1),
+            ("entries_removing", 0, 1),
+            ("entries_removed", 0, 1),
+            ("entries_inserted", 3, 1),
+            ("entries_reset",),
+        ]
+        assert entries == [{"name": "z"}]
+
+    def test_index_of_uses_identity(self):
+        """index_of 按对象身份查找，内容相同的不同对象不算"""
+        from core.entry_list import EntryList
+
+        a, b = {"name": "same"}, {"name": "same"}
+        entries = EntryList([a, b])
+        assert entries.index_of(b) == 1
+        assert entries.index_of({"name": "same"}) == -1
+        entries.unsubscribe(object())
+        assert list(entries) == [a, b] and type(list(entries)) is list
+
+
+class TestSearchIndex:
+    """条目搜索索引测试"""
+
+    @staticmethod
+    def _entries():
+        return [
+            {"name": "GitHub", "type": "Website", "url": "https://github.com", "username": "alice"},
+            {"name": "web-01", "type": "Server", "ip": "10.0.0.1", "username": "root"},
+            {"name": "orders", "type": "Database", "host": "10.0.1.5", "database_name": "shop", "username": "app"},
+            {"name": "reports", "type": "Database", "host": "192.168.1.9", "database_name": "bi", "username": "root"},
+        ]
+
+    def _names(self, index, entries, query):
+        matches = index.search(query)
+        return None if matches is None else [e["name"] for e in entries if id(e) in matches]
+
+    def test_parse_query(self):
+        """字段过滤、别名与普通词"""
+        from core.search import parse_query
+
+        assert parse_query("Type:DB host:10. Git") == [("type", "db"), ("host", "10."), (None, "git")]
+        assert parse_query("db:shop foo:bar host:") == [("database_name", "shop"), (None, "foo:bar")]
+        assert parse_query("   ") == []
+
+    def test_search(self):
+        """子串、前缀、字段与类型过滤都要同时满足"""
+        from core.entry_list import EntryList
+        from core.search import SearchIndex
+
+        entries = EntryList(self._entries())
+        index = SearchIndex(entries)
+        assert self._names(index, entries, "") is None
+        assert self._names(index, entries, "git") == ["GitHub"]
+        assert self._names(index, entries, "hub.co") == ["GitHub"]
+        assert self._names(index, entries, "ROOT") == ["web-01", "reports"]
+        assert self._names(index, entries, "10.0") == ["web-01", "orders"]
+        assert self._names(index, entries, "type:Database host:10.") == ["orders"]
+        assert self._names(index, entries, "type:data root") == ["reports"]
+        assert self._names(index, entries, "db:sho") == ["orders"]
+        assert self._names(index, entries, "host:10.0.0") == []
+
+    def test_incremental_updates(self):
+        """增删改后当前查询的结果同步更新，与重新建立索引的结果一致"""
+        from core.entry_list import EntryList
+        from core.search import SearchIndex
+
+        entries = EntryList(self._entries())
+        index = SearchIndex(entries)
+        index.set_query("root")
+        entries.append({"name": "db-02", "type": "Server", "ip": "10.0.0.2", "username": "root"})
+        entries[0] = dict(entries[0], username="root")
+        del entries[1]
+        entries.insert(0, {"name": "mail", "type": "Website", "url": "https://mail.example.com"})
+        expected = {id(e) for e in entries if "root" in e.get("username", "")}
+        assert index.matches == expected
+        assert index.search("root") == SearchIndex(list(entries)).search("root") == expected
+
+        entries[:] = self._entries()[:2]
+        assert index.matches == {id(entries[1])}
+
+    def test_refined_query_matches_fresh_search(self):
+        """继续输入时在上次结果中过滤，结果与直接搜索相同"""
+        from core.entry_list import EntryList
+        from core.search import SearchIndex
+
+        entries = EntryList(dict(e) for e in self._entries() * 3)
+        index = SearchIndex(entries)
+        for query in ["t", "ty", "type:", "type:d", "type:database", "type:database h", "type:database host:1",
+                      "type:database host:10", "type:database host:19", "r", "ro", "roo", "root", "ro"]:
+            assert index.set_query(query) == SearchIndex(entries).search(query), query
+
+
+class TestConnectionTester:
+    """后台并发连接测试"""
+
+    @pytest.fixture
+    def executor(self):
+        from core.tasks import IO_LANE, IO_WORKERS, TaskExecutor
+
+        executor = TaskExecutor(lanes={IO_LANE: IO_WORKERS})
+        yield executor
+        executor.shutdown(wait=True)
+
+    @staticmethod
+    def _probe(delay, active=None, peak=None, lock=None):
+        def probe(entry):
+            if active is not None:
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+            time.sleep(delay)
+            if active is not None:
+                with lock:
+                    active[0] -= 1
+            if entry.get("fail"):
+                raise OSError("refused")
+            return f"✅ {entry['name']}"
+        return probe
+
+    def test_batch_runs_concurrently(self, executor):
+        """批量测试的总耗时接近单个测试，而不是逐个相加"""
+        import threading
+        from core.db_tester import ConnectionTester
+
+        tester = ConnectionTester(test_func=self._probe(0.2), executor=executor)
+        entries = [{"name": f"db-{i}", "fail": i == 3} for i in range(100)]
+        results, done = {}, threading.Event()
+        start = time.monotonic()
+        batch = tester.test_all(entries, on_result=lambda e, r: results.__setitem__(e["name"], r),
+                                on_done=lambda b: done.set())
+        assert done.wait(5)
+        assert time.monotonic() - start < 1.5
+        assert batch.done == batch.total == len(results) == 100
+        assert results["db-0"] == "✅ db-0"
+        assert results["db-3"].startswith("❌") and "refused" in results["db-3"]
+
+    def test_concurrency_limit_and_cancel(self, executor):
+        """同时进行的测试不超过上限；取消后不再启动新的测试，on_done 只调用一次"""
+        import threading
+        from core.db_tester import ConnectionTester
+
+        active, peak, lock = [0], [0], threading.Lock()
+        tester = ConnectionTester(test_func=self._probe(0.05, active, peak, lock), executor=executor)
+        entries = [{"name": f"db-{i}"} for i in range(40)]
+        finished = []
+        batch = tester.test_all(entries, on_done=finished.append, concurrency=4)
+        time.sleep(0.12)
+        skipped = batch.cancel()
+        deadline = time.monotonic() + 5
+        while not finished and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        assert finished == [batch] and batch.finished
+        assert peak[0] <= 4
+        assert skipped and batch.done + len(skipped) == 40
+        assert batch.cancel() == []
+
+    def test_submit_uses_snapshot(self, executor):
+        """工作线程拿到的是提交时的副本"""
+        import threading
+        from core.db_tester import ConnectionTester
+
+        seen, done = [], threading.Event()
+        tester = ConnectionTester(test_func=lambda e: seen.append(e) or "✅", executor=executor)
+        entry = {"name": "db"}
+        tester.submit(entry, lambda e, r: done.set() if e is entry else None)
+        assert done.wait(5)
+        assert seen == [entry] and seen[0] is not entry
+
+    def test_sqlite_probe(self, tmp_path):
+        """SQLite 连接测试"""
+        import sqlite3
+        from core.db_drivers import ConfigError, get_driver
+        from core.db_tester import test_database_connection
+
+        path = tmp_path / "a.db"
+        sqlite3.connect(path).close()
+        assert test_database_connection({"db_type": "SQLite", "sqlite_path": str(path)}).startswith("✅")
+        assert test_database_connection({"db_type": "SQLite", "sqlite_path": str(tmp_path / "x.db")}).startswith("❌")
+        with pytest.raises(ConfigError):
+            get_driver("SQLite").probe({"sqlite_path": str(tmp_path / "x.db")})
+
+
+class TestHealth:
+    """连接健康状态缓存与限流"""
+
+    def test_cache_ttl_and_key(self):
+        """按连接参数记录结果；超过 TTL 视为过期"""
+        from core.health import HealthCache
+
+        cache = HealthCache(ttl=60)
+        entry = {"name": "a", "type": "Database", "db_type": "MySQL", "host": "h", "port": "3306", "password": "x"}
+        assert cache.get(entry) is None and cache.is_stale(entry)
+
+        status = cache.put(entry, "✅ MySQL 连接成功", 0.012, checked_at=1000)
+        assert status.ok and status.latency == 0.012
+        # 名称、密码不影响连接标识
+        assert cache.get(dict(entry, name="b", password="y")) == status
+        assert cache.get(dict(entry, port="3307")) is None
+        assert not cache.is_stale(entry, now=1059)
+        assert cache.is_stale(entry, now=1060)
+
+        assert not cache.put(entry, "❌ 连接失败: refused", 5.0).ok
+        cache.invalidate(entry)
+        assert cache.get(entry) is None
+
+    def test_host_limiter(self):
+        """同一主机同时进行的探测不超过上限，不同主机互不影响"""
+        import threading
+        from core.health import HostLimiter
+
+        limiter = HostLimiter(per_host=2, interval=0)
+        active, peak, lock = {}, {}, threading.Lock()
+
+        def probe(host):
+            limiter.acquire(host)
+            try:
+                with lock:
+                    active[host] = active.get(host, 0) + 1
+                    peak[host] = max(peak.get(host, 0), active[host])
+                time.sleep(0.02)
+                with lock:
+                    active[host] -= 1
+            finally:
+                limiter.release(host)
+
+        threads = [threading.Thread(target=probe, args=(host,)) for host in ["a"] * 10 + ["b"] * 10]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        assert peak == {"a": 2, "b": 2}
+
+    def test_host_limiter_interval(self):
+        """同一主机相邻两次开始至少间隔 interval 秒"""
+        from core.health import HostLimiter
+
+        limiter = HostLimiter(per_host=10, interval=0.05)
+        start = time.monotonic()
+        for _ in range(4):
+            limiter.acquire("a")
+            limiter.release("a")
+        assert time.monotonic() - start >= 0.15
+
+    def test_tester_records_health(self):
+        """测试结果和耗时记入缓存"""
+        import threading
+        from core.db_tester import ConnectionTester
+        from core.health import HealthCache, HostLimiter
+        from core.tasks import IO_LANE, TaskExecutor
+
+        cache = HealthCache()
+        executor = TaskExecutor(lanes={IO_LANE: 2})
+        tester = ConnectionTester(test_func=lambda e: time.sleep(0.02) or "✅ ok", cache=cache, limiter=HostLimiter(),
+                                  executor=executor)
+        entry = {"name": "db", "type": "Database", "host": "h"}
+        done = threading.Event()
+        tester.submit(entry, lambda e, r: done.set())
+        assert done.wait(5)
+        status = cache.get(entry)
+        assert status.ok and status.latency >= 0.02 and not cache.is_stale(entry)
+        executor.shutdown()
+
+
+class TestDbDrivers:
+    """数据库驱动注册表测试"""
+
+    def test_registry_lookup(self):
+        """按 db_type 查找驱动，不区分大小写"""
+        from core.db_drivers import driver_names, get_driver
+
+        assert driver_names()[:3] == ["MySQL", "PostgreSQL", "SQLite"]  # 新条目默认仍是 MySQL
+        assert get_driver("mysql") is get_driver("MySQL")
+        assert get_driver("oracle") is None and get_driver("") is None
+
+    def test_fields_and_ports(self):
+        """各驱动声明的表单字段和默认端口"""
+        from core.db_drivers import get_driver
+
+        assert get_driver("SQLite").field_keys == ("sqlite_path",)
+        assert get_driver("SQLite").default_port is None
+        assert get_driver("MySQL").default_port == 3306
+        assert get_driver("PostgreSQL").default_port == 5432
+        assert "password" in get_driver("PostgreSQL").field_keys
+
+    def test_location(self):
+        """表格“位置”列由驱动决定"""
+        from core.db_drivers import get_driver
+
+        assert get_driver("SQLite").location({"sqlite_path": "/tmp/a.db", "host": "h"}) == "/tmp/a.db"
+        assert get_driver("MySQL").location({"host": "h", "port": "3307"}) == "h:3307"
+
+    def test_client_libraries_imported_lazily(self):
+        """导入连接测试模块不会导入任何数据库客户端库"""
+        import subprocess
+
+        code = ("import sys; import core.db_tester; "
+                "print(any(m in sys.modules for m in ('pymysql', 'psycopg2')))")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+        assert out.stdout.strip() == "False"
+
+    def test_missing_client_library(self):
+        """客户端库未安装时返回提示而不是抛出异常"""
+        from core.db_drivers import DRIVERS, Driver, register
+        from core.db_tester import test_database_connection
+
+        @register
+        class FakeDriver(Driver):
+            name = "FakeDB"
+            module = "no_such_db_client_module"
+
+            def probe(self, entry):
+                self.client()
+                return "✅"
+
+        try:
+            result = test_database_connection({"db_type": "fakedb", "host": "h"})
+            assert result.startswith("❌") and "no_such_db_client_module" in result
+        finally:
+            del DRIVERS["FakeDB"]
+
+
+class TestStartupProfiler:
+    """启动剖析测试"""
+
+    def test_configure(self):
+        """命令行参数和环境变量决定是否启用以及报告文件"""
+        from core.startup import DEFAULT_OUTPUT, StartupProfiler
+
+        p = StartupProfiler()
+        assert p.configure(["main.py"], {}) == ["main.py"] and not p.enabled
+        assert p.configure(["main.py", "--profile-startup", "-x"], {}) == ["main.py", "-x"]
+        assert p.output == DEFAULT_OUTPUT
+        p = StartupProfiler()
+        p.configure(["main.py", "--profile-startup=a.json"], {})
+        assert p.output == "a.json"
+        p = StartupProfiler()
+        p.configure(["main.py"], {"DSK_PROFILE_STARTUP": "b.json"})
+        assert p.output == "b.json"
+        p = StartupProfiler()
+        p.configure(["main.py"], {"DSK_PROFILE_STARTUP": "0"})
+        assert not p.enabled
+
+    def test_disabled_records_nothing(self):
+        """未启用时不记录"""
+        from core.startup import StartupProfiler
+
+        p = StartupProfiler()
+        p.mark("imports")
+        with p.phase("kdf"):
+            pass
+        assert p.marks == [] and p.phases == {} and p.finish() is None
+
+    def test_report(self, tmp_path):
+        """时间点、嵌套阶段（只计入最内层）和预算写入报告"""
+        from core.startup import StartupProfiler
+
+        p = StartupProfiler(budget=10)
+        p.output = str(tmp_path / "profile.json")
+        p.mark("imports")
+        with p.phase("decrypt"):
+            with p.phase("kdf"):
+                time.sleep(0.05)
+            time.sleep(0.01)
+        p.mark("prompt")
+        path = p.finish()
+        assert not p.enabled
+        with open(path, encoding="utf-8") as f:
+            report = json.load(f)
+        assert [m["name"] for m in report["marks"]] == ["imports", "prompt"]
+        assert report["phases_ms"]["kdf"] >= 50
+        assert 10 <= report["phases_ms"]["decrypt"] < 50
+        assert report["prompt_ms"] is not None and not report["over_budget"]
+
+    def test_prompt_imports_are_light(self):
+        """导入 main 时不加载加密库、存储和主窗口，这些在显示密码框之后才导入"""
+        import subprocess
+
+        pytest.importorskip("PySide6")
+        code = ("import sys; import main; "
+                "print(sorted(m for m in ('cryptography', 'core.storage', 'ui.main_window') if m in sys.modules))")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+        assert out.stdout.strip() == "[]"
+
+
+class TestExchange:
+    """JSON 导入导出测试"""
+
+    def test_roundtrip(self, tmp_path):
+        """导出后读回内容一致"""
+        from core.exchange import export_json, read_json
+
+        entries = [{"name": "中文", "type": "Website"}, {"name": "b", "type": "Server"}]
+        path = str(tmp_path / "out.json")
+        export_json(entries, path)
+        assert read_json(path) == entries
+
+
+class TestBenchmarks:
+    """基准测试工具测试"""
+
+    def test_synthetic_vault(self):
+        """合成保管箱按种子确定，三种类型混合"""
+        from benchmarks.synthetic import make_vault
+
+        vault = make_vault(30)
+        assert vault == make_vault(30) and vault != make_vault(30, seed=1)
+        assert {e["type"] for e in vault} == {"Website", "Server", "Database"}
+        assert len({e["name"] for e in vault}) == 30
+
+    def test_compare_flags_regressions(self):
+        """耗时超过阈值且差值足够大才算退化"""
+        from benchmarks.bench_core import compare
+
+        baseline = {"results": {"a": {"seconds": 0.1}, "b": {"seconds": 0.1}, "c": {"seconds": 0.0001}}}
+        current = {"results": {"a": {"seconds": 0.2}, "b": {"seconds": 0.11}, "c": {"seconds": 0.0003},
+                               "new": {"seconds": 1.0}}}
+        rows = {row[0]: row for row in compare(current, baseline, threshold=0.25)}
+        assert set(rows) == {"a", "b", "c"}
+        assert rows["a"][4] and not rows["b"][4] and not rows["c"][4]
+
+    def test_run_small(self, tmp_path):
+        """小规模完整运行一次并写出结果，DATA_FILE 恢复原值"""
+        import core.storage
+        from benchmarks.bench_core import main
+
+        original = core.storage.DATA_FILE
+        out = str(tmp_path / "bench.json")
+        assert main(["--sizes", "10", "-o", out]) == 0
+        assert core.storage.DATA_FILE == original
+        with open(out, encoding="utf-8") as f:
+            report = json.load(f)
+        assert {"derive_key", "save_entries[10]", "load_entries[10]", "import_dedup[10]",
+                "export_json[10]"} <= set(report["results"])
+
+    def test_percentile(self):
+        """最近秩法百分位"""
+        pytest.importorskip("PySide6")
+        from benchmarks.bench_ui import percentile
+
+        samples = list(range(1, 101))
+        assert percentile(samples, 50) == 50 and percentile(samples, 95) == 95
+        assert percentile([3.0], 95) == 3.0
+
+    def test_ui_harness_small(self, tmp_path):
+        """界面延迟基准在无显示环境中完整运行一次，导入流程自动应答"""
+        import subprocess
+
+        pytest.importorskip("PySide6")
+        out = str(tmp_path / "ui.json")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+        subprocess.run([sys.executable, "-m", "benchmarks.bench_ui", "--sizes", "20", "--repeat", "2", "-o", out],
+                       cwd=root, env=env, capture_output=True, text=True, check=True, timeout=120)
+        with open(out, encoding="utf-8") as f:
+            results = json.load(f)["results"]
+        assert {"main_window_init[20]", "refresh_table[20]", "import_json[20]",
+                "open_add_entry_dialog[SQLite]"} <= set(results)
+        assert all(r["p50"] <= r["p95"] for r in results.values())
+
+
+class TestKdf:
+    """密钥派生参数与校准测试"""
+
+    def test_params_roundtrip(self):
+        """参数序列化往返，缺少参数时按旧的固定参数处理"""
+        from core.crypto import KdfParams, LEGACY_KDF, SCRYPT
+
+        params = KdfParams(SCRYPT, n=2 ** 15)
+        assert KdfParams.from_dict(json.loads(json.dumps(params.to_dict()))) == params
+        assert KdfParams.from_dict(None) == LEGACY_KDF
+        with pytest.raises(ValueError):
+            KdfParams.from_dict({"algorithm": "md5"})
+
+    def test_scale_params(self):
+        """按耗时比例放大成本并限制上下限"""
+        from core.crypto import (ARGON2ID, MIN_PBKDF2_ITERATIONS, MAX_SCRYPT_N, MIN_ARGON2_ITERATIONS,
+                                 PBKDF2, SCRYPT, KdfParams, scale_params)
+
+        assert scale_params(KdfParams(PBKDF2, 20_000), 30).iterations == 600_000
+        assert scale_params(KdfParams(PBKDF2, 20_000), 0.5).iterations == MIN_PBKDF2_ITERATIONS
+        assert scale_params(KdfParams(SCRYPT, 0, n=2 ** 12), 20).n == 2 ** 16  # 取不超过目标的 2 的幂
+        assert scale_params(KdfParams(SCRYPT, 0, n=2 ** 12), 1000).n == MAX_SCRYPT_N
+        assert scale_params(KdfParams(ARGON2ID, 1, memory_kib=1024), 0.5).iterations == MIN_ARGON2_ITERATIONS
+
+    def test_calibrate_targets_time(self, monkeypatch):
+        """校准按测得的速度换算到目标耗时"""
+        import core.crypto
+
+        monkeypatch.setattr(core.crypto, "_time_derive", lambda params: 0.01)
+        params = core.crypto.calibrate.__wrapped__(core.crypto.PBKDF2, target=0.3)
+        assert params.iterations == 600_000
+
+    def test_params_recorded_in_record_file(self, data_file):
+        """派生参数写入头部，解锁时按文件中的参数派生"""
+        from core.crypto import KdfParams, SCRYPT
+        from core.storage import save_entries, unlock
+
+        params = KdfParams(SCRYPT, n=2 ** 10)
+        entries = [{"name": "a", "type": "Website", "password": "p"}]
+        save_entries(entries, VaultSession.create("pw", params))
+        session, loaded = unlock("pw")
+        assert session.kdf == params and loaded == entries
+        with pytest.raises(ValueError):
+            unlock("wrong")
+
+    def test_params_recorded_in_sqlite(self, data_file):
+        """SQLite 存储同样记录派生参数"""
+        from core.crypto import ARGON2ID, KdfParams, available_algorithms
+        from core.storage import migrate, save_entries, unlock
+
+        if ARGON2ID not in available_algorithms():
+            pytest.skip("cryptography 版本不支持 Argon2id")
+        params = KdfParams(ARGON2ID, iterations=1, memory_kib=1024)
+        entries = [{"name": "a", "type": "Server", "password": "p"}]
+        save_entries(entries, VaultSession.create("pw", params), backend="sqlite")
+        session, loaded = unlock("pw")
+        assert session.kdf == params and loaded == entries
+        migrate("pw", "records")
+        assert unlock("pw")[0].kdf == params
+
+    def test_unsupported_algorithm_not_reported_as_wrong_password(self, data_file, monkeypatch):
+        """本机不支持文件记录的派生算法时说明原因，而不是提示密码错误"""
+        import core.crypto
+        from core.crypto import ARGON2ID, KdfParams, available_algorithms
+        from core.storage import read_vault, save_entries, unlock
+
+        if ARGON2ID not in available_algorithms():
+            pytest.skip("cryptography 版本不支持 Argon2id")
+        params = KdfParams(ARGON2ID, iterations=1, memory_kib=1024)
+        save_entries([{"name": "a", "type": "Website"}], VaultSession.create("pw", params))
+        with pytest.raises(ValueError, match="主密码错误"):
+            unlock("wrong")
+        monkeypatch.setattr(core.crypto, "Argon2id", None)
+        with pytest.raises(ValueError, match="不支持 Argon2id"):
+            unlock("pw")
+        with pytest.raises(ValueError, match="不支持 Argon2id"):
+            read_vault(data_file, "pw")
+
+    def test_blob_format_requires_legacy_params(self):
+        """整块加密格式不记录参数，只能使用旧的固定参数"""
+        from core.crypto import KdfParams, SCRYPT
+
+        with pytest.raises(ValueError):
+            VaultSession("pw", kdf=KdfParams(SCRYPT, n=2 ** 10)).encrypt("data")
+
+
+class TestNdjson:
+    """NDJSON 流式导入导出测试"""
+
+    def test_roundtrip(self, tmp_path):
+        """逐行导出后读回，按名称去重"""
+        from core.exchange import export_ndjson, import_ndjson
+
+        entries = [{"name": f"e{i}", "type": "Website", "note": "中文"} for i in range(1200)]
+        path = str(tmp_path / "out.ndjson")
+        calls = []
+        assert export_ndjson(entries, path, lambda done, total: calls.append(done))
+        assert calls and calls[-1] <= len(entries)
+        with open(path, encoding="utf-8") as f:
+            assert sum(1 for _ in f) == len(entries)
+        result = import_ndjson(path, entries[:200])
+        assert result.valid == 1200 and result.duplicates == 200
+        assert result.new_entries == entries[200:] and not result.cancelled
+
+    def test_cancel_export_leaves_no_file(self, tmp_path):
+        """取消导出时不留下文件"""
+        from core.exchange import export_ndjson
+
+        path = tmp_path / "out.ndjson"
+        entries = [{"name": str(i)} for i in range(2000)]
+        assert not export_ndjson(entries, str(path), lambda done, total: False)
+        assert list(tmp_path.iterdir()) == []
+
+    def test_validation_and_in_file_dedup(self, tmp_path):
+        """无效行记录行号，文件内重复的名称只导入第一个"""
+        from core.exchange import import_ndjson
+
+        path = tmp_path / "in.ndjson"
+        path.write_text('{"name": "a"}\n\n[1, 2]\n{"type": "Website"}\nnot json\n{"name": "a"}\n{"name": "b"}\n',
+                        encoding="utf-8")
+        result = import_ndjson(str(path), [])
+        assert [e["name"] for e in result.new_entries] == ["a", "b"]
+        assert result.duplicates == 1 and result.valid == 3
+        report = result.report
+        assert sorted({i.position for i in report.issues if i.severity == "error"}) == [3, 4, 5]
+        assert report.error_count == 3 and report.unit == "行"
+
+    def test_cancel_import(self, tmp_path):
+        """进度回调返回 False 时停止读取"""
+        from core.exchange import export_ndjson, import_ndjson
+
+        path = str(tmp_path / "in.ndjson")
+        export_ndjson([{"name": str(i)} for i in range(3000)], path)
+        seen = []
+        result = import_ndjson(path, [], lambda read, total: seen.append(read) or len(seen) < 2)
+        assert result.cancelled and len(result.new_entries) < 3000
+
+    def test_memory_independent_of_file_size(self, tmp_path):
+        """只保留新条目：全部重复的大文件导入时内存峰值远小于文件大小"""
+        import tracemalloc
+        from core.exchange import import_ndjson
+
+        existing = [{"name": f"entry-{i}", "type": "Website", "url": "u", "password": "x" * 64} for i in range(100)]
+        path = tmp_path / "big.ndjson"
+        with open(path, "w", encoding="utf-8") as f:
+            for i in range(50_000):
+                f.write(json.dumps(existing[i % 100]) + "\n")
+        tracemalloc.start()
+        try:
+            result = import_ndjson(str(path), existing)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert result.duplicates == 50_000 and not result.new_entries
+        assert peak < path.stat().st_size / 10
+
+
+class TestValidation:
+    """条目校验与批量校验报告测试"""
+
+    def test_rules(self):
+        """按类型检查必填字段、端口和数据库类型"""
+        from core.validation import ERROR, WARNING, errors, validate_entry
+
+        assert validate_entry({"name": "a", "type": "Website", "url": "https://a"}) == []
+        assert validate_entry([1]) == [(ERROR, "", "不是对象")]
+        assert errors({"type": "Website", "url": "x"}) == ["缺少 'name' 字段"]
+        assert errors({"name": "  ", "type": "Website", "url": "x"})
+        assert errors({"name": "a", "type": "Ftp"})
+        assert errors({"name": "a", "type": "Server", "ip": "h", "port": "70000"})
+        assert errors({"name": "a", "type": "Server", "ip": "h", "port": "ssh"})
+        assert errors({"name": "a", "type": "Website", "url": "x", "tags": ["t"]})
+        assert errors({"name": "a", "type": "Database", "db_type": "Oracle", "host": "h"})
+        # SQLite 没有端口字段，位置字段为文件路径
+        assert validate_entry({"name": "a", "type": "Database", "db_type": "SQLite", "sqlite_path": "/a.db"}) == []
+        warnings = validate_entry({"name": "a", "type": "Database", "db_type": "MySQL", "port": "3306"})
+        assert warnings == [(WARNING, "host", "缺少 host")]
+        assert [f for _, f, _ in validate_entry({"name": "a"})] == ["type"]
+
+    def test_report(self, tmp_path):
+        """报告汇总错误和警告，警告的条目仍可导入；CSV 带表头"""
+        import csv
+        from core.validation import validate_entries
+
+        items = [
+            {"name": "ok", "type": "Website", "url": "u"},
+            {"name": "warn", "type": "Website"},
+            {"type": "Server", "ip": "h", "port": "0"},
+            "bad",
+        ]
+        valid, report = validate_entries(items)
+        assert [e.get("name") for e in valid] == ["ok", "warn"]
+        assert report.checked == 4 and report.error_count == 2 and report.warning_count == 1
+        assert report.issue_count == 4 and not report.truncated and bool(report)
+        assert "2 个有错误" in report.summary()
+
+        path = tmp_path / "report.csv"
+        report.write_csv(str(path))
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.reader(f))
+        assert rows[0][0] == "位置（项）" and len(rows) == 5
+        assert rows[1][:4] == ["2", "warn", "url", "警告"]
+
+    def test_truncated(self, monkeypatch):
+        """超过 MAX_ISSUES 的问题只计数"""
+        import core.validation
+        from core.validation import validate_entries
+
+        monkeypatch.setattr(core.validation, "MAX_ISSUES", 3)
+        _, report = validate_entries([{}] * 5)
+        # 每个空对象有两个问题：缺少 name（错误）和缺少类型（警告）
+        assert len(report.issues) == 3 and report.issue_count == 10 and report.truncated
+        assert report.error_count == 5
+
+    def test_import_entries(self):
+        """批量导入：跳过有错误的条目，与现有条目及列表内部按名称去重，同名但内容不同的条目单独列出"""
+        from core.exchange import import_entries
+
+        items = [{"name": "a", "type": "Website", "url": "u"}, {"name": "b"}, {"name": "b"},
+                 {"name": "c", "type": "Server", "port": "99999"}, 3]
+        result = import_entries(items, [{"name": "a"}])
+        assert [e["name"] for e in result.new_entries] == ["b"]
+        assert result.changed == [items[0]]
+        assert result.valid == 3 and result.duplicates == 1
+        assert result.report.error_count == 2 and result.report.warning_count == 2
+
+
+class TestMerge:
+    """内容散列合并测试"""
+
+    def test_hash_and_summary(self):
+        """散列与字段顺序无关；摘要只报告不同的条目"""
+        from core.merge import VaultSummary, entry_hash
+
+        assert entry_hash({"name": "a", "url": "u"}) == entry_hash({"url": "u", "name": "a"})
+        mine = [{"name": f"e{i}", "password": str(i)} for i in range(1000)]
+        theirs = [dict(e) for e in mine]
+        assert VaultSummary(mine).root == VaultSummary(theirs).root
+        assert VaultSummary(mine).diff(VaultSummary(theirs)) == ([], [], [])
+
+        theirs[10]["password"] = "changed"
+        del theirs[20]
+        theirs.append({"name": "new"})
+        assert VaultSummary(mine).diff(VaultSummary(theirs)) == (["e20"], ["new"], ["e10"])
+
+    def test_lazy_entries_not_decrypted(self, tmp_path):
+        """未解密的条目使用保存时的摘要，比较时不触发解密"""
+        from core.merge import VaultSummary
+        from core.records import RecordStore
+
+        entries = [{"name": f"e{i}", "type": "Website", "password": str(i)} for i in range(5)]
+        path = str(tmp_path / "v.dat")
+        RecordStore.create(path, VaultSession.create("pw"), entries).close()
+        store, lazy = RecordStore.open(path, "pw")
+        try:
+            assert VaultSummary(lazy).root == VaultSummary(entries).root
+            assert not any(e.resolved for e in lazy)
+        finally:
+            store.close()
+
+    def test_three_way_auto_merge(self):
+        """双方修改不同字段时自动合并，删除按共同祖先传播"""
+        from core.merge import merge
+
+        base = [{"name": "a", "url": "u", "password": "p"}, {"name": "gone", "url": "x"}, {"name": "kept"}]
+        mine = [{"name": "a", "url": "u", "password": "p2"}, {"name": "gone", "url": "x"}, {"name": "mine-new"}]
+        theirs = [{"name": "a", "url": "u2", "password": "p"}, {"name": "kept"}, {"name": "their-new"}]
+        result = merge(mine, theirs, base)
+        assert not result.conflicts
+        assert result.updated == {"a": {"name": "a", "url": "u2", "password": "p2"}}
+        # gone 被对方删除；kept 被我方删除且对方未修改，保持删除
+        assert result.removed == {"gone"}
+        assert [e["name"] for e in result.added] == ["their-new"]
+        merged = result.apply([dict(e) for e in mine])
+        assert [e["name"] for e in merged] == ["a", "mine-new", "their-new"]
+
+    @pytest.mark.parametrize("policy, password, names", [
+        ("mine", "m", ["a"]),
+        ("theirs", "t", ["a"]),
+        ("both", "m", ["a", "a (2)"]),
+    ])
+    def test_conflict_policies(self, policy, password, names):
+        """字段冲突按策略处理，非冲突字段仍自动合并"""
+        from core.merge import merge
+
+        base = [{"name": "a", "url": "u", "password": "b"}]
+        mine = [{"name": "a", "url": "u", "password": "m"}]
+        theirs = [{"name": "a", "url": "u2", "password": "t"}]
+        result = merge(mine, theirs, base, policy)
+        assert [(c.field, c.base, c.mine, c.theirs) for c in result.conflicts] == [("password", "b", "m", "t")]
+        merged = result.apply([dict(e) for e in mine])
+        assert [e["name"] for e in merged] == names
+        assert merged[0] == {"name": "a", "url": "u2", "password": password}
+        if policy == "both":
+            assert merged[1]["password"] == "t"
+
+    def test_without_base(self):
+        """没有共同祖先时不同的字段都是冲突，不删除任何条目"""
+        from core.merge import merge
+
+        mine = [{"name": "a", "url": "u", "note": "n"}, {"name": "only-mine"}]
+        theirs = [{"name": "a", "url": "u2", "tags": "t"}]
+        result = merge(mine, theirs, policy="theirs")
+        assert sorted(c.field for c in result.conflicts) == ["note", "tags", "url"]
+        assert result.updated == {"a": {"name": "a", "url": "u2", "tags": "t"}} and not result.removed
+        with pytest.raises(ValueError):
+            merge(mine, theirs, policy="unknown")
+
+    def test_delete_modify_conflict(self):
+        """一方删除、另一方修改时按策略决定是否保留"""
+        from core.merge import merge
+
+        base = [{"name": "a", "url": "u"}]
+        modified = [{"name": "a", "url": "u2"}]
+        assert merge([], modified, base, "mine").added == []
+        assert merge([], modified, base, "theirs").added == modified
+        assert merge(modified, [], base, "theirs").removed == {"a"}
+        assert not merge(modified, [], base, "both").removed
+        assert merge(modified, [], base).conflicts[0].field == ""
+
+    def test_read_vault(self, tmp_path):
+        """读取另一个保管箱文件，不影响当前数据文件"""
+        from core.records import RecordStore
+        from core.storage import read_vault
+
+        entries = [{"name": "a", "password": "p"}]
+        path = str(tmp_path / "other.dat")
+        RecordStore.create(path, VaultSession.create("other"), entries).close()
+        assert read_vault(path, "other") == entries
+        legacy = tmp_path / "legacy.dat"
+        legacy.write_bytes(encrypt_data(json.dumps(entries), "other"))
+        assert read_vault(str(legacy), "other") == entries
+        with pytest.raises(ValueError):
+            read_vault(path, "wrong")
+
+
+class TestBackup:
+    """分段加密备份测试"""
+
+    def _write(self, tmp_path, entries, segment_size=1024):
+        from core.backup import write_backup
+        from core.crypto import LEGACY_KDF
+
+        path = str(tmp_path / "b.dskbackup")
+        assert write_backup(entries, path, "backup-pw", LEGACY_KDF, segment_size=segment_size)
+        return path
+
+    def test_roundtrip(self, tmp_path):
+        """写出后逐条读回；明文不出现在文件中"""
+        from core.backup import is_backup, read_backup, verify_backup
+
+        entries = [{"name": f"e{i}", "password": f"secret-{os.urandom(16).hex()}", "note": "中文"}
+                   for i in range(300)]
+        path = self._write(tmp_path, entries)
+        assert is_backup(path) and not is_backup(__file__)
+        with open(path, "rb") as f:
+            assert b"secret-" not in f.read()
+        assert list(read_backup(path, "backup-pw")) == entries
+        result = verify_backup(path, "backup-pw")
+        assert result.ok and result.entries == 300 and result.segments > 5
+        with pytest.raises(ValueError, match="密码"):
+            list(read_backup(path, "wrong"))
+
+    @pytest.mark.parametrize("count", [0, 1])
+    def test_empty_and_exact_segments(self, tmp_path, count):
+        """空备份只有一个空的最后一段；明文正好是段大小的整数倍时也能读回"""
+        from core.backup import read_backup
+
+        entries = [{"name": "x" * (1024 - 15)}] * count  # 每行正好 1024 字节
+        path = self._write(tmp_path, entries)
+        assert list(read_backup(path, "backup-pw")) == entries
+
+    @staticmethod
+    def _header_size(data):
+        import struct
+        return 7 + struct.unpack_from(">H", data, 5)[0]
+
+    def test_corrupted_segment_located(self, tmp_path):
+        """损坏的段能准确定位，其余段仍通过认证"""
+        from core.backup import BackupError, TAG_SIZE, read_backup, verify_backup
+
+        path = self._write(tmp_path, [{"name": f"e{i}", "password": os.urandom(20).hex()} for i in range(200)])
+        data = bytearray(open(path, "rb").read())
+        offset = self._header_size(data) + 3 * (1024 + TAG_SIZE)
+        data[offset + 10] ^= 1
+        open(path, "wb").write(bytes(data))
+
+        result = verify_backup(path, "backup-pw")
+        assert [(i, at) for i, at, _ in result.bad_segments] == [(3, offset)]
+        assert result.bad_segments[0][2].startswith("第 4 段")
+        with pytest.raises(BackupError) as info:
+            list(read_backup(path, "backup-pw"))
+        assert (info.value.segment, info.value.offset) == (3, offset)
+
+    def test_truncated_and_reordered(self, tmp_path):
+        """截断在段边界处的文件和重排的段都认证失败"""
+        from core.backup import BackupError, TAG_SIZE, read_backup, verify_backup
+
+        path = self._write(tmp_path, [{"name": f"e{i}", "password": os.urandom(20).hex()} for i in range(200)])
+        data = open(path, "rb").read()
+        chunk = 1024 + TAG_SIZE
+        header = self._header_size(data)
+        segments = (len(data) - header + chunk - 1) // chunk
+
+        # 去掉最后一段
+        cut = data[:header + (segments - 1) * chunk]
+        open(path, "wb").write(cut)
+        result = verify_backup(path, "backup-pw")
+        assert len(result.bad_segments) == 1 and "截断" in result.bad_segments[0][2]
+        with pytest.raises(BackupError):
+            list(read_backup(path, "backup-pw"))
+
+        # 交换第 2、3 段
+        first, second = header + chunk, header + 2 * chunk
+        swapped = data[:first] + data[second:second + chunk] + data[first:second] + data[second + chunk:]
+        open(path, "wb").write(swapped)
+        assert [i for i, _, _ in verify_backup(path, "backup-pw").bad_segments] == [1, 2]
+
+    def test_verify_constant_memory(self, tmp_path):
+        """校验大备份时内存峰值与文件大小无关"""
+        import tracemalloc
+        from core.backup import verify_backup
+
+        entries = [{"name": f"e{i}", "password": os.urandom(100).hex()} for i in range(20_000)]
+        path = self._write(tmp_path, entries, segment_size=64 * 1024)
+        plain_size = sum(len(json.dumps(e)) + 1 for e in entries)  # 文件已压缩，按明文数据量比较
+        tracemalloc.start()
+        try:
+            result = verify_backup(path, "backup-pw")
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert result.ok and result.entries == 20_000
+        assert peak < plain_size / 5
+
+    def test_cancel_leaves_no_file(self, tmp_path):
+        """取消写出时不留下文件"""
+        from core.backup import write_backup
+        from core.crypto import LEGACY_KDF
+
+        path = tmp_path / "b.dskbackup"
+        assert not write_backup([{"name": str(i)} for i in range(2000)], str(path), "pw", LEGACY_KDF,
+                                lambda done, total: False)
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestCodec:
+    """加密前压缩测试"""
+
+    @pytest.mark.parametrize("codec", ["none", "zlib"])
+    def test_roundtrip(self, codec):
+        """压缩后解压得到原数据，流式接口与一次性接口结果一致"""
+        from core.codec import Compression
+
+        compression = Compression(codec)
+        data = json.dumps(_entries(50)).encode()
+        assert compression.decompress(compression.compress(data)) == data
+        c, d = compression.compressor(), compression.decompressor()
+        stream = b"".join(c.compress(data[i:i + 100]) for i in range(0, len(data), 100)) + c.flush()
+        assert d.decompress(stream) == data
+
+    def test_header_values(self):
+        """未知算法、缺少的库都给出错误"""
+        import core.codec
+        from core.codec import Compression, get_codec
+
+        assert Compression.from_dict({"codec": "zlib"}).enabled
+        assert not Compression.from_dict({"codec": "none"}).enabled
+        with pytest.raises(ValueError):
+            Compression.from_dict({"codec": "brotli"})
+        if not core.codec.CODECS["zstd"].available:
+            with pytest.raises(ValueError, match="zstandard"):
+                get_codec("zstd")
+
+    def test_backup_codecs(self, monkeypatch):
+        """加密备份默认使用 zlib，已安装的 zstd / lz4 只作为可选项"""
+        import core.codec
+        from core.codec import BACKUP_COMPRESSION, LZ4, ZLIB, ZSTD, Compression, backup_codecs
+
+        assert BACKUP_COMPRESSION == Compression(ZLIB)
+        for zstd, lz4, expected in ((True, True, [ZLIB, ZSTD, LZ4]), (False, True, [ZLIB, LZ4]), (False, False, [ZLIB])):
+            monkeypatch.setattr(core.codec.CODECS[ZSTD], "available", zstd)
+            monkeypatch.setattr(core.codec.CODECS[LZ4], "available", lz4)
+            assert backup_codecs() == expected
+
+    def test_backup_compressed(self, tmp_path):
+        """备份流压缩后变小，算法记录在头部；不压缩的备份同样能读取和校验"""
+        from core.backup import read_backup, verify_backup, write_backup
+        from core.codec import BACKUP_COMPRESSION, NO_COMPRESSION
+        from core.crypto import LEGACY_KDF
+
+        entries = _entries(500)
+        path, plain_path = str(tmp_path / "b.dskbackup"), str(tmp_path / "plain.dskbackup")
+        write_backup(entries, path, "pw", LEGACY_KDF)
+        write_backup(entries, plain_path, "pw", LEGACY_KDF, compression=NO_COMPRESSION)
+        assert os.path.getsize(path) < os.path.getsize(plain_path) * 0.8
+        assert json.dumps(BACKUP_COMPRESSION.to_dict(), sort_keys=True).encode() in open(path, "rb").read(512)
+        for p in (path, plain_path):
+            assert list(read_backup(p, "pw")) == entries
+            assert verify_backup(p, "pw").entries == 500
+
+
+class TestEntries:
+    """类型化条目测试"""
+
+    def test_dispatch_and_shim(self):
+        """按 type 构造对应的类；未知类型保持为 dict，已是条目时原样返回"""
+        from core.entries import DatabaseEntry, ServerEntry, WebsiteEntry, make_entry
+
+        assert isinstance(make_entry({"name": "w", "type": "Website"}), WebsiteEntry)
+        assert isinstance(make_entry({"name": "s", "type": "Server"}), ServerEntry)
+        entry = make_entry({"name": "d", "type": "Database"})
+        assert isinstance(entry, DatabaseEntry) and make_entry(entry) is entry
+        for data in ({"name": "x", "type": "Note"}, {"name": "x"}):
+            assert make_entry(data) is data
+
+    def test_behaves_like_dict(self):
+        """读取、比较、摘要和序列化与内容相同的 dict 一致，schema 之外的字段原样保留"""
+        from core.entries import Entry, make_entry
+        from core.merge import entry_hash
+        from core.serialize import unpack
+
+        data = {"name": "s", "type": "Server", "ip": "10.0.0.1", "port": "22", "note": "备注"}
+        entry = make_entry(dict(data))
+        assert entry == data and data == entry and dict(entry) == data
+        assert entry["ip"] == "10.0.0.1" and entry.get("password", "-") == "-"
+        assert "note" in entry and "password" not in entry
+        assert entry_hash(entry) == entry_hash(data)
+        assert unpack(entry.to_bytes()) == data
+        restored = Entry.from_bytes(entry.to_bytes())
+        assert type(restored) is type(entry) and restored == entry
+        assert "10.0.0.1" not in repr(entry)
+
+    def test_mutation(self):
+        """可以修改字段，但不能改变类型"""
+        from core.entries import WebsiteEntry
+
+        entry = WebsiteEntry(name="w", url="https://a")
+        entry["password"] = "p"
+        del entry["url"]
+        assert entry == {"name": "w", "type": "Website", "password": "p"}
+        with pytest.raises(ValueError):
+            entry["type"] = "Server"
+        with pytest.raises(KeyError):
+            del entry["url"]
+
+    def test_validation(self):
+        """problems() 与导入、对话框使用相同的校验规则"""
+        from core.entries import ServerEntry
+        from core.validation import ERROR
+
+        assert ServerEntry(name="s", ip="h", port="22").problems() == []
+        assert (ERROR, "port", "端口超出范围 1-65535：70000") in ServerEntry(name="s", ip="h", port="70000").problems()
+
+    def test_memory(self):
+        """每个条目占用的内存不到 dict 的六成"""
+        import tracemalloc
+        from benchmarks.synthetic import make_vault
+        from core.entries import make_entry
+
+        entries = make_vault(5000)
+        tracemalloc.start()
+        try:
+            dicts = [dict(e) for e in entries]
+            dict_size = tracemalloc.get_traced_memory()[0]
+            del dicts
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            typed = [make_entry(e) for e in entries]
+            typed_size = tracemalloc.get_traced_memory()[0] - base
+        finally:
+            tracemalloc.stop()
+        assert len(typed) == 5000 and typed_size < dict_size * 0.6
+
+    def test_unknown_type_round_trip(self, tmp_path):
+        """类型未知的条目经记录格式保存、读取后仍是延迟解密的 dict"""
+        from core.records import LazyEntry, RecordStore
+
+        entries = [{"name": "n", "type": "Note", "text": "secret"}, {"name": "w", "type": "Website", "password": "p"}]
+        path = str(tmp_path / "v.dat")
+        RecordStore.create(path, VaultSession.create("pw"), entries).close()
+        store, loaded = RecordStore.open(path, "pw")
+        try:
+            assert isinstance(loaded[0], LazyEntry) and not loaded[0].resolved
+            assert loaded == entries
+        finally:
+            store.close()
+
+
+class TestSerialize:
+    """条目二进制序列化测试"""
+
+    SAMPLES = [
+        {"name": "w", "type": "Website", "url": "https://例子.com", "username": "u", "password": "p"},
+        {"name": "s", "type": "Server", "ip": "10.0.0.1", "port": "22", "username": "root", "password": ""},
+        {"name": "d", "type": "Database", "db_type": "SQLite", "sqlite_path": "/tmp/a.db"},
+        {"name": "n", "type": "Note", "text": "secret"},
+        {"name": "x"},
+        {},
+        {"name": "s", "type": "Server", "port": 22, "enabled": True, "ratio": 0.5, "tags": ["a", "b"],
+         "owner": None, "off": False},
+        {"type": 5, "name": "odd"},
+    ]
+
+    @pytest.mark.parametrize("entry", SAMPLES)
+    def test_fast_path_matches_reference(self, entry):
+        """快速路径与参考实现的输出一致，反序列化得到原条目"""
+        from core.serialize import pack, pack_reference, unpack, unpack_reference
+
+        data = pack(entry)
+        assert data == pack_reference(entry)
+        assert unpack(data) == unpack_reference(data) == entry
+
+    def test_long_values(self):
+        """超过 65535 个字符的值使用长布局"""
+        from core.serialize import LAYOUT_LONG, pack, unpack
+
+        entry = {"name": "big", "type": "Website", "password": "密" * 70_000}
+        data = pack(entry)
+        assert data[0] == LAYOUT_LONG and unpack(data) == entry
+
+    def test_canonical(self):
+        """字段顺序不同、类型化条目与 dict 得到相同的字节"""
+        from core.entries import make_entry
+        from core.serialize import pack
+
+        entry = {"name": "s", "type": "Server", "ip": "h", "port": "22", "note": "备注"}
+        reordered = dict(reversed(list(entry.items())))
+        assert pack(entry) == pack(reordered) == pack(make_entry(dict(entry)))
+        assert len(pack(entry)) < len(json.dumps(entry, ensure_ascii=False).encode())
+
+    def test_malformed(self):
+        """损坏的数据抛出 ValueError"""
+        from core.serialize import pack, unpack
+
+        data = pack(self.SAMPLES[0])
+        for bad in (b"\x09" + data[1:], data[:1] + b"\x63" + data[2:], data[:-1]):
+            with pytest.raises(ValueError):
+                unpack(bad)
+
+
+class TestEnvelope:
+    """信封加密：随机数据密钥、密钥槽、恢复密钥测试"""
+
+    ENTRIES = [
+        {"name": "站点", "type": "Website", "url": "https://example.com", "username": "u", "password": "p1"},
+        {"name": "服务器", "type": "Server", "ip": "10.0.0.1", "port": "22", "username": "root", "password": "p2"},
+    ]
+
+    def test_recovery_key_format(self):
+        """恢复密钥分组显示，解析时忽略大小写、空白和分隔符"""
+        from core.crypto import RECOVERY_KEY_BYTES, new_recovery_key, parse_recovery_key
+
+        key = new_recovery_key()
+        raw = parse_recovery_key(key)
+        assert raw is not None and len(raw) == RECOVERY_KEY_BYTES
+        assert parse_recovery_key(" " + key.lower().replace("-", " ") + " ") == raw
+        assert new_recovery_key() != key
+        assert parse_recovery_key("password123") is None
+
+    def test_session_verify_and_rewrap(self):
+        """信封会话校验主密码，重新包装不改变数据密钥"""
+        from cryptography.exceptions import InvalidTag
+        from core.crypto import PASSWORD_SLOT, VaultSession
+        from core.records import RecordStore
+
+        session = VaultSession.create("old")
+        assert session.envelope and session.verify("old") and not session.verify("wrong")
+        slots = session.rewrapped(PASSWORD_SLOT, "new")
+        unlocked = VaultSession.unlock(slots, "new", session.salt)
+        assert unlocked.open(session.seal(b"data")) == b"data"
+        with pytest.raises(InvalidTag):
+            VaultSession.unlock(slots, "old", session.salt)
+        assert session.verify("old")  # rewrapped 不修改会话本身
+
+        # 直接派生密钥的会话只用于整块加密格式，没有密钥槽，也不能用于存储容器
+        legacy = VaultSession("pw")
+        assert not legacy.envelope
+        with pytest.raises(ValueError):
+            legacy.verify("pw")
+        with pytest.raises(ValueError):
+            RecordStore("unused.dat", legacy)
+
+    def test_change_password_only_rewrites_header(self, data_file):
+        """记录格式修改主密码只重写头部，记录帧逐字节不变"""
+        from core.records import HEADER_REGION
+        from core.storage import change_password, load_entries, save_entries, unlock
+
+        save_entries([dict(e) for e in self.ENTRIES], "old")
+        session, entries = unlock("old")
+        with open(data_file, "rb") as f:
+            frames = f.read()[HEADER_REGION:]
+
+        assert change_password(session, entries, "old", "new") is session
+        with open(data_file, "rb") as f:
+            assert f.read()[HEADER_REGION:] == frames
+        with pytest.raises(ValueError):
+            load_entries("old")
+        assert load_entries("new") == self.ENTRIES
+
+        # 之后的增量保存继续使用同一个数据密钥
+        save_entries(entries + [{"name": "新", "type": "Website", "password": "p3"}], session)
+        assert len(load_entries("new")) == 3
+
+    def test_wrong_old_password(self, data_file):
+        """当前主密码错误时不修改文件"""
+        from core.storage import change_password, load_entries, save_entries, unlock
+
+        save_entries([dict(e) for e in self.ENTRIES], "old")
+        session, entries = unlock("old")
+        with open(data_file, "rb") as f:
+            before = f.read()
+        with pytest.raises(ValueError):
+            change_password(session, entries, "wrong", "new")
+        with open(data_file, "rb") as f:
+            assert f.read() == before
+        assert load_entries("old") == self.ENTRIES
+
+    def test_recovery_key_unlocks(self, data_file):
+        """恢复密钥可以解锁，也可以代替当前主密码重新设置主密码"""
+        from core.storage import add_recovery_key, change_password, load_entries, save_entries, unlock
+
+        save_entries([dict(e) for e in self.ENTRIES], "old")
+        session, entries = unlock("old")
+        key = add_recovery_key(session, entries)
+        assert load_entries(key) == self.ENTRIES
+        assert load_entries("old") == self.ENTRIES
+
+        recovered, entries = unlock(key)
+        change_password(recovered, entries, key, "new")
+        assert load_entries("new") == self.ENTRIES
+        assert load_entries(key) == self.ENTRIES  # 修改主密码后恢复密钥仍有效
+
+        # 重新生成后旧的恢复密钥失效
+        session, entries = unlock("new")
+        key2 = add_recovery_key(session, entries)
+        assert load_entries(key2) == self.ENTRIES
+        with pytest.raises(ValueError):
+            load_entries(key)
+
+    def test_torn_header_falls_back(self, data_file):
+        """写新头部副本时中断（新副本损坏、旧副本未作废），仍用旧副本和旧密码打开"""
+        from core.records import HEADER_COPY
+        from core.storage import change_password, load_entries, save_entries, unlock
+
+        save_entries([dict(e) for e in self.ENTRIES], "old")
+        with open(data_file, "rb") as f:
+            original = f.read()
+        session, entries = unlock("old")
+        change_password(session, entries, "old", "new")
+        with open(data_file, "rb") as f:
+            changed = f.read()
+
+        # 新副本写了一半：旧副本 A 仍完整，副本 B 内容损坏
+        torn = bytearray(original)
+        torn[HEADER_COPY:HEADER_COPY + 64] = changed[HEADER_COPY:HEADER_COPY + 64]
+        with open(data_file, "wb") as f:
+            f.write(bytes(torn))
+        assert load_entries("old") == self.ENTRIES
+
+        # 新副本已同步、旧副本尚未作废：两个副本都有效，新密码可以打开
+        both = bytearray(original)
+        both[HEADER_COPY:2 * HEADER_COPY] = changed[HEADER_COPY:2 * HEADER_COPY]
+        with open(data_file, "wb") as f:
+            f.write(bytes(both))
+        assert load_entries("new") == self.ENTRIES
+
+        # 正常完成后旧副本已作废
+        with open(data_file, "wb") as f:
+            f.write(changed)
+        with pytest.raises(ValueError):
+            load_entries("old")
+
+    def test_blob_file_converted(self, data_file):
+        """整块加密格式的文件解锁后换用随机数据密钥，修改主密码时整体写入为记录格式"""
+        from core.crypto import encrypt_data
+        from core.records import is_record_file
+        from core.storage import change_password, load_entries, unlock
+
+        with open(data_file, "wb") as f:
+            f.write(encrypt_data(json.dumps(self.ENTRIES), "old"))
+        session, entries = unlock("old")
+        assert session.envelope
+        assert change_password(session, entries, "old", "new").envelope
+        assert is_record_file(data_file)
+        assert load_entries("new") == self.ENTRIES
+        with pytest.raises(ValueError):
+            load_entries("old")
+
+    def test_sqlite_update_keys(self, data_file):
+        """SQLite 存储修改主密码、恢复密钥只更新 meta 中的密钥槽"""
+        from core.storage import add_recovery_key, change_password, load_entries, save_entries, unlock
+
+        save_entries([dict(e) for e in self.ENTRIES], "old", backend="sqlite")
+        session, entries = unlock("old")
+        assert session.envelope
+        assert change_password(session, entries, "old", "new") is session
+        key = add_recovery_key(session, entries)
+        assert load_entries("new") == self.ENTRIES
+        assert load_entries(key) == self.ENTRIES
+        with pytest.raises(ValueError):
+            load_entries("old")
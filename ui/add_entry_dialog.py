@@ -1,12 +1,21 @@
+from PySide6.QtCore import Signal
 from PySide6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
     QPushButton, QComboBox, QMessageBox, QWidget, QStackedWidget
 )
 
+from core.db_drivers import DRIVERS, PORT, SQLITE_PATH, driver_names, get_driver
+from core.entries import make_entry
+from core.validation import errors
+
 
 class AddEntryDialog(QDialog):
+    # 连接测试在工作线程中完成，结果经信号回到 GUI 线程
+    test_finished = Signal(str)
+
     def __init__(self, parent=None, entry=None):
         super().__init__(parent)
+        self.test_finished.connect(self._on_test_finished)
         self.setWindowTitle("添加条目" if entry is None else "编辑条目")
         self.entry = entry or {}
         self.resize(400, 300)
@@ -97,42 +106,54 @@ class AddEntryDialog(QDialog):
         widget = QWidget()
         layout = QVBoxLayout(widget)
 
-        # 数据库类型
+        # 数据库类型：来自驱动注册表
         layout.addWidget(QLabel("数据库类型:"))
         self.db_type_combo = QComboBox()
-        self.db_type_combo.addItems(["MySQL", "PostgreSQL"])
+        self.db_type_combo.addItems(driver_names())
         self.db_type_combo.currentTextChanged.connect(self._on_db_type_changed)
         layout.addWidget(self.db_type_combo)
 
-        # MySQL/PG 字段
-        self.db_host_label = QLabel("主机:")
-        self.db_host_edit = QLineEdit()
-        self.db_port_label = QLabel("端口:")
-        self.db_port_edit = QLineEdit()
-        self.db_user_label = QLabel("用户名:")
-        self.db_user_edit = QLineEdit()
-        self.db_pwd_label = QLabel("密码:")
-        self.db_pwd_edit = QLineEdit()
-        self.db_pwd_edit.setEchoMode(QLineEdit.Password)
-        self.db_name_label = QLabel("数据库名:")
-        self.db_name_edit = QLineEdit()
+        # 所有驱动用到的字段各建一行，切换类型时只显示该驱动声明的字段
+        self.db_field_rows = {}
+        self.db_field_edits = {}
+        for driver in DRIVERS.values():
+            for field in driver.fields:
+                if field.key in self.db_field_rows:
+                    continue
+                row = QWidget()
+                row_layout = QVBoxLayout(row)
+                row_layout.setContentsMargins(0, 0, 0, 0)
+                row_layout.addWidget(QLabel(field.label))
+                edit = QLineEdit()
+                if field.kind == "password":
+                    edit.setEchoMode(QLineEdit.Password)
+                if field.kind == "path":
+                    path_layout = QHBoxLayout()
+                    path_layout.addWidget(edit)
+                    browse_btn = QPushButton("浏览…")
+                    browse_btn.clicked.connect(self._browse_sqlite_file)
+                    new_btn = QPushButton("新建…")
+                    new_btn.clicked.connect(self._create_new_sqlite_db)
+                    path_layout.addWidget(browse_btn)
+                    path_layout.addWidget(new_btn)
+                    row_layout.addLayout(path_layout)
+                else:
+                    row_layout.addWidget(edit)
+                self.db_field_rows[field.key] = row
+                self.db_field_edits[field.key] = edit
+                layout.addWidget(row)
+        self.sqlite_path_edit = self.db_field_edits[SQLITE_PATH.key]
 
         # 测试按钮
         self.test_db_btn = QPushButton("测试连接")
         self.test_db_btn.clicked.connect(self.test_connection)
-
-        # 添加到布局（后面通过 _on_db_type_changed 控制显示）
-        for w in [
-            self.db_host_label, self.db_host_edit,
-            self.db_port_label, self.db_port_edit,
-            self.db_user_label, self.db_user_edit,
-            self.db_pwd_label, self.db_pwd_edit,
-            self.db_name_label, self.db_name_edit,
-            self.test_db_btn
-        ]:
-            layout.addWidget(w)
+        self.test_result_label = QLabel()
+        self.test_result_label.setWordWrap(True)
+        layout.addWidget(self.test_db_btn)
+        layout.addWidget(self.test_result_label)
 
         layout.addStretch()
+        self._on_db_type_changed(self.db_type_combo.currentText())
         return widget
 
     def _update_stacked_index(self, typ: str):
@@ -145,24 +166,13 @@ class AddEntryDialog(QDialog):
         # 或保留用户已输入内容（更友好）
 
     def _on_db_type_changed(self, db_type: str):
-        is_sqlite = (db_type == "SQLite")
-        # 隐藏/显示字段
-        self.db_host_label.setVisible(True)
-        self.db_host_edit.setVisible(True)
-        self.db_port_label.setVisible(True)
-        self.db_port_edit.setVisible(True)
-        self.db_user_label.setVisible(True)
-        self.db_user_edit.setVisible(True)
-        self.db_pwd_label.setVisible(True)
-        self.db_pwd_edit.setVisible(True)
-        self.db_name_label.setVisible(True)
-        self.db_name_edit.setVisible(True)
-
+        driver = get_driver(db_type)
+        keys = driver.field_keys if driver else ()
+        for key, row in self.db_field_rows.items():
+            row.setVisible(key in keys)
         # 设置默认端口
-        if db_type == "MySQL":
-            self.db_port_edit.setText("3306")
-        elif db_type == "PostgreSQL":
-            self.db_port_edit.setText("5432")
+        if driver and driver.default_port is not None:
+            self.db_field_edits[PORT.key].setText(str(driver.default_port))
 
     def _browse_sqlite_file(self):
         from PySide6.QtWidgets import QFileDialog
@@ -201,22 +211,17 @@ class AddEntryDialog(QDialog):
             self.web_pwd_edit.setText(self.entry.get("password", ""))
         elif typ == "Server":
             self.ip_edit.setText(self.entry.get("ip", ""))
-            self.port_edit.setText(self.entry.get("port", "22"))
+            self.port_edit.setText(str(self.entry.get("port", "22")))  # 导入的条目端口可能是整数
             self.srv_user_edit.setText(self.entry.get("username", ""))
             self.srv_pwd_edit.setText(self.entry.get("password", ""))
         elif typ == "Database":
             db_type = self.entry.get("db_type", "MySQL")
             self.db_type_combo.setCurrentText(db_type)
             self._on_db_type_changed(db_type)  # 触发显示/隐藏
-
-            if db_type == "SQLite":
-                self.sqlite_path_edit.setText(self.entry.get("sqlite_path", ""))
-            else:
-                self.db_host_edit.setText(self.entry.get("host", ""))
-                self.db_port_edit.setText(self.entry.get("port", "3306"))
-                self.db_user_edit.setText(self.entry.get("username", ""))
-                self.db_pwd_edit.setText(self.entry.get("password", ""))
-            self.db_name_edit.setText(self.entry.get("database_name", ""))
+            driver = get_driver(db_type)
+            for key in (driver.field_keys if driver else ()):
+                if key in self.entry:
+                    self.db_field_edits[key].setText(str(self.entry[key]))
 
     def accept(self):
         name = self.name_edit.text().strip()
@@ -237,54 +242,37 @@ class AddEntryDialog(QDialog):
             entry["username"] = self.srv_user_edit.text().strip()
             entry["password"] = self.srv_pwd_edit.text().strip()
         elif typ == "Database":
-            db_type = self.db_type_combo.currentText()
-            entry["db_type"] = db_type
-            if db_type == "SQLite":
-                entry["sqlite_path"] = self.sqlite_path_edit.text().strip()
-            else:
-                entry["host"] = self.db_host_edit.text().strip()
-                entry["port"] = self.db_port_edit.text().strip()
-                entry["username"] = self.db_user_edit.text().strip()
-                entry["password"] = self.db_pwd_edit.text().strip()
-            entry["database_name"] = self.db_name_edit.text().strip()
-
-        self.entry = entry
+            entry.update(self._database_fields())
+
+        # 与导入共用同一套校验规则（如端口范围）
+        problems = errors(entry)
+        if problems:
+            QMessageBox.warning(self, "警告", "\n".join(problems))
+            return
+
+        self.entry = make_entry(entry)
         super().accept()
 
+    def _database_fields(self):
+        """当前数据库类型声明的字段"""
+        db_type = self.db_type_combo.currentText()
+        fields = {"db_type": db_type}
+        for key in get_driver(db_type).field_keys:
+            fields[key] = self.db_field_edits[key].text().strip()
+        return fields
+
     def _load_entry(self):
         # 类型切换时更新默认端口（简化：启动时不自动切换）
         pass
 
     def test_connection(self, core=None):
-        from core.db_tester import test_database_connection
-        entry = {
-            "db_type": self.db_type_combo.currentText(),
-            "host": self.db_host_edit.text(),
-            "port": self.db_port_edit.text(),
-            "username": self.db_user_edit.text(),
-            "password": self.db_pwd_edit.text(),
-            "database_name": self.db_name_edit.text(),
-        }
-        result = test_database_connection(entry)
+        from core.db_tester import shared_tester
+        entry = self._database_fields()
+        # 在后台测试，连接超时期间对话框仍可操作
+        self.test_db_btn.setEnabled(False)
+        self.test_result_label.setText("正在测试…")
+        shared_tester().submit(entry, lambda _, result: self.test_finished.emit(result))
+
+    def _on_test_finished(self, result):
+        self.test_db_btn.setEnabled(True)
         self.test_result_label.setText(result)
-
-    def _on_db_type_changed(self, db_type: str):
-        # 隐藏/显示网络字段
-        self.db_host_label.setVisible(True)
-        self.db_host_edit.setVisible(True)
-        self.db_port_label.setVisible(True)
-        self.db_port_edit.setVisible(True)
-
-        # 隐藏用户名/密码/数据库名（SQLite 不需要）
-        self.db_user_label.setVisible(True)
-        self.db_user_edit.setVisible(True)
-        self.db_pwd_label.setVisible(True)
-        self.db_pwd_edit.setVisible(True)
-        self.db_name_label.setVisible(True)
-        self.db_name_edit.setVisible(True)
-
-        # 设置默认端口
-        if db_type == "MySQL":
-            self.db_port_edit.setText("3306")
-        elif db_type == "PostgreSQL":
-            self.db_port_edit.setText("5432")
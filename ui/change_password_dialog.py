@@ -1,17 +1,19 @@
 from PySide6.QtWidgets import (
     QVBoxLayout,
-    QPushButton, QMessageBox, QDialog, QLabel, QLineEdit
+    QPushButton, QMessageBox, QDialog, QLabel, QLineEdit, QComboBox
 )
 
+from core.crypto import ALGORITHM_LABELS, PBKDF2, available_algorithms
+
 
 class ChangePasswordDialog(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, algorithm=PBKDF2):
         super().__init__(parent)
         self.setWindowTitle("修改主密码")
         self.setModal(True)
         layout = QVBoxLayout(self)
 
-        layout.addWidget(QLabel("当前主密码："))
+        layout.addWidget(QLabel("当前主密码（或恢复密钥）："))
         self.old_pwd = QLineEdit()
         self.old_pwd.setEchoMode(QLineEdit.Password)
         layout.addWidget(self.old_pwd)
@@ -26,6 +28,14 @@ class ChangePasswordDialog(QDialog):
         self.new_pwd2.setEchoMode(QLineEdit.Password)
         layout.addWidget(self.new_pwd2)
 
+        # 密钥派生算法：保存时按本机速度校准参数
+        layout.addWidget(QLabel("密钥派生算法："))
+        self.kdf_combo = QComboBox()
+        for name in available_algorithms():
+            self.kdf_combo.addItem(ALGORITHM_LABELS[name], name)
+        self.kdf_combo.setCurrentIndex(max(0, self.kdf_combo.findData(algorithm)))
+        layout.addWidget(self.kdf_combo)
+
         self.btn_ok = QPushButton("确定")
         self.btn_cancel = QPushButton("取消")
         self.btn_ok.clicked.connect(self.accept)
@@ -61,3 +71,6 @@ class ChangePasswordDialog(QDialog):
 
     def new_password(self):
         return self.new_pwd1.text()
+
+    def algorithm(self):
+        return self.kdf_combo.currentData()
@@ -0,0 +1,30 @@
+"""把其他线程中的调用排队到 GUI 线程执行，供 core.tasks 的执行器回调界面"""
+from PySide6.QtCore import QObject, Qt, Signal
+from PySide6.QtWidgets import QApplication
+
+
+class GuiDispatcher(QObject):
+    """post(fn) 可以在任意线程调用，fn 总是在创建本对象的线程（GUI 线程）的事件循环中执行"""
+
+    _posted = Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._posted.connect(self._run, Qt.QueuedConnection)
+
+    def post(self, fn):
+        self._posted.emit(fn)
+
+    @staticmethod
+    def _run(fn):
+        fn()
+
+
+def install_dispatcher(executor) -> GuiDispatcher:
+    """在 GUI 线程中调用一次：创建随 QApplication 存在的分发器并注册到执行器"""
+    app = QApplication.instance()
+    dispatcher = app.findChild(GuiDispatcher)
+    if dispatcher is None:
+        dispatcher = GuiDispatcher(app)
+    executor.set_dispatcher(dispatcher.post)
+    return dispatcher
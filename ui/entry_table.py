@@ -0,0 +1,370 @@
+"""条目表格的 model/view 实现：只有可见行参与绘制，操作按钮由委托绘制而不是逐行创建控件"""
+import bisect
+import time
+from itertools import compress
+
+from PySide6.QtCore import QAbstractTableModel, QEvent, QModelIndex, QRect, Qt, Signal
+from PySide6.QtGui import QBrush, QPalette
+from PySide6.QtWidgets import QApplication, QStyle, QStyleOptionButton, QStyleOptionViewItem, QStyledItemDelegate
+
+from core.entries import Entry, make_entry
+from core.entry_list import EntryList
+
+COLUMNS = ["名称", "类型", "位置/路径", "用户名", "密码", "操作", "测试", "状态"]
+COL_PASSWORD = 4
+COL_ACTIONS = 5
+COL_TEST = 6
+COL_STATUS = 7
+
+ACTION_COPY = "copy"
+ACTION_EDIT = "edit"
+ACTION_DELETE = "delete"
+ACTION_TEST = "test"
+
+ENTRY_ROLE = Qt.UserRole + 1
+
+TEST_RUNNING = "测试中…"
+
+
+def _typed(entry):
+    # 仍是 dict 的条目（兼容层）临时转换；类型未知时返回 None
+    entry = make_entry(entry)
+    return entry if isinstance(entry, Entry) else None
+
+
+def entry_location(entry) -> str:
+    # 显示什么作为“位置”由条目类型决定
+    typed = entry if isinstance(entry, Entry) else _typed(entry)
+    return typed.location() if typed is not None else ""
+
+
+def has_password(entry) -> bool:
+    typed = entry if isinstance(entry, Entry) else _typed(entry)
+    return typed is None or typed.has_password()
+
+
+class EntryTableModel(QAbstractTableModel):
+    """条目列表的表格模型，只在视图请求时读取可见行的列表字段
+
+    排序和过滤都只在模型内维护一个行号排列（显示行 -> 条目下标），不改变条目列表本身（保存顺序不受影响），
+    也不需要代理模型逐行回调 Python。过滤条件是 search_index.matches（条目 id() 的集合）。
+    条目列表是 EntryList 时订阅其变化事件，增删改只更新受影响的行，滚动位置和选中项保持不变。
+    """
+
+    def __init__(self, entries=None, parent=None, search_index=None, health=None):
+        super().__init__(parent)
+        self.search_index = search_index
+        self.health = health  # HealthCache，状态列显示其中的结果
+        self._entries = []
+        self._rows = 0
+        self._order = None  # 显示行 -> 条目下标；None 表示未排序、未过滤的原始顺序
+        self._sorted = None  # 未过滤时的排序结果缓存，条目变化时作废
+        self._sort_column = -1
+        self._sort_order = Qt.AscendingOrder
+        self._removing = None
+        self._testing = {}  # 正在测试的条目：id(条目) -> 条目
+        self.set_entries(entries if entries is not None else [])
+
+    def set_entries(self, entries):
+        self.beginResetModel()
+        if isinstance(self._entries, EntryList):
+            self._entries.unsubscribe(self)
+        self._entries = entries
+        if isinstance(entries, EntryList):
+            entries.subscribe(self)
+        self._sorted = None
+        self._reorder()
+        self.endResetModel()
+
+    def refilter(self):
+        """搜索条件变化后重新过滤"""
+        self.beginResetModel()
+        self._reorder()
+        self.endResetModel()
+
+    def set_testing(self, entry, testing: bool):
+        """标记条目是否正在测试连接；结束时健康状态也已更新，一起刷新"""
+        if testing:
+            self._testing[id(entry)] = entry
+        else:
+            self._testing.pop(id(entry), None)
+        self.health_changed()
+
+    def is_testing(self, entry) -> bool:
+        return self._testing.get(id(entry)) is entry
+
+    def health_changed(self):
+        # 不查找条目所在的行：视图只重绘这两列中可见的单元格
+        if self._rows:
+            self.dataChanged.emit(self.index(0, COL_TEST), self.index(self._rows - 1, COL_STATUS))
+
+    def entry(self, row: int):
+        return self._entries[self._order[row] if self._order is not None else row]
+
+    def _matches(self):
+        return self.search_index.matches if self.search_index is not None else None
+
+    def _accepts(self, index: int) -> bool:
+        matches = self._matches()
+        return matches is None or id(self._entries[index]) in matches
+
+    def _sort_key(self, entry):
+        return self._display(entry, self._sort_column).casefold()
+
+    def _sorted_order(self):
+        column = self._sort_column
+        if column < 0 or column >= COL_PASSWORD:
+            return None
+        if self._sorted is None:
+            keys = [self._sort_key(entry) for entry in self._entries]
+            self._sorted = sorted(range(len(keys)), key=keys.__getitem__, reverse=self._sort_order == Qt.DescendingOrder)
+        return self._sorted
+
+    def _reorder(self):
+        order, matches, entries = self._sorted_order(), self._matches(), self._entries
+        if matches is not None:
+            # 逐步都在 C 层完成，5 万条目时也只需几毫秒
+            if order is None:
+                order = list(compress(range(len(entries)), map(matches.__contains__, map(id, entries))))
+            else:
+                order = list(compress(order, map(matches.__contains__, map(id, map(entries.__getitem__, order)))))
+        elif order is not None:
+            order = list(order)  # 之后会被增量修改，不能与缓存共用
+        self._order = order
+        self._rows = len(order) if order is not None else len(entries)
+
+    def _sorted_position(self, key) -> int:
+        # 相同键的条目之后，与 sorted() 的稳定顺序一致
+        descending = self._sort_order == Qt.DescendingOrder
+        lo, hi = 0, len(self._order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            other = self._sort_key(self._entries[self._order[mid]])
+            if (other >= key) if descending else (other <= key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _insert_position(self, index: int) -> int:
+        if self._sort_column < 0 or self._sort_column >= COL_PASSWORD:
+            return bisect.bisect_left(self._order, index)  # 未排序时保持条目原有顺序
+        return self._sorted_position(self._sort_key(self._entries[index]))
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """一次性计算排序键后用 Python 排序，避免逐次比较时反复回调 data()"""
+        self.layoutAboutToBeChanged.emit()
+        before = [self.entry(index.row()) for index in self.persistentIndexList()]
+        self._sort_column, self._sort_order = column, order
+        self._sorted = None
+        self._reorder()
+        # 保持选中项等持久索引指向原来的条目
+        rows = {id(self.entry(row)): row for row in range(self._rows)}
+        old = self.persistentIndexList()
+        new = [self.index(rows[id(entry)], index.column()) for entry, index in zip(before, old)]
+        self.changePersistentIndexList(old, new)
+        self.layoutChanged.emit()
+
+    # ---------- EntryList 变化事件 ----------
+
+    def entries_inserted(self, start: int, count: int):
+        self._sorted = None
+        if self._order is None:
+            self.beginInsertRows(QModelIndex(), start, start + count - 1)
+            self._rows += count
+            self.endInsertRows()
+            return
+        if start + count < len(self._entries):
+            self._order = [i + count if i >= start else i for i in self._order]
+        for i in range(start, start + count):
+            if not self._accepts(i):
+                continue
+            row = self._insert_position(i)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._order.insert(row, i)
+            self._rows += 1
+            self.endInsertRows()
+
+    def entries_removing(self, start: int, count: int):
+        # 删除前调用：此时条目仍在列表中，行号与模型状态一致
+        self._sorted = None
+        if self._order is None:
+            for entry in self._entries[start:start + count]:
+                self._testing.pop(id(entry), None)
+            self.beginRemoveRows(QModelIndex(), start, start + count - 1)
+            self._removing = count
+            return
+        for entry in self._entries[start:start + count]:
+            self._testing.pop(id(entry), None)
+        rows = [row for row, i in enumerate(self._order) if start <= i < start + count]
+        for row in reversed(rows):
+            self._remove_row(row)
+
+    def entries_removed(self, start: int, count: int):
+        if self._order is None:
+            self._rows -= self._removing
+            self._removing = None
+            self.endRemoveRows()
+            return
+        self._order = [i - count if i >= start + count else i for i in self._order]
+
+    def _remove_row(self, row: int):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._order[row]
+        self._rows -= 1
+        self.endRemoveRows()
+
+    def entry_replaced(self, index: int):
+        self._sorted = None
+        if self._order is None:
+            self.dataChanged.emit(self.index(index, 0), self.index(index, len(COLUMNS) - 1))
+            return
+        row = self._order.index(index) if index in self._order else None
+        if not self._accepts(index):
+            # 修改后不再匹配搜索条件
+            if row is not None:
+                self._remove_row(row)
+            return
+        if row is None:
+            row = self._insert_position(index)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._order.insert(row, index)
+            self._rows += 1
+            self.endInsertRows()
+            return
+        # 排序键可能改变：把该行移动到新的位置
+        del self._order[row]
+        target = self._insert_position(index)
+        self._order.insert(row, index)
+        if target != row:
+            self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), target + 1 if target > row else target)
+            del self._order[row]
+            self._order.insert(target, index)
+            self.endMoveRows()
+        self.dataChanged.emit(self.index(target, 0), self.index(target, len(COLUMNS) - 1))
+
+    def entries_reset(self):
+        self.set_entries(self._entries)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.entry(index.row())
+        if role == ENTRY_ROLE:
+            return entry
+        if index.column() == COL_TEST:
+            return TEST_RUNNING if role == Qt.DisplayRole and self.is_testing(entry) else None
+        if index.column() == COL_STATUS:
+            return self._health_data(entry, role)
+        if role != Qt.DisplayRole:
+            return None
+        return self._display(entry, index.column())
+
+    def _health_data(self, entry, role):
+        status = self.health.get(entry) if self.health is not None and entry.get("type") == "Database" else None
+        if status is None:
+            return None
+        if role == Qt.DisplayRole:
+            return f"✅ {status.latency * 1000:.0f} ms" if status.ok else "❌ 失败"
+        if role == Qt.ToolTipRole:
+            checked = time.strftime("%H:%M:%S", time.localtime(status.checked_at))
+            return f"{status.message}\n检查于 {checked}"
+        if role == Qt.ForegroundRole and time.time() - status.checked_at >= self.health.ttl:
+            return QBrush(Qt.gray)  # 已过期，等待后台重新探测
+        return None
+
+    @staticmethod
+    def _display(entry, column: int):
+        if column == 0:
+            return entry.get("name", "")
+        if column == 1:
+            return entry.get("type", "")
+        if column == 2:
+            return entry_location(entry)
+        if column == 3:
+            return entry.get("username", "")
+        if column == COL_PASSWORD:
+            # 密码列只显示掩码：列表只依赖已解密的列表字段，密码在复制、编辑、测试时才解密
+            return "••••••" if has_password(entry) else ""
+        return None
+
+
+class ActionDelegate(QStyledItemDelegate):
+    """在单元格内绘制一组按钮，点击时发出 clicked(动作, 索引)"""
+
+    clicked = Signal(str, QModelIndex)
+
+    SPACING = 5
+    MARGIN = 2
+
+    def __init__(self, buttons, visible=None, parent=None):
+        """buttons: [(动作, 文字, 宽度)]；visible(index) 返回 False 时该单元格不绘制按钮"""
+        super().__init__(parent)
+        self.buttons = buttons
+        self.visible = visible
+        self._pressed = None
+
+    def _rects(self, rect: QRect):
+        x = rect.left() + self.MARGIN
+        height = rect.height() - 2 * self.MARGIN
+        for action, text, width in self.buttons:
+            yield action, text, QRect(x, rect.top() + self.MARGIN, width, height)
+            x += width + self.SPACING
+
+    def _shown(self, index) -> bool:
+        return self.visible is None or self.visible(index)
+
+    def paint(self, painter, option, index):
+        # 只绘制背景和选中状态；单元格的显示文字（例如测试结果）用作按钮文字
+        style = option.widget.style() if option.widget else QApplication.style()
+        item = QStyleOptionViewItem(option)
+        self.initStyleOption(item, index)
+        label, item.text = item.text, ""
+        style.drawControl(QStyle.CE_ItemViewItem, item, painter, option.widget)
+        if not self._shown(index):
+            return
+        for action, text, rect in self._rects(option.rect):
+            button = QStyleOptionButton()
+            button.rect = rect
+            button.text = label or text
+            button.state = QStyle.State_Enabled
+            if self._pressed == (action, index.row()):
+                button.state |= QStyle.State_Sunken
+            else:
+                button.state |= QStyle.State_Raised
+            if action == ACTION_DELETE:
+                palette = QPalette(option.palette)
+                palette.setColor(QPalette.ButtonText, Qt.red)
+                button.palette = palette
+            style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+    def sizeHint(self, option, index):
+        size = super().sizeHint(option, index)
+        width = sum(w for _, _, w in self.buttons) + self.SPACING * (len(self.buttons) - 1)
+        size.setWidth(width + 2 * self.MARGIN)
+        return size
+
+    def editorEvent(self, event, model, option, index):
+        if not self._shown(index) or event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease):
+            return False
+        pos = event.position().toPoint()
+        hit = next((action for action, _, rect in self._rects(option.rect) if rect.contains(pos)), None)
+        if event.type() == QEvent.MouseButtonPress:
+            self._pressed = (hit, index.row()) if hit else None
+            return hit is not None
+        pressed, self._pressed = self._pressed, None
+        if hit is not None and pressed == (hit, index.row()):
+            self.clicked.emit(hit, index)
+            return True
+        return False
@@ -1,30 +1,72 @@
-import json
 import os
-import threading
-import time
 from datetime import datetime
-from functools import partial
 
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer, Signal
 from PySide6.QtGui import QIcon, QKeySequence, QShortcut
 from PySide6.QtWidgets import (
-    QMainWindow, QTableWidget, QTableWidgetItem, QVBoxLayout,
-    QWidget, QPushButton, QSystemTrayIcon, QMenu, QApplication,
-    QMessageBox, QHBoxLayout, QDialog, QHeaderView, QFileDialog
+    QMainWindow, QTableView, QAbstractItemView, QVBoxLayout,
+    QWidget, QPushButton, QLineEdit, QSystemTrayIcon, QMenu, QApplication,
+    QMessageBox, QDialog, QHeaderView, QFileDialog, QProgressDialog, QInputDialog
 )
 
-from core.storage import save_entries, DATA_FILE, load_entries
-from ui.add_entry_dialog import AddEntryDialog
-from ui.change_password_dialog import ChangePasswordDialog
+from core.backup import BACKUP_SUFFIX, is_backup, read_backup, verify_backup, write_backup
+from core.codec import BACKUP_COMPRESSION, CODECS, ZLIB, Compression, backup_codecs
+from core.crypto import calibrate
+from core.entry_list import EntryList
+from core.exchange import export_json, export_ndjson, import_entries, import_ndjson, is_ndjson, read_json
+from core.merge import POLICY_LABELS, merge
+from core.health import shared_cache
+from core.search import SearchIndex
+from core.saver import SaveScheduler, STATUS_FAILED, STATUS_SAVED, STATUS_SAVING
+from core.startup import profiler
+from core.storage import save_entries, DATA_FILE, add_recovery_key, change_password, read_vault
+from core.tasks import shared_executor
+from ui.dispatcher import install_dispatcher
+from ui.entry_table import (
+    EntryTableModel, ActionDelegate, COL_ACTIONS, COL_TEST, COL_STATUS,
+    ACTION_COPY, ACTION_EDIT, ACTION_DELETE, ACTION_TEST,
+)
+
+# 后台健康检查：定期重新探测状态已过期的数据库条目，同时进行的探测很少，不与手动测试争抢
+HEALTH_CHECK_INTERVAL = 60 * 1000  # 毫秒
+HEALTH_FIRST_CHECK_DELAY = 10 * 1000
+HEALTH_CONCURRENCY = 4
+
+# 复制的密码在剪贴板中保留的秒数；再次复制时重新计时
+CLIPBOARD_CLEAR_DELAY = 10
+CLIPBOARD_TASK = "clear-clipboard"
 
 
 class MainWindow(QMainWindow):
-    def __init__(self, entries, save_callback, master_password):
+    # 保存状态由工作线程发出，经信号排队回到 GUI 线程处理
+    save_status_changed = Signal(str, object)
+    # 数据库连接测试同样在工作线程中完成
+    test_result_ready = Signal(object, str)
+    test_batch_done = Signal(object)
+    health_result_ready = Signal(object, str)
+    health_batch_done = Signal(object)
+
+    def __init__(self, entries, session):
         super().__init__()
         self.tray_menu = None
-        self.entries = entries
-        self.save_callback = save_callback
-        self.master_password = master_password
+        self.entries = EntryList(entries)  # 增删改会通知表格模型，只更新受影响的行
+        self.session = session  # 已解锁的 VaultSession，保存时不再重复派生密钥
+        # 后台任务共用一个执行器，需要操作界面的回调经分发器排队回 GUI 线程
+        self.tasks = shared_executor()
+        install_dispatcher(self.tasks)
+        self.save_status_changed.connect(self.on_save_status)
+        self.test_result_ready.connect(self.on_test_result)
+        self.test_batch_done.connect(self.on_test_batch_done)
+        self.health_result_ready.connect(lambda entry, result: self.model.health_changed())
+        self.health_batch_done.connect(self.on_health_batch_done)
+        self.test_batch = None
+        self.test_progress = None
+        self.health_batch = None
+        self.saver = SaveScheduler(
+            lambda snapshot: save_entries(snapshot, self.session),
+            on_status=self.save_status_changed.emit,
+            executor=self.tasks,
+        )
         self.setWindowTitle("开发者信息保管箱")
         self.resize(900, 600)
 
@@ -32,9 +74,48 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(central)
         layout = QVBoxLayout(central)
 
-        self.table = QTableWidget()
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels(["名称", "类型", "位置/路径", "用户名", "密码", "操作", "测试"])
+        # 搜索框：三元组索引增量维护，每次输入只更新匹配集合再重新过滤
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("搜索名称、地址、用户名、数据库名，可用 type:Database host:10. 等过滤")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.textChanged.connect(self.on_search)
+        layout.addWidget(self.search_box)
+
+        # 索引必须先于表格模型订阅条目列表，模型判断增改的条目是否显示时读到的才是更新后的匹配集合
+        self.search_index = SearchIndex(self.entries)
+
+        # 表格：模型内部完成排序和过滤，只有可见行参与绘制
+        self.model = EntryTableModel(self.entries, self, search_index=self.search_index, health=shared_cache())
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)  # 默认保持条目原有顺序
+        self.table.setSortingEnabled(True)
+        # 固定行高，滚动时不需要逐行计算尺寸
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(28)
+
+        self.action_delegate = ActionDelegate(
+            [(ACTION_COPY, "复制密码", 70), (ACTION_EDIT, "编辑", 50), (ACTION_DELETE, "删除", 50)], parent=self
+        )
+        self.test_delegate = ActionDelegate(
+            [(ACTION_TEST, "测试 DB", 70)],
+            visible=lambda index: self._entry_at(index).get("type") == "Database",
+            parent=self
+        )
+        self.action_delegate.clicked.connect(self.on_row_action)
+        self.test_delegate.clicked.connect(self.on_row_action)
+        self.table.setItemDelegateForColumn(COL_ACTIONS, self.action_delegate)
+        self.table.setItemDelegateForColumn(COL_TEST, self.test_delegate)
+
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(2, QHeaderView.Stretch)
+        self.table.setColumnWidth(3, 120)
+        self.table.setColumnWidth(COL_ACTIONS, 190)  # 操作
+        self.table.setColumnWidth(COL_TEST, 90)
+        self.table.setColumnWidth(COL_STATUS, 90)
         layout.addWidget(self.table)
 
         self.setStyleSheet("""
@@ -50,29 +131,60 @@ class MainWindow(QMainWindow):
         layout.addWidget(btn_add)
 
         self.refresh_table()
+        profiler.mark("table")
 
         # 托盘图标
         self.setup_tray_icon()
+        profiler.mark("tray")
 
         # 快捷键：Ctrl+Alt+K 呼出
         self.shortcut = QShortcut(QKeySequence("Ctrl+Alt+S"), self)
         self.shortcut.setContext(Qt.ApplicationShortcut)
         self.shortcut.activated.connect(self.show_and_raise)
 
+        # 后台健康检查
+        self.health_timer = QTimer(self)
+        self.health_timer.timeout.connect(self.refresh_health)
+        self.health_timer.start(HEALTH_CHECK_INTERVAL)
+        QTimer.singleShot(HEALTH_FIRST_CHECK_DELAY, self.refresh_health)
+
+        # Ctrl+F 定位到搜索框
+        self.find_shortcut = QShortcut(QKeySequence.Find, self)
+        self.find_shortcut.activated.connect(self.focus_search)
+
         # 菜单
         security_menu = self.menuBar().addMenu("安全")
         change_pwd_action = security_menu.addAction("修改主密码")
         change_pwd_action.triggered.connect(self.change_master_password)
+        recovery_action = security_menu.addAction("生成恢复密钥…")
+        recovery_action.triggered.connect(self.create_recovery_key)
 
         # 数据导出
         file_menu = self.menuBar().addMenu("文件")
-        export_action = file_menu.addAction("导出为 JSON")
+        export_action = file_menu.addAction("导出 / 备份…")
         export_action.triggered.connect(self.export_to_json)
 
-        # 数据导入
-        import_action = file_menu.addAction("从 JSON 导入")
+        # 数据导入（JSON、NDJSON 或加密备份）
+        import_action = file_menu.addAction("导入 / 恢复备份…")
         import_action.triggered.connect(self.import_from_json)
 
+        verify_action = file_menu.addAction("校验加密备份…")
+        verify_action.triggered.connect(self.verify_backup_file)
+
+        # 与其他保管箱合并（按内容散列比较，字段级三方合并）
+        merge_action = file_menu.addAction("合并其他保管箱…")
+        merge_action.triggered.connect(self.merge_vault)
+
+        # 存储后端迁移
+        file_menu.addSeparator()
+        migrate_action = file_menu.addAction("迁移到 SQLite 存储")
+        migrate_action.triggered.connect(self.migrate_to_sqlite)
+
+        # 工具
+        tools_menu = self.menuBar().addMenu("工具")
+        test_all_action = tools_menu.addAction("测试所有数据库连接")
+        test_all_action.triggered.connect(self.test_all_databases)
+
     def setup_tray_icon(self):
         self.tray_icon = QSystemTrayIcon(self)
         icon = QIcon("./favicon.ico")  # 可替换为内置图标
@@ -102,6 +214,23 @@ class MainWindow(QMainWindow):
         self.activateWindow()
 
     def quit_app(self):
+        # 退出前写入尚未保存的修改
+        self.saver.flush()
+        if self.saver.last_error is not None:
+            reply = QMessageBox.question(
+                self,
+                "保存失败",
+                f"最近的修改没有保存成功：\n{self.saver.last_error}\n\n仍要退出吗？",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                return
+        self.health_timer.stop()
+        for batch in (self.test_batch, self.health_batch):
+            if batch is not None:
+                batch.cancel()
+        self.saver.close()
         self.tray_icon.hide()
         QApplication.quit()
 
@@ -111,86 +240,77 @@ class MainWindow(QMainWindow):
         event.ignore()
         self.tray_icon.showMessage("已最小化", "程序仍在后台运行", QSystemTrayIcon.Information, 2000)
 
+    def save(self):
+        """交给后台保存，连续的修改合并为一次写入"""
+        self.saver.schedule(self.entries)
+
+    def on_save_status(self, status, error):
+        if status == STATUS_SAVING:
+            self.statusBar().showMessage("正在保存…")
+        elif status == STATUS_SAVED:
+            self.statusBar().showMessage("已保存", 3000)
+        elif status == STATUS_FAILED:
+            self.statusBar().showMessage("保存失败")
+            QMessageBox.critical(self, "保存失败", f"保存数据时发生错误：\n{str(error)}")
+
+    def focus_search(self):
+        self.search_box.setFocus()
+        self.search_box.selectAll()
+
+    def on_search(self, text):
+        matches = self.search_index.set_query(text)
+        self.model.refilter()
+        if matches is None:
+            self.statusBar().clearMessage()
+        else:
+            self.statusBar().showMessage(f"找到 {len(matches)} 个条目")
+
     def refresh_table(self):
         self.setMinimumWidth(800)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setRowCount(len(self.entries))
-        for row, entry in enumerate(self.entries):
-            self.table.setItem(row, 0, QTableWidgetItem(entry.get("name", "")))
-            self.table.setItem(row, 1, QTableWidgetItem(entry.get("type", "")))
-            # 根据类型决定显示什么作为“位置”
-            if entry.get("type") == "Website":
-                location = entry.get("url", "")
-            elif entry.get("type") == "Server":
-                location = entry.get("ip", "")
-            elif entry.get("type") == "Database":
-                db_type = entry.get("db_type", "")
-                if db_type == "SQLite":
-                    location = entry.get("sqlite_path", "")
-                else:
-                    location = f"{entry.get('host', '')}:{entry.get('port', '')}"
-            else:
-                location = ""
-
-            self.table.setItem(row, 2, QTableWidgetItem(location))
-            self.table.setItem(row, 3, QTableWidgetItem(entry.get("username", "")))
-            self.table.setItem(row, 4, QTableWidgetItem(entry.get("password", "")))
-
-            # 操作（复制 / 编辑 / 删除）
-            action_widget = QWidget()
-            action_layout = QHBoxLayout(action_widget)
-            action_layout.setContentsMargins(2, 2, 2, 2)  # 减少内边距
-            action_layout.setSpacing(5)
-
-            # 复制密码按钮
-            copy_btn = QPushButton("复制密码")
-            copy_btn.clicked.connect(lambda *args, e=entry: self.copy_password(e))
-            # copy_btn.clicked.connect(partial(self.copy_password, entry))
-
-            # 编辑按钮
-            edit_btn = QPushButton("编辑")
-            edit_btn.setFixedWidth(50)
-            edit_btn.clicked.connect(lambda *args, e=entry: self.edit_entry(e))
-            # edit_btn.clicked.connect(partial(self.edit_entry, entry))
-
-            # 删除按钮
-            delete_btn = QPushButton("删除")
-            delete_btn.setFixedWidth(50)
-            delete_btn.setStyleSheet("QPushButton { color: red; }")
-            delete_btn.clicked.connect(lambda *args, e=entry: self.delete_entry(e))
-            # delete_btn.clicked.connect(partial(self.delete_entry, entry))
-
-            # 添加到布局
-            action_layout.addWidget(copy_btn)
-            action_layout.addWidget(edit_btn)
-            action_layout.addWidget(delete_btn)
-            action_layout.addStretch()
-
-            self.table.setCellWidget(row, 5, action_widget)
-
-            # 测试按钮（仅数据库）
-            if entry.get("type") == "Database":
-                btn_test = QPushButton("测试 DB")
-                btn_test.clicked.connect(partial(self.test_db_connection, entry))
-                self.table.setCellWidget(row, 6, btn_test)
+        self.model.set_entries(self.entries)
+
+    def _entry_at(self, index):
+        return self.model.entry(index.row())
+
+    def on_row_action(self, action, index):
+        entry = self._entry_at(index)
+        if action == ACTION_COPY:
+            self.copy_password(entry)
+        elif action == ACTION_EDIT:
+            self.edit_entry(entry)
+        elif action == ACTION_DELETE:
+            self.delete_entry(entry)
+        elif action == ACTION_TEST:
+            self.test_db_connection(entry)
+
+    def refresh_health(self):
+        """在后台重新探测状态已过期的数据库条目；手动批量测试进行时跳过"""
+        from core.db_tester import shared_tester
+        if self.health_batch is not None or self.test_batch is not None:
+            return
+        cache = shared_cache()
+        stale = [e for e in self.entries if e.get("type") == "Database" and cache.is_stale(e)]
+        if stale:
+            self.health_batch = shared_tester().test_all(
+                stale, on_result=self.health_result_ready.emit, on_done=self.health_batch_done.emit,
+                concurrency=HEALTH_CONCURRENCY,
+            )
 
-        header = self.table.horizontalHeader()
-        header.setSectionResizeMode(3, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(2, QHeaderView.Stretch)
-        self.table.setColumnWidth(5, 180)  # 操作
+    def on_health_batch_done(self, batch):
+        if batch is self.health_batch:
+            self.health_batch = None
 
     def edit_entry(self, entry):
+        from ui.add_entry_dialog import AddEntryDialog
         dialog = AddEntryDialog(entry=entry)
         if dialog.exec() == QDialog.Accepted:
             # 更新内存中的条目
             updated_entry = dialog.entry
 
-            # 找到原条目并替换（根据引用或索引）
-            # 简单做法：遍历查找（适合小数据量）
-            for i, e in enumerate(self.entries):
-                if e is entry:  # 因为是同一个对象引用
-                    self.entries[i] = updated_entry
-                    break
+            # 找到原条目并替换（根据引用），表格只更新这一行
+            i = self.entries.index_of(entry)
+            if i >= 0:
+                self.entries[i] = updated_entry
             else:
                 # 如果没找到（比如从文件重新加载过），则按 name + type 匹配（不完美但可用）
                 for i, e in enumerate(self.entries):
@@ -198,9 +318,8 @@ class MainWindow(QMainWindow):
                         self.entries[i] = updated_entry
                         break
 
-            # 保存并刷新
-            save_entries(self.entries, self.master_password)
-            self.refresh_table()
+            shared_cache().invalidate(updated_entry)  # 密码等可能已改变，原来的结果不再可信
+            self.save()
 
     def delete_entry(self, entry):
         from PySide6.QtWidgets import QMessageBox
@@ -214,12 +333,12 @@ class MainWindow(QMainWindow):
             QMessageBox.No
         )
         if reply == QMessageBox.Yes:
-            # 从列表中移除
-            self.entries = [e for e in self.entries if e is not entry]
+            # 从列表中移除，表格只删除这一行
+            i = self.entries.index_of(entry)
+            if i >= 0:
+                del self.entries[i]
             # 保存
-            save_entries(self.entries, self.master_password)
-            # 刷新表格
-            self.refresh_table()
+            self.save()
 
     def copy_password(self, entry):
         clipboard = QApplication.clipboard()
@@ -227,59 +346,152 @@ class MainWindow(QMainWindow):
         clipboard.setText(pwd)
 
         def clear_clipboard():
-            time.sleep(10)
+            # 在 GUI 线程中执行；剪贴板已换成其他内容时不清除
             if clipboard.text() == pwd:
                 clipboard.clear()
 
-        threading.Thread(target=clear_clipboard, daemon=True).start()
-        QMessageBox.information(self, "已复制", "密码已复制（10秒后清除）")
+        # 同一个 key：再次复制时取消上一次的清除，从头计时
+        self.tasks.call_later(CLIPBOARD_CLEAR_DELAY, clear_clipboard, key=CLIPBOARD_TASK, in_gui=True)
+        QMessageBox.information(self, "已复制", f"密码已复制（{CLIPBOARD_CLEAR_DELAY}秒后清除）")
 
     def test_db_connection(self, entry):
-        from core.db_tester import test_database_connection
-        result = test_database_connection(entry)
-        QMessageBox.information(self, "连接测试", result)
+        """在后台测试，结果显示在该行的测试按钮上（完整信息见提示）"""
+        from core.db_tester import shared_tester
+        if self.model.is_testing(entry):
+            return
+        self.model.set_testing(entry, True)
+        shared_tester().submit(entry, self.test_result_ready.emit)
+
+    def on_test_result(self, entry, result):
+        self.model.set_testing(entry, False)
+        if self.test_batch is not None and self.test_progress is not None:
+            self.test_progress.setValue(self.test_batch.done)
+        else:
+            self.statusBar().showMessage(f"{entry.get('name', '')}：{result}", 5000)
+
+    def test_all_databases(self):
+        """并发测试所有数据库条目，可随时取消"""
+        from core.db_tester import shared_tester
+        if self.test_batch is not None:
+            self.test_progress.show()
+            return
+        entries = [e for e in self.entries if e.get("type") == "Database"]
+        if not entries:
+            QMessageBox.information(self, "连接测试", "没有数据库条目。")
+            return
+        if self.health_batch is not None:
+            self.health_batch.cancel()  # 手动测试覆盖全部条目，后台检查不必继续
+        for entry in entries:
+            self.model.set_testing(entry, True)
+
+        self.test_progress = QProgressDialog("正在测试数据库连接…", "取消", 0, len(entries), self)
+        self.test_progress.setWindowTitle("连接测试")
+        self.test_progress.setMinimumDuration(0)
+        self.test_progress.setAutoClose(False)
+        self.test_progress.setAutoReset(False)
+        self.test_progress.canceled.connect(self.cancel_test_all)
+        self.test_progress.show()
+        self.test_batch = shared_tester().test_all(
+            entries, on_result=self.test_result_ready.emit, on_done=self.test_batch_done.emit
+        )
+
+    def cancel_test_all(self):
+        if self.test_batch is None:
+            return
+        for entry in self.test_batch.cancel():
+            self.model.set_testing(entry, False)  # 未开始的不再显示“测试中”
+        self.statusBar().showMessage("正在等待进行中的测试结束…")
+
+    def on_test_batch_done(self, batch):
+        if batch is not self.test_batch:
+            return
+        self.test_batch = None
+        progress, self.test_progress = self.test_progress, None
+        progress.canceled.disconnect(self.cancel_test_all)
+        progress.close()
+        state = "已取消" if batch.cancelled else "完成"
+        self.statusBar().showMessage(f"数据库连接测试{state}：已测试 {batch.done}/{batch.total} 个", 5000)
 
     def add_entry(self):
+        from ui.add_entry_dialog import AddEntryDialog
         dialog = AddEntryDialog(self)
         if dialog.exec():
             self.entries.append(dialog.entry)
-            self.save_callback()
-            self.refresh_table()
+            self.save()
 
     def export_to_json(self):
-        """导出当前所有条目为 JSON 文件"""
+        """导出当前所有条目：默认为加密备份，JSON / NDJSON 明文导出需要再次确认"""
         if not self.entries:
             QMessageBox.warning(self, "导出失败", "没有数据可导出！")
             return
 
-        # 生成默认文件名：secrets_YYYYMMDD.json
+        # 生成默认文件名：secrets_YYYYMMDD.dskbackup
         timestamp = datetime.now().strftime("%Y%m%d")
-        default_filename = f"secrets_{timestamp}.json"
+        default_filename = f"secrets_{timestamp}{BACKUP_SUFFIX}"
 
         # 弹出保存对话框
-        file_path, _ = QFileDialog.getSaveFileName(
+        file_path, selected_filter = QFileDialog.getSaveFileName(
             self,
-            "导出数据为 JSON",
+            "导出数据",
             default_filename,
-            "JSON 文件 (*.json);;所有文件 (*)"
+            f"加密备份 (*{BACKUP_SUFFIX});;JSON 文件，明文 (*.json);;NDJSON 文件，明文、每行一个条目 (*.ndjson);;所有文件 (*)"
         )
 
         if not file_path:
             return  # 用户取消了
 
+        plaintext = is_ndjson(file_path) or file_path.lower().endswith(".json") or "明文" in selected_filter
+        if plaintext:
+            reply = QMessageBox.question(
+                self,
+                "明文导出",
+                "JSON / NDJSON 文件中的密码是明文，任何拿到文件的人都能看到。\n确定要导出明文吗？",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                return
+        else:
+            password = self._ask_backup_password(confirm=True)
+            if password is None:
+                return
+            compression = self._ask_backup_compression()
+            if compression is None:
+                return
+            if not file_path.lower().endswith(BACKUP_SUFFIX):
+                file_path += BACKUP_SUFFIX
+
         try:
-            # 确保文件扩展名为 .json
-            if not file_path.lower().endswith(".json"):
-                file_path += ".json"
-
-            # 写入 JSON（支持中文、格式化）
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(
-                    self.entries,
-                    f,
-                    ensure_ascii=False,  # 允许中文
-                    indent=2  # 美化格式
-                )
+            if not plaintext:
+                # 加密备份：分段加密逐条写出，可取消
+                progress, update = self._stream_progress("导出加密备份", "正在加密并写出…")
+                try:
+                    completed = write_backup(self.entries, file_path, password,
+                                             calibrate(self.session.kdf.algorithm), update, compression=compression)
+                finally:
+                    progress.close()
+                if not completed:
+                    self.statusBar().showMessage("已取消导出", 3000)
+                    return
+            elif is_ndjson(file_path) or "ndjson" in selected_filter.lower():
+                # NDJSON：逐条写出，可取消
+                if not is_ndjson(file_path):
+                    file_path += ".ndjson"
+                progress, update = self._stream_progress("导出 NDJSON", "正在导出…")
+                try:
+                    completed = export_ndjson(self.entries, file_path, update)
+                finally:
+                    progress.close()
+                if not completed:
+                    self.statusBar().showMessage("已取消导出", 3000)
+                    return
+            else:
+                # 确保文件扩展名为 .json
+                if not file_path.lower().endswith(".json"):
+                    file_path += ".json"
+
+                # 写入 JSON（支持中文、格式化）
+                export_json(self.entries, file_path)
 
             QMessageBox.information(
                 self,
@@ -294,21 +506,56 @@ class MainWindow(QMainWindow):
                 f"导出时发生错误：\n{str(e)}"
             )
 
+    def _ask_backup_password(self, confirm=False):
+        """输入备份密码（可与主密码不同）；取消时返回 None"""
+        password, ok = QInputDialog.getText(self, "备份密码", "备份密码：", QLineEdit.Password)
+        if not ok:
+            return None
+        if confirm:
+            if len(password) < 4:
+                QMessageBox.warning(self, "弱密码", "备份密码至少需要4位！")
+                return None
+            again, ok = QInputDialog.getText(self, "备份密码", "再次输入备份密码：", QLineEdit.Password)
+            if not ok:
+                return None
+            if again != password:
+                QMessageBox.warning(self, "错误", "两次输入的密码不一致！")
+                return None
+        return password
+
+    def _ask_backup_compression(self):
+        """已安装 zstd / lz4 时选择备份的压缩算法，默认 zlib（任何安装都能恢复）；取消时返回 None"""
+        names = backup_codecs()
+        if len(names) == 1:
+            return BACKUP_COMPRESSION
+        labels = [f"{CODECS[name].label}（任何安装都能恢复）" if name == ZLIB
+                  else f"{CODECS[name].label}（恢复时需要安装 {CODECS[name].requirement}）" for name in names]
+        label, ok = QInputDialog.getItem(self, "备份压缩", "压缩算法：", labels, 0, False)
+        if not ok:
+            return None
+        return Compression(names[labels.index(label)])
+
     def import_from_json(self):
         """从 JSON 文件导入数据，并合并到当前 entries（按 name 去重）"""
         file_path, _ = QFileDialog.getOpenFileName(
             self,
-            "选择 JSON 文件导入",
+            "选择要导入的文件",
             "",
-            "JSON 文件 (*.json);;所有文件 (*)"
+            f"JSON 文件或加密备份 (*.json *.ndjson *.jsonl *{BACKUP_SUFFIX});;所有文件 (*)"
         )
 
         if not file_path:
             return  # 用户取消
 
+        if is_backup(file_path):
+            self.restore_backup(file_path)
+            return
+        if is_ndjson(file_path):
+            self.import_from_ndjson(file_path)
+            return
+
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                imported_data = json.load(f)
+            imported_data = read_json(file_path)
         except Exception as e:
             QMessageBox.critical(self, "导入失败", f"无法读取文件：\n{str(e)}")
             return
@@ -318,97 +565,254 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "格式错误", "JSON 文件必须是一个条目列表！")
             return
 
-        valid_entries = []
-        for idx, item in enumerate(imported_data):
-            if not isinstance(item, dict):
-                QMessageBox.warning(self, "跳过无效条目", f"第 {idx + 1} 项不是对象，已跳过。")
-                continue
-            if "name" not in item:
-                QMessageBox.warning(self, "跳过无效条目", f"第 {idx + 1} 项缺少 'name' 字段，已跳过。")
-                continue
-            valid_entries.append(item)
-
-        if not valid_entries:
-            QMessageBox.information(self, "无有效数据", "文件中没有可导入的有效条目。")
+        # 一次校验全部条目并按 name 去重，问题汇总到一份报告中
+        self._confirm_import(import_entries(imported_data, self.entries))
+
+    def import_from_ndjson(self, file_path):
+        """逐行读取 NDJSON 文件，边读边校验去重并显示进度，内存中只保留新条目"""
+        progress, update = self._stream_progress("导入 NDJSON", "正在读取并校验条目…")
+        try:
+            result = import_ndjson(file_path, self.entries, update)
+        except OSError as e:
+            QMessageBox.critical(self, "导入失败", f"无法读取文件：\n{str(e)}")
             return
+        finally:
+            progress.close()
 
-        # 按 name 去重：现有条目集合
-        existing_names = {entry["name"] for entry in self.entries}
+        if result.cancelled:
+            QMessageBox.information(self, "导入已取消", "已取消读取，没有导入任何条目。")
+            return
+        self._confirm_import(result)
 
-        # 筛选出新条目（name 不在现有集合中）
-        new_entries = [e for e in valid_entries if e["name"] not in existing_names]
-        duplicate_count = len(valid_entries) - len(new_entries)
+    def restore_backup(self, file_path):
+        """逐段解密加密备份并校验合并，和导入文件走同一流程"""
+        password = self._ask_backup_password()
+        if password is None:
+            return
+        progress, update = self._stream_progress("恢复加密备份", "正在解密并校验条目…")
+        try:
+            result = import_entries(read_backup(file_path, password, update), self.entries)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "恢复失败", f"无法读取备份：\n{str(e)}")
+            return
+        finally:
+            cancelled = progress.wasCanceled()
+            progress.close()
 
-        # 提示用户
-        msg = f"找到 {len(valid_entries)} 个有效条目。\n"
-        if duplicate_count > 0:
-            msg += f"其中 {duplicate_count} 个已存在（按名称去重），将跳过。\n"
-        msg += f"确定要导入 {len(new_entries)} 个新条目吗？"
+        if cancelled:
+            QMessageBox.information(self, "恢复已取消", "已取消读取，没有导入任何条目。")
+            return
+        self._confirm_import(result)
 
-        reply = QMessageBox.question(
-            self,
-            "确认导入",
-            msg,
-            QMessageBox.Yes | QMessageBox.No,
-            QMessageBox.No
+    def verify_backup_file(self):
+        """认证加密备份的每一段，列出损坏的段及其位置"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "选择加密备份", "", f"加密备份 (*{BACKUP_SUFFIX});;所有文件 (*)"
         )
+        if not file_path:
+            return
+        password = self._ask_backup_password()
+        if password is None:
+            return
+        progress, update = self._stream_progress("校验加密备份", "正在校验…")
+        try:
+            result = verify_backup(file_path, password, update)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "校验失败", f"无法读取备份：\n{str(e)}")
+            return
+        finally:
+            progress.close()
 
-        if reply != QMessageBox.Yes:
+        msg = f"备份时间：{result.created}\n共 {result.segments} 段，{result.entries} 个条目。"
+        if result.ok:
+            QMessageBox.information(self, "校验通过", msg + "\n所有段均通过认证。")
+            return
+        details = "\n".join(f"  {reason}" for _, _, reason in result.bad_segments[:10])
+        more = "\n  …" if len(result.bad_segments) > 10 else ""
+        QMessageBox.warning(self, "备份已损坏",
+                            f"{msg}\n{len(result.bad_segments)} 段认证失败：\n{details}{more}")
+
+    def _confirm_import(self, result):
+        """显示导入摘要；有校验问题时用报告对话框列出全部问题，确认后合并新条目和内容有变化的同名条目"""
+        report = result.report
+        if not result.valid and not report:
+            QMessageBox.information(self, "无有效数据", "文件中没有可导入的有效条目。")
             return
 
-        if not new_entries:
-            QMessageBox.information(self, "导入完成", "没有新条目需要导入。")
+        count = len(result.new_entries) + len(result.changed)
+        msg = f"找到 {result.valid} 个有效条目。\n"
+        if result.duplicates:
+            msg += f"其中 {result.duplicates} 个已存在（内容相同或名称重复），将跳过。\n"
+        if result.changed:
+            msg += f"{len(result.changed)} 个与现有条目同名但内容不同，将按字段合并。\n"
+
+        if report:
+            from ui.validation_report_dialog import ValidationReportDialog
+
+            msg += report.summary() + "。"
+            if count:
+                action = f"导入 {count} 个条目"
+            else:
+                msg += "\n没有新条目需要导入。"
+                action = "关闭"
+            dialog = ValidationReportDialog(report, msg, self, action)
+            if dialog.exec() != QDialog.Accepted or not count:
+                return
+        else:
+            if not count:
+                QMessageBox.information(self, "无新条目", msg + "没有新条目需要导入。")
+                return
+            msg += f"确定要导入 {count} 个条目吗？"
+            reply = QMessageBox.question(self, "确认导入", msg, QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+
+        merged = None
+        if result.changed:
+            policy = self._ask_merge_policy(len(result.changed))
+            if policy is None:
+                return
+            merged = merge(self.entries, result.changed, policy=policy)
+
+        # 合并新条目（表格只插入新增的行）和同名条目的修改（只更新受影响的行）
+        self.entries.extend(result.new_entries)
+        if merged is not None:
+            merged.apply(self.entries)
+        self.save()  # 保存到本地存储
+        msg = f"成功导入 {len(result.new_entries)} 个新条目！"
+        if merged is not None:
+            msg += f"\n同名条目：{merged.summary()}。"
+        QMessageBox.information(self, "导入成功", msg)
+
+    def _ask_merge_policy(self, count):
+        """同名条目字段冲突时的处理方式；取消时返回 None"""
+        box = QMessageBox(self)
+        box.setIcon(QMessageBox.Question)
+        box.setWindowTitle("同名条目")
+        box.setText(f"{count} 个导入的条目与现有条目同名但内容不同。\n字段不同时如何处理？")
+        buttons = {box.addButton(label, QMessageBox.AcceptRole): name for name, label in POLICY_LABELS.items()}
+        box.addButton("取消", QMessageBox.RejectRole)
+        box.exec()
+        return buttons.get(box.clickedButton())
+
+    def merge_vault(self):
+        """与另一个保管箱合并：按内容散列找出不同的条目，字段级三方合并后预览，确认后保存"""
+        from ui.merge_dialog import MergeDialog
+
+        dialog = MergeDialog(self)
+        if dialog.exec() != QDialog.Accepted:
+            return
+        try:
+            theirs = read_vault(dialog.vault_path(), dialog.password())
+            base = self._read_merge_base(dialog.base_path(), dialog.password()) if dialog.base_path() else None
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "合并失败", f"无法读取文件：\n{str(e)}")
             return
 
-        # 合并新条目
-        self.entries.extend(new_entries)
-        self.save_callback()  # 保存到本地存储
-        self.refresh_table()  # 刷新表格
+        result = merge(self.entries, theirs, base, dialog.policy())
+        if not result.changed and not result.conflicts:
+            QMessageBox.information(self, "无需合并", "两个保管箱的内容相同。")
+            return
 
-        QMessageBox.information(
+        msg = f"{result.summary()}。\n"
+        if result.conflicts:
+            lines = [f"  {c.name}：{c.field or '整个条目（一方删除）'}" for c in result.conflicts[:10]]
+            more = "\n  …" if len(result.conflicts) > 10 else ""
+            msg += f"冲突按「{POLICY_LABELS[dialog.policy()]}」处理：\n" + "\n".join(lines) + more + "\n"
+        if not result.changed:
+            QMessageBox.information(self, "无需合并", msg + "按所选策略不需要修改当前保管箱。")
+            return
+        reply = QMessageBox.question(self, "确认合并", msg + "确定要应用这些修改吗？",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        result.apply(self.entries)
+        self.save()
+        QMessageBox.information(self, "合并完成", f"已合并：{result.summary()}。")
+
+    @staticmethod
+    def _read_merge_base(path, password):
+        # 共同祖先可以是导出文件，也可以是与对方保管箱使用同一主密码的保管箱副本
+        if is_ndjson(path):
+            return import_ndjson(path, []).new_entries
+        if path.lower().endswith(".json"):
+            return read_json(path)
+        return read_vault(path, password)
+
+    def _stream_progress(self, title, label):
+        """流式导入导出的进度框，返回 (对话框, 进度回调)；回调在取消后返回 False"""
+        progress = QProgressDialog(label, "取消", 0, 1000, self)
+        progress.setWindowTitle(title)
+        progress.setMinimumDuration(0)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
+        progress.show()
+
+        def update(done, total):
+            progress.setValue(int(done * 1000 / total) if total else 1000)
+            QApplication.processEvents()  # 读写在 GUI 线程中分段进行，处理取消按钮等事件
+            return not progress.wasCanceled()
+        return progress, update
+
+    def migrate_to_sqlite(self):
+        """把当前数据文件一次性转换为 SQLite 存储，之后的保存按行事务更新"""
+        reply = QMessageBox.question(
             self,
-            "导入成功",
-            f"成功导入 {len(new_entries)} 个新条目！"
+            "迁移存储",
+            "确定要把数据文件转换为 SQLite 存储吗？",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
         )
+        if reply != QMessageBox.Yes:
+            return
+        try:
+            self.saver.flush()
+            save_entries(self.entries, self.session, backend="sqlite")
+            QMessageBox.information(self, "迁移完成", "数据已转换为 SQLite 存储。")
+        except Exception as e:
+            QMessageBox.critical(self, "迁移失败", f"迁移时发生错误：\n{str(e)}")
 
     def change_master_password(self):
-        dialog = ChangePasswordDialog(self)
+        from ui.change_password_dialog import ChangePasswordDialog
+        dialog = ChangePasswordDialog(self, algorithm=self.session.kdf.algorithm)
         if dialog.exec() != QDialog.Accepted:
             return
 
-        old_pwd = dialog.old_password()
-        new_pwd = dialog.new_password()
+        if not os.path.exists(DATA_FILE):
+            QMessageBox.warning(self, "错误", "数据文件不存在，无法修改密码。")
+            return
 
         try:
-            # === 1. 用旧密码加载当前数据（验证）===
-            if not os.path.exists(DATA_FILE):
-                QMessageBox.warning(self, "错误", "数据文件不存在，无法修改密码。")
-                return
-
-            with open(DATA_FILE, "rb") as f:
-                current_encrypted = f.read()
-
-            # 尝试解密（验证旧密码）
-            entries = load_entries(old_pwd)
-
-            # === 2. 用新密码保存 ===
-            save_entries(entries, new_pwd)
-
-            # === 3. 更新应用状态 ===
-            self.current_password = new_pwd  # 如果你缓存了密码（可选）
-            self.entries = entries  # 确保内存数据一致
-            # 注意：更安全的做法是不清缓存密码，但这里为了简单
-
+            self.saver.flush()  # 先写入后台尚未保存的修改
+            # 派生参数按本机速度重新校准；信封加密的文件只重新包装数据密钥，旧格式文件借此整体升级
+            self.session = change_password(self.session, list(self.entries), dialog.old_password(),
+                                           dialog.new_password(), calibrate(dialog.algorithm()))
             QMessageBox.information(self, "成功", "主密码已更新！")
-
-        except ValueError as e:
-            # 来自 load_entries 的“密码错误”
+        except ValueError:
             QMessageBox.critical(self, "错误", "当前主密码错误，请重试。")
         except Exception as e:
-            # 回滚：如果保存失败，用旧密码恢复（可选）
-            try:
-                with open(DATA_FILE, "wb") as f:
-                    f.write(current_encrypted)  # 恢复原文件
-            except:
-                pass
+            # 密钥槽和整体重写都是原子替换，失败时文件仍是原来的内容
             QMessageBox.critical(self, "错误", f"修改失败：{str(e)}")
+
+    def create_recovery_key(self):
+        reply = QMessageBox.question(
+            self, "生成恢复密钥",
+            "恢复密钥可以代替主密码解锁数据（忘记主密码时使用）。\n"
+            "重新生成后，之前的恢复密钥失效。\n\n是否继续？",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        try:
+            self.saver.flush()
+            key = add_recovery_key(self.session, list(self.entries))
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"生成恢复密钥失败：{str(e)}")
+            return
+
+        box = QMessageBox(self)
+        box.setWindowTitle("恢复密钥")
+        box.setIcon(QMessageBox.Information)
+        box.setText(f"请抄写并妥善保管（不要与电脑放在一起）：\n\n{key}\n\n"
+                    "忘记主密码时，在解锁窗口的密码框中输入恢复密钥即可。")
+        box.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        box.exec()
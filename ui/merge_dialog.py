@@ -0,0 +1,79 @@
+from PySide6.QtWidgets import (
+    QVBoxLayout, QHBoxLayout, QPushButton, QMessageBox, QDialog, QLabel, QLineEdit, QComboBox, QFileDialog
+)
+
+from core.merge import KEEP_MINE, POLICY_LABELS
+
+VAULT_FILTER = "保管箱文件 (*.dat);;所有文件 (*)"
+BASE_FILTER = "保管箱或导出文件 (*.dat *.json *.ndjson *.jsonl);;所有文件 (*)"
+
+
+class MergeDialog(QDialog):
+    """合并其他保管箱：选择对方的保管箱文件及其主密码、可选的共同祖先和冲突策略"""
+
+    def __init__(self, parent=None, policy=KEEP_MINE):
+        super().__init__(parent)
+        self.setWindowTitle("合并其他保管箱")
+        self.setModal(True)
+        self.resize(480, 0)
+        layout = QVBoxLayout(self)
+
+        layout.addWidget(QLabel("对方的保管箱文件："))
+        self.vault_edit = QLineEdit()
+        layout.addLayout(self._browse_row(self.vault_edit, "选择保管箱文件", VAULT_FILTER))
+
+        layout.addWidget(QLabel("对方保管箱的主密码："))
+        self.password_edit = QLineEdit()
+        self.password_edit.setEchoMode(QLineEdit.Password)
+        layout.addWidget(self.password_edit)
+
+        # 共同祖先：上次同步时的保管箱副本或导出文件；有了它才能区分谁修改了哪个字段、传播删除
+        layout.addWidget(QLabel("共同祖先（可选，上次同步时的副本或导出文件）："))
+        self.base_edit = QLineEdit()
+        self.base_edit.setPlaceholderText("留空时两边不同的字段都视为冲突，不传播删除")
+        layout.addLayout(self._browse_row(self.base_edit, "选择共同祖先", BASE_FILTER))
+
+        layout.addWidget(QLabel("冲突时："))
+        self.policy_combo = QComboBox()
+        for name, label in POLICY_LABELS.items():
+            self.policy_combo.addItem(label, name)
+        self.policy_combo.setCurrentIndex(max(0, self.policy_combo.findData(policy)))
+        layout.addWidget(self.policy_combo)
+
+        self.btn_ok = QPushButton("预览合并")
+        self.btn_cancel = QPushButton("取消")
+        self.btn_ok.clicked.connect(self.accept)
+        self.btn_cancel.clicked.connect(self.reject)
+        layout.addWidget(self.btn_ok)
+        layout.addWidget(self.btn_cancel)
+
+    def _browse_row(self, edit, title, filter_):
+        row = QHBoxLayout()
+        button = QPushButton("浏览…")
+
+        def browse():
+            path, _ = QFileDialog.getOpenFileName(self, title, edit.text(), filter_)
+            if path:
+                edit.setText(path)
+        button.clicked.connect(browse)
+        row.addWidget(edit, 1)
+        row.addWidget(button)
+        return row
+
+    def accept(self):
+        if not self.vault_edit.text().strip():
+            QMessageBox.warning(self, "警告", "请选择要合并的保管箱文件！")
+            return
+        super().accept()
+
+    def vault_path(self):
+        return self.vault_edit.text().strip()
+
+    def password(self):
+        return self.password_edit.text()
+
+    def base_path(self):
+        return self.base_edit.text().strip()
+
+    def policy(self):
+        return self.policy_combo.currentData()
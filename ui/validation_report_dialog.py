@@ -0,0 +1,97 @@
+from PySide6.QtWidgets import (
+    QVBoxLayout, QHBoxLayout, QPushButton, QMessageBox, QDialog, QLabel, QLineEdit, QComboBox,
+    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QFileDialog
+)
+
+from core.validation import ERROR, SEVERITY_LABELS, WARNING
+
+
+class ValidationReportDialog(QDialog):
+    """导入前汇总显示全部校验问题：可按级别筛选、搜索、导出为 CSV，确认后导入合格的条目"""
+
+    COLUMNS = ["位置", "名称", "字段", "级别", "说明"]
+
+    def __init__(self, report, summary, parent=None, action_text="导入"):
+        super().__init__(parent)
+        self.report = report
+        self.setWindowTitle("导入校验报告")
+        self.setModal(True)
+        self.resize(720, 420)
+        layout = QVBoxLayout(self)
+
+        text = summary
+        if report.truncated:
+            text += f"\n问题较多，只列出前 {len(report.issues)} 条（共 {report.issue_count} 条）。"
+        self.summary_label = QLabel(text)
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+
+        # 筛选：级别 + 关键字（匹配名称、字段和说明）
+        filters = QHBoxLayout()
+        self.severity_combo = QComboBox()
+        self.severity_combo.addItem("全部", None)
+        self.severity_combo.addItem(SEVERITY_LABELS[ERROR], ERROR)
+        self.severity_combo.addItem(SEVERITY_LABELS[WARNING], WARNING)
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("搜索名称、字段或说明")
+        filters.addWidget(QLabel("级别："))
+        filters.addWidget(self.severity_combo)
+        filters.addWidget(self.search_edit, 1)
+        layout.addLayout(filters)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(len(self.COLUMNS) - 1, QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        self.btn_export = QPushButton("导出报告…")
+        self.btn_ok = QPushButton(action_text)
+        self.btn_cancel = QPushButton("取消")
+        self.btn_export.clicked.connect(self.export_report)
+        self.btn_ok.clicked.connect(self.accept)
+        self.btn_cancel.clicked.connect(self.reject)
+        buttons.addWidget(self.btn_export)
+        buttons.addStretch()
+        buttons.addWidget(self.btn_ok)
+        buttons.addWidget(self.btn_cancel)
+        layout.addLayout(buttons)
+
+        self.severity_combo.currentIndexChanged.connect(self.apply_filter)
+        self.search_edit.textChanged.connect(self.apply_filter)
+        self.apply_filter()
+
+    def visible_issues(self):
+        severity = self.severity_combo.currentData()
+        keyword = self.search_edit.text().strip().lower()
+        for issue in self.report.issues:
+            if severity is not None and issue.severity != severity:
+                continue
+            if keyword and keyword not in f"{issue.name}\n{issue.field}\n{issue.message}".lower():
+                continue
+            yield issue
+
+    def apply_filter(self):
+        issues = list(self.visible_issues())
+        self.table.setUpdatesEnabled(False)
+        self.table.setRowCount(len(issues))
+        for row, issue in enumerate(issues):
+            values = (f"第 {issue.position} {self.report.unit}", issue.name, issue.field,
+                      SEVERITY_LABELS[issue.severity], issue.message)
+            for col, value in enumerate(values):
+                self.table.setItem(row, col, QTableWidgetItem(value))
+        self.table.setUpdatesEnabled(True)
+
+    def export_report(self):
+        path, _ = QFileDialog.getSaveFileName(self, "导出校验报告", "import_report.csv", "CSV 文件 (*.csv)")
+        if not path:
+            return
+        try:
+            self.report.write_csv(path)
+        except OSError as e:
+            QMessageBox.critical(self, "导出失败", f"无法写入文件：\n{str(e)}")
+            return
+        QMessageBox.information(self, "导出成功", f"校验报告已保存到：\n{path}")